@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+同じ PR・同じ相手への通知を 1 つのメッセージにまとめるモジュール
+
+inline コメントの多いレビューを submit すると、pull_request_review と、コメントごとの
+pull_request_review_comment が届き、それぞれが通知になる。delivery_worker がキューから取り出したバッチの中で、
+これらを (送信先, PR, mention 先) ごとに 1 つのまとめメッセージにする
+"""
+
+from collections import OrderedDict
+import os
+from typing import List, Tuple
+
+from delivery import Notification
+
+COALESCE_MAX_GROUPS = int(os.getenv("COALESCE_MAX_GROUPS", "1000"))  # 溜めておくまとめ先の上限。超えたら古いものから送る
+COALESCE_MAX_ITEMS = 20  # 1 つのまとめメッセージに入れる通知の上限
+MAX_ATTACHMENTS = 100  # Slack の 1 メッセージあたりの attachments の上限
+
+DIGEST_HEADER_FORMAT = ":package: {recipients}, {count} notifications in {group}"
+
+
+class Coalescer:
+    """
+    通知を溜めてまとめる
+    add で通知を溜め、flush ですべてのまとめ先を、まとめメッセージとして取り出す
+    取り出した結果は (まとめメッセージ, まとめた通知の tag のリスト) のリスト。tag はキューのハンドルなどに使う
+    """
+
+    def __init__(self, max_groups: int = COALESCE_MAX_GROUPS, max_items: int = COALESCE_MAX_ITEMS):
+        self.max_groups = max_groups
+        self.max_items = max_items
+        self._groups = OrderedDict()  # (url, group, recipients) -> [(通知, tag)]
+
+    def add(self, notification: Notification, tag=None) -> List[Tuple[Notification, list]]:
+        """
+        通知を溜める
+        :return: すぐに送るべきもの (group のない通知、上限を超えて押し出されたまとめ)
+        """
+        if notification.group is None:
+            return [(notification, [tag])]
+        key = (notification.url, notification.group, notification.recipients)
+        ready = []
+        if key not in self._groups:
+            if self.max_groups <= len(self._groups):
+                ready.append(self._pop(next(iter(self._groups))))
+            self._groups[key] = []
+        items = self._groups[key]
+        items.append((notification, tag))
+        if self.max_items <= len(items):
+            ready.append(self._pop(key))
+        return ready
+
+    def flush(self) -> List[Tuple[Notification, list]]:
+        """ すべてのまとめ先を取り出す """
+        return [self._pop(x) for x in list(self._groups)]
+
+    def __len__(self):
+        return sum(len(x) for x in self._groups.values())
+
+    def _pop(self, key) -> Tuple[Notification, list]:
+        items = self._groups.pop(key)
+        return digest([x[0] for x in items]), [x[1] for x in items]
+
+
+def digest(notifications: List[Notification]) -> Notification:
+    """ 同じまとめ先の通知を 1 つのメッセージにする """
+    first = notifications[0]
+    if len(notifications) == 1:
+        return first
+    header = DIGEST_HEADER_FORMAT.format(recipients=first.recipients, count=len(notifications), group=first.group)
+    text = "\n".join([header] + [x.payload["text"] for x in notifications])
+    attachments = [a for x in notifications for a in x.payload.get("attachments", [])][:MAX_ATTACHMENTS]
+    payload = {"text": text, "attachments": attachments} if attachments else {"text": text}
+    return Notification(first.url, payload, first.group, first.recipients)
+
+
+def coalesce(items, max_items: int = COALESCE_MAX_ITEMS) -> List[Tuple[Notification, list]]:
+    """
+    (tag, 通知) のリストをまとめる
+    :return: (まとめメッセージ, まとめた通知の tag のリスト) のリスト
+    """
+    coalescer = Coalescer(max_groups=len(items) + 1, max_items=max_items)
+    ready = []
+    for tag, notification in items:
+        ready += coalescer.add(notification, tag)
+    return ready + coalescer.flush()
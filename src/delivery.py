@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Slack への配送モジュール
+
+ハンドラが作成した通知 (Notification) のリストを受け取り、スレッドプールで並列に送信する
+1 つのイベントから複数の送信先 (チームのチャンネル、監査用チャンネルなど) に送っても、
+送信先の数だけ待ち時間が積み上がらないようにする
+http.client などを読み込む slack_ratelimit と concurrent.futures は、起動時間のため最初の送信時に読み込む
+"""
+
+from dataclasses import dataclass
+import logging
+import os
+import threading
+from typing import List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_MAX_WORKERS = int(os.getenv("DELIVERY_MAX_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class Notification:
+    """ 1 つの送信先への 1 つのメッセージ """
+    url: str  # 送信先の Slack Webhook URL
+    payload: dict  # text, attachments など Slack に送る内容
+    group: Optional[str] = None  # 通知をまとめる単位 (PR, Issue の URL)。None ならまとめない
+    recipients: str = ""  # mention 先。group と recipients が同じ通知をまとめる
+
+
+@dataclass
+class DeliveryResult:
+    """ 送信先ごとの送信結果 """
+    notification: Notification
+    ok: bool
+    response: Optional[str] = None
+    error: Optional[Exception] = None
+
+
+def deliver(notifications: List[Notification]) -> List[DeliveryResult]:
+    """
+    通知を並列に送信する。送信に失敗しても例外は投げず、結果として返す
+    :param notifications: 送信する通知のリスト
+    :return: notifications と同じ順の送信結果
+    """
+    if len(notifications) < 2:  # 1 件ならスレッドを使うまでもない
+        return [_send(x) for x in notifications]
+    executor = _get_executor()
+    send = metrics.bind(_send)  # 送信時間などを、このリクエストの計測値に入れる
+    futures = [executor.submit(send, x) for x in notifications]
+    return [f.result() for f in futures]
+
+
+def _send(notification: Notification) -> DeliveryResult:
+    try:
+        import slack_ratelimit
+        slack = slack_ratelimit.get_sender(notification.url)  # 流量制限・リトライつきで送信
+        with metrics.timer("slack_post"):
+            response = slack.notify(**notification.payload)
+        metrics.count("notifications_sent")
+        return DeliveryResult(notification, True, response=response)
+    except Exception as e:
+        logger.error(f"slack notify failed: {e}")
+        metrics.count("notifications_failed")
+        return DeliveryResult(notification, False, error=e)
+
+
+def _get_executor():
+    """ warm な呼び出し間でスレッドを使いまわすため、executor はモジュールレベルで保持する """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(max_workers=DELIVERY_MAX_WORKERS, thread_name_prefix="delivery")
+    return _executor
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+GitHub の再送 (同じ X-GitHub-Delivery の配信) を検出するモジュール
+
+処理済みの delivery id を件数上限つき・有効期限つきの LRU キャッシュで保持する
+DEDUP_TABLE を設定すると DynamoDB も併用し、インスタンスをまたいで重複を検出する
+"""
+
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+import kv_store
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "10000"))
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "3600"))  # GitHub の再送はこの秒数以内に来るものとする
+DEDUP_TABLE = os.getenv("DEDUP_TABLE")
+
+
+class DeliveryDedup:
+    """
+    delivery id の LRU + TTL キャッシュ
+    :param max_entries: 保持する delivery id の上限。超えたら古いものから捨てる
+    :param ttl: delivery id を保持する秒数
+    :param store: インスタンス間で共有する KV ストア (kv_store 参照)。None ならこのインスタンス内のみ
+    """
+
+    def __init__(self, max_entries: int = DEDUP_MAX_ENTRIES, ttl: float = DEDUP_TTL, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # delivery_id -> 有効期限 (epoch 秒)
+        self._lock = threading.Lock()
+
+    def seen(self, delivery_id: str) -> bool:
+        """
+        処理済みの delivery id かどうかを返す。初めての delivery id はこの時点で処理済みとして記録する
+        :param delivery_id: X-GitHub-Delivery ヘッダの値
+        :return: 処理済み (重複) なら True
+        """
+        now = time.time()
+        with self._lock:
+            expire_at = self._entries.get(delivery_id)
+            if expire_at is not None and now < expire_at:
+                self._entries.move_to_end(delivery_id)
+                self.hits += 1
+                return True
+
+        if self.store is not None and not self._claim(delivery_id, now):
+            with self._lock:
+                self._remember(delivery_id, now)
+                self.hits += 1
+            return True
+
+        with self._lock:
+            self._remember(delivery_id, now)
+            self.misses += 1
+        return False
+
+    def forget(self, delivery_id: str) -> None:
+        """ 処理に失敗した delivery id を削除し、再送されたときに処理できるようにする """
+        if delivery_id is None:
+            return
+        with self._lock:
+            self._entries.pop(delivery_id, None)
+        if self.store is not None:
+            self.store.delete(f"delivery/{delivery_id}")
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries)}
+
+    def _claim(self, delivery_id: str, now: float) -> bool:
+        """ 共有ストアに delivery id を記録する。すでにほかのインスタンスが記録していたら False """
+        return self.store.put_if_absent(f"delivery/{delivery_id}", {}, now + self.ttl)
+
+    def _remember(self, delivery_id: str, now: float) -> None:
+        self._entries[delivery_id] = now + self.ttl
+        self._entries.move_to_end(delivery_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+_dedup = None
+
+
+def get_dedup() -> DeliveryDedup:
+    """ モジュールレベルの DeliveryDedup を返す。warm な呼び出し間で使いまわされる """
+    global _dedup
+    if _dedup is None:
+        store = kv_store.DynamoDBKVStore(DEDUP_TABLE) if DEDUP_TABLE else None
+        _dedup = DeliveryDedup(store=store)
+    return _dedup
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+送信待ちのキュー (outbound_queue) から通知を取り出して Slack に送信する Lambda
+
+- SQS から呼び出された場合は、渡されたメッセージを送信し、失敗したものだけを SQS に戻す
+- それ以外 (スケジュール実行など) の場合は、キューが空になるか残り時間がなくなるまでバッチ単位で取り出して送信する
+どちらの場合も、バッチ内の同じ PR・同じ相手への通知は coalesce で 1 つにまとめてから送信する
+"""
+
+import logging
+import os
+
+import coalesce
+import delivery
+import metrics
+import outbound_queue
+
+logger = logging.getLogger(__name__)
+
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "10"))
+WORKER_MARGIN_MILLIS = 5000  # 残り時間がこれを切ったら新しいバッチを取り出さない
+
+
+def lambda_handler(event, context):
+    logging.getLogger().setLevel(os.getenv('LOGGING_LEVEL', 'INFO'))
+    metrics.begin()
+    try:
+        return _drain(event, context)
+    finally:
+        metrics.emit({"Function": "delivery_worker"})
+
+
+def _drain(event, context) -> dict:
+    if event and "Records" in event:
+        return _deliver_sqs_records(event["Records"])
+
+    queue = outbound_queue.get_queue()
+    delivered = failed = 0
+    while context is None or WORKER_MARGIN_MILLIS < context.get_remaining_time_in_millis():
+        batch = queue.get_batch(WORKER_BATCH_SIZE)
+        if not batch:
+            break
+        digests = coalesce.coalesce(batch)
+        results = delivery.deliver([x[0] for x in digests])
+        queue.ack([handle for (_, handles), r in zip(digests, results) if r.ok for handle in handles])
+        queue.release([handle for (_, handles), r in zip(digests, results) if not r.ok for handle in handles])
+        delivered += sum(1 for r in results if r.ok)
+        failed += sum(1 for r in results if not r.ok)
+        if failed:
+            break  # Slack が失敗している間は取り出しを続けない
+    logger.info(f"delivered {delivered}, failed {failed}")
+    return {"delivered": delivered, "failed": failed}
+
+
+def _deliver_sqs_records(records) -> dict:
+    """ SQS のメッセージを送信し、失敗したものを batchItemFailures として返す (SQS に戻される) """
+    digests = coalesce.coalesce([(x["messageId"], outbound_queue.decode(x["body"])) for x in records])
+    results = delivery.deliver([x[0] for x in digests])
+    failures = [{"itemIdentifier": x} for (_, ids), r in zip(digests, results) if not r.ok for x in ids]
+    logger.info(f"delivered {len(digests)} messages for {len(records)} records, failed {len(failures)} records")
+    return {"batchItemFailures": failures}
@@ -13,24 +13,52 @@ GitHub WebHook で呼び出され、Slack に必要な通知を飛ばす
 """
 
 from collections import defaultdict
+import functools
 import json
 import logging
 import os
-from pathlib import Path
-import re
-import textwrap
-
-import slackweb
-
+import random
+import threading
+import time
+
+import delivery
+import delivery_dedup
+import mention
+import metrics
 import notify_record
+import outbound_queue
+import review_state
+import user_mapping
+import user_resolver
+import webhook_payload
 
 logger = logging.getLogger(__name__)
 
 SLACK_URL = os.getenv("SLACK_URL")
-MENTION_REGEXP = r"@\w+"
-CONFIG_FILE = "config.json"
-
-GITHUB_TO_SLACK = {}
+# SLACK_URL に加えて通知を送る Webhook URL (監査用チャンネルなど)。カンマ区切り
+SLACK_EXTRA_URLS = [x.strip() for x in os.getenv("SLACK_EXTRA_URLS", "").split(",") if x.strip()]
+# sync - 応答を返す前に Slack に送信する / deferred - outbound_queue に入れてすぐに応答を返す (送信は delivery_worker)
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "sync")
+# ユーザの対応表。config.json か、user_mapping の索引込み形式 (*.mapping)、"s3://bucket/key"。変更されたら読み込みなおす
+# (デプロイしたパッケージ内のファイルは変わらないので、Lambda で再デプロイせずに変えるには S3 に置く)
+# 空なら読み込まず、g_user_mapping に設定済みの対応表を使う
+CONFIG_FILE = os.getenv("CONFIG_FILE", "config.json")
+# CONFIG_FILE が JSON のとき、索引込み形式で保存するパス (例: /tmp/config.mapping)。CONFIG_FILE の内容から変換したものならこちらを読む
+CONFIG_SNAPSHOT = os.getenv("CONFIG_SNAPSHOT")
+# summary - 1 配信につき要約 1 行のみ / full - 加えて従来どおりヘッダ全体を出す
+LOG_MODE = os.getenv("LOG_MODE", "summary")
+# payload をログに出す割合 (0 - 1)。DEBUG のときは割合によらず全体を出す
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))
+# サンプリングした payload をログに出すときの上限バイト数
+LOG_PAYLOAD_MAX_BYTES = int(os.getenv("LOG_PAYLOAD_MAX_BYTES", "4096"))
+
+# lambda_handler の実行中の状態。webhook_server からは複数スレッドで並行に呼ばれるため、スレッドごとに持つ
+#   outbox - 通知をここに溜めて最後にまとめて送信する
+#   summary - 要約ログの項目をここに集める
+#   review_updates - 通知できてから行う記録 (通知済みのレビュアー・review の state)
+g_local = threading.local()
+# CONFIG_FILE から読み込んだ対応表 (user_mapping.UserMapping)。変更しない。読み込みなおしたら参照ごと差し替える
+g_user_mapping = user_mapping.UserMapping({})
 
 # 絵文字の dict
 NOTIFY_EMOTICON = defaultdict(lambda: ":bell:")
@@ -42,41 +70,169 @@ NOTIFY_EMOTICON.update({
     "approved": ":white_check_mark:",
 })
 
+# 通知メッセージのテンプレート
+REVIEW_REQUESTED_FORMAT = "{icon} {user}, *review requested* by {reviewee} in {url}"
+REVIEW_SUBMITTED_FORMAT = "{icon} {user}, *review {state}* by {reviewer} in {url}"
+MENTIONED_FORMAT = "{icon} {user}, *mentioned* by {commenter} in {url}"
+
+# (X-GitHub-Event, action) -> ハンドラのリスト。@handles デコレータで登録する
+HANDLERS = defaultdict(list)
+# ハンドラが 1 つでも登録されている X-GitHub-Event。ここにないイベントは body をパースせずに捨てる
+HANDLED_EVENTS = set()
+
+
+def handles(events, actions):
+    """
+    ハンドラを (event, action) の組み合わせで HANDLERS に登録するデコレータ
+    :param events: 対象とする X-GitHub-Event のリスト
+    :param actions: 対象とする body["action"] のリスト
+    :return:
+    """
+    def decorator(func):
+        for event in events:
+            HANDLED_EVENTS.add(event)
+            for action in actions:
+                HANDLERS[(event, action)].append(func)
+        return func
+    return decorator
+
 
 def lambda_handler(event, context):
     _lambda_logging_init()
-    _load_config()  # config.json を GITHUB_TO_SLACK グローバル変数に読み込み
+    metrics.begin()
+    start = time.perf_counter()
+    headers = event["headers"]
+    summary = g_local.summary = {"delivery": headers.get("X-GitHub-Delivery"), "event": headers.get("X-GitHub-Event")}
+    try:
+        response = _handle_event(event, context)
+        summary["status"] = response["statusCode"]
+        return response
+    finally:
+        summary["duration_ms"] = round((time.perf_counter() - start) * 1e3, 1)
+        logger.info("summary %s", _LazyJSON(summary))
+        g_local.summary = None
+        metrics.emit({"Event": headers.get("X-GitHub-Event") or "unknown"})
+
+
+def _handle_event(event, context):
+    # 大きすぎる body と署名の合わない body は、config の読み込みやパースの前に捨てる
+    rejected = webhook_payload.gate(event["body"] or "", event["headers"].get("X-Hub-Signature-256"))
+    if rejected:
+        logger.warning("request rejected with %d", rejected)
+        metrics.count("rejected")
+        return {"statusCode": rejected, "body": json.dumps({"result": "rejected"})}
+
+    with metrics.timer("load_config"):
+        _load_config()  # config.json を g_user_mapping グローバル変数に読み込み
 
     # メッセージの読み込み + ログ出力
     headers = event["headers"]
     body = event["body"]
-    logger.info(json.dumps(headers))
-    logger.info(body)
-    body = json.loads(body)
+    if LOG_MODE == "full":
+        logger.info("%s", _LazyJSON(headers))
+
+    # 対象外のイベント (push, status など) は body をパースせずに終了
+    github_event_kind = headers.get("X-GitHub-Event")
+    if github_event_kind not in HANDLED_EVENTS:
+        logger.info("event %s is not handled. skipped", github_event_kind)
+        return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
+
+    # action がとれる場合はパース前に判定。ログに payload 全体を出すのは DEBUG のときのみ
+    action = webhook_payload.probe_action(body)
+    _summarize(action=action)
+    if action is not None and (github_event_kind, action) not in HANDLERS:
+        logger.info("event %s, action %s is not handled. skipped", github_event_kind, action)
+        return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
+
+    # GitHub からの再送 (処理済みの X-GitHub-Delivery) は、body をパースせずに終了
+    delivery_id = headers.get("X-GitHub-Delivery")
+    dedup = delivery_dedup.get_dedup()
+    if delivery_id and dedup.seen(delivery_id):
+        logger.info("delivery %s is already processed. skipped (%s)", delivery_id, dedup.stats())
+        metrics.count("duplicates")
+        return {"statusCode": 200, "body": json.dumps({"result": "duplicate"})}
+
+    try:
+        response = _process_delivery(github_event_kind, headers, body)
+    except Exception:
+        dedup.forget(delivery_id)  # 失敗した配信は、再送されたときに処理する
+        raise
+    if response["statusCode"] != 200:
+        dedup.forget(delivery_id)
+    return response
+
+
+def _process_delivery(github_event_kind: str, headers: dict, body: str) -> dict:
+    """
+    body をパースしてハンドラを呼び出し、溜まった通知を送信する
+    :param github_event_kind: X-GitHub-Event ヘッダの値
+    :param headers:
+    :param body: JSON 文字列
+    :return: lambda_handler のレスポンス
+    """
+    _log_payload(body)
+    with metrics.timer("json_loads"):
+        body = webhook_payload.extract(json.loads(body))  # ハンドラが参照するフィールドのみ残す
+    item = body.get("pull_request") or body.get("issue") or {}
+    _summarize(action=body.get("action"), repo=body.get("repository", {}).get("full_name"), number=item.get("number"))
+
+    # (event, action) に登録されたハンドラのみ呼び出し。通知は g_local.outbox に溜まる
+    notifications = g_local.outbox = []
+    review_updates = g_local.review_updates = []
+    try:
+        for handler in HANDLERS.get((github_event_kind, body.get("action")), ()):
+            with metrics.timer(handler.__name__):
+                handler(headers, body)
+    finally:
+        g_local.outbox = None
+        g_local.review_updates = None
+    _summarize(recipients=sorted({x.recipients for x in notifications if x.recipients}))
+
+    if DELIVERY_MODE == "deferred":
+        if notifications:
+            outbound_queue.get_queue().put(notifications)
+            logger.info("%d notifications queued", len(notifications))
+            metrics.count("notifications_queued", len(notifications))
+        _apply_review_updates(review_updates)
+        return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
+
+    # 溜まった通知を並列に送信
+    results = delivery.deliver(notifications)
+    failed = [x.notification.url for x in results if not x.ok]
+    if failed:
+        logger.error("%d of %d notifications failed", len(failed), len(results))
+        return {"statusCode": 500, "body": json.dumps({"result": "error", "failed": len(failed)})}
+
+    _apply_review_updates(review_updates)
+    return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
 
-    # 各種ハンドラの呼び出し
-    #   各ハンドラは対象外のメッセージがきたら何もせず return するので、とにかく呼び出して OK
-    handler_issue_pr_mentioned(headers, body)
-    handler_review_requested(headers, body)
-    handler_review_submitted(headers, body)
 
-    return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
+def _apply_review_updates(updates) -> None:
+    """ 通知できたレビュアー・review の state を記録する。失敗したときは記録せず、再送されたときにもう一度通知する """
+    for update in updates:
+        update()
 
 
+def _after_delivery(func, *args) -> None:
+    """
+    通知できてから func(*args) を呼ぶよう g_local.review_updates に溜める
+    lambda_handler の外 (ハンドラを直接呼んだとき) では、すぐに呼ぶ
+    """
+    review_updates = getattr(g_local, "review_updates", None)
+    if review_updates is None:
+        func(*args)
+    else:
+        review_updates.append(functools.partial(func, *args))
+
+
+@handles(["pull_request"], ["review_requested", "opened"])
 def handler_review_requested(headers: dict, body: dict) -> None:
     """
-    review_requested されたら通知 - 対象外のメッセージについては何もしない
+    review_requested されたら通知
     :param headers:
     :param body:
     :return:
     """
-    # 処理すべきメッセージかどうかをチェック
-    github_event_kind = headers["X-GitHub-Event"]
-    if github_event_kind != "pull_request":
-        return
-    if body["action"] != "review_requested" and body["action"] != "opened":
-        return
-
     # メッセージから各種情報を読みこみ
     logger.info("handler_review_requested fired")
     message_url = body["pull_request"]["html_url"]
@@ -85,43 +241,35 @@ def handler_review_requested(headers: dict, body: dict) -> None:
     icon = NOTIFY_EMOTICON["review_requested"]
     reviewers_at = [f"@{x['login']}" for x in body["pull_request"]["requested_reviewers"]]
 
-    # 送信済み mention のチェック
-    notify_record.load()
-    notified_reviewers = notify_record.query_pr_reviewers(body["pull_request"]["id"])
-    logger.info(f"notified_reviewers = {notified_reviewers}")
+    # 送信済み mention のチェック。通知済みの人の記録は、通知できてから追加する
+    notified_reviewers = notify_record.get_pr_reviewers(body["pull_request"]["id"])
+    _after_delivery(notify_record.add_pr_reviewers, body["pull_request"]["id"], reviewers_at)
+    logger.info("notified_reviewers = %s", notified_reviewers)
     if len(notified_reviewers) < 1:
         message = ""  # すでに他の人に通知済みなら message は削除する（二重になるため）
     targets = set(reviewers_at) - set(notified_reviewers)  # 通知する人は追加分のみ
-    # 通知済みの人の記録を追加
-    notify_record.insert_pr_reviewers(body["pull_request"]["id"], reviewers_at)
-    notify_record.store()
+    tracker = review_state.get_tracker()
+    if tracker is not None:  # 再レビューの結果は、前回と同じ state でも通知する
+        tracker.reset(body["pull_request"]["id"], reviewers_at)
 
     # 通知!
-    user = _mention_str(sorted(targets))
+    user = _mention_str(sorted(targets), _mention_index(body))
     if len(user) < 1:  # 対象者なければ通知しない
         logger.info("no mentioned_user. skipped")
         return
-    notify_message_format = textwrap.dedent("""
-    {icon} {user}, *review requested* by {reviewee} in {url}
-    """).strip()
-    notify_message = notify_message_format.format(icon=icon, user=user, reviewee=reviewee, url=message_url)
-    notify_slack(notify_message, attach_message=message)
+    notify_message = REVIEW_REQUESTED_FORMAT.format(icon=icon, user=user, reviewee=reviewee, url=message_url)
+    notify_slack(notify_message, attach_message=message, group=message_url.split("#")[0], recipients=user,
+                 repo=_repo_name(body), kind="review_requested", users=targets)
 
 
+@handles(["pull_request_review"], ["submitted", "edited"])
 def handler_review_submitted(headers: dict, body: dict) -> None:
     """
-    review が submit されたときに通知 - 対象外のメッセージについては何もしない
+    review が submit されたときに通知
     :param headers:
     :param body:
     :return:
     """
-    # 処理すべきメッセージかどうかをチェック
-    github_event_kind = headers["X-GitHub-Event"]
-    if github_event_kind != "pull_request_review":
-        return
-    if body["action"] != "submitted" and body["action"] != "edited":
-        return
-
     # メッセージから各種情報を読みこみ
     logger.info("handler_review_submitted fired")
     message_url = body["review"]["html_url"]
@@ -130,30 +278,37 @@ def handler_review_submitted(headers: dict, body: dict) -> None:
     state = body["review"]["state"]
     icon = NOTIFY_EMOTICON[state]
 
-    mentioned_user = _find_mentioned_user(message)
+    index = _mention_index(body)
+    mentioned_user = mention.find_mentions(message, index)
     # 本人の reveiw_submit （コメント時に発生）でなければ、mention 先に reviewee を加える
     reviewee = body["pull_request"]["user"]["login"]
     if reviewer != reviewee:
-        u_at = f"@{body['pull_request']['user']['login']}"
-        mentioned_user.add(u_at)
+        u_at = index.resolve(reviewee)
+        if u_at:
+            mentioned_user.add(u_at)
     else:
-        logger.info(f"reviewer is same with reviewee, skiped. reviewer {reviewer}, reviewee {reviewee}")
+        logger.info("reviewer is same with reviewee, skiped. reviewer %s, reviewee %s", reviewer, reviewee)
+
+    # 前回の通知から state が変わっていなければ、新しく加わった mention 先にのみ通知する
+    tracker = review_state.get_tracker()
+    if tracker is not None:
+        mentioned_user, update = tracker.evaluate(body["pull_request"]["id"], reviewer, state, mentioned_user)
+        _after_delivery(tracker.apply, update)
 
     # 通知!
-    user = _mention_str(sorted(mentioned_user))
+    user = _mention_str(sorted(mentioned_user), index)
     if len(user) < 1:  # mention 先がなければ何もしない
         logger.info("no mentioned_user. skipped")
         return
-    notify_message_format = textwrap.dedent("""
-    {icon} {user}, *review {state}* by {reviewer} in {url}
-    """).strip()
-    notify_message = notify_message_format.format(icon=icon, user=user, state=state, reviewer=reviewer, url=message_url)
-    notify_slack(notify_message, attach_message=message)
+    notify_message = REVIEW_SUBMITTED_FORMAT.format(icon=icon, user=user, state=state, reviewer=reviewer, url=message_url)
+    notify_slack(notify_message, attach_message=message, group=message_url.split("#")[0], recipients=user,
+                 repo=_repo_name(body), kind=state, users=mentioned_user)
 
 
+@handles(["issues", "pull_request", "issue_comment", "pull_request_review_comment"], ["opened", "created", "edited"])
 def handler_issue_pr_mentioned(headers: dict, body: dict) -> None:
     """
-    Issue, PR の本文・コメントで mention されたら通知 - 対象外のメッセージについては何もしない
+    Issue, PR の本文・コメントで mention されたら通知
 
     :param headers:
     :param body:
@@ -171,13 +326,14 @@ def handler_issue_pr_mentioned(headers: dict, body: dict) -> None:
     else:
         return
 
-    # コメント本文から mentioned_user を取得
+    # コメント本文から mentioned_user を取得。対応表に未登録のユーザは走査時に除く (user_resolver が有効なら残す)
+    index = _mention_index(body)
     if body["action"] == "opened" or body["action"] == "created":
-        mentioned_user = _find_mentioned_user(body[data_key]["body"])
+        mentioned_user = mention.find_mentions(body[data_key]["body"], index)
     elif body["action"] == "edited":
-        mentioned_user_all = _find_mentioned_user(body[data_key]["body"])
-        mentioned_user_before = _find_mentioned_user(body["changes"].get("body", {}).get("from", ""))
-        mentioned_user = mentioned_user_all - mentioned_user_before  # 新しく加わった mention だけを対象にする
+        mentioned_user_before = body["changes"].get("body", {}).get("from", "")
+        # 新しく加わった mention だけを対象にする
+        mentioned_user = mention.find_new_mentions(mentioned_user_before, body[data_key]["body"], index)
     else:
         return  # deleted など、ほかイベントのときは何もしない
 
@@ -189,71 +345,112 @@ def handler_issue_pr_mentioned(headers: dict, body: dict) -> None:
     icon = NOTIFY_EMOTICON["mentioned"]
 
     # コメント本人を通知先から除外（引用内にある場合など）
-    mentioned_user.discard(f"@{commenter}")
+    mentioned_user.discard(index.resolve(commenter))
 
     # 通知!
-    user = _mention_str(sorted(mentioned_user))
+    user = _mention_str(sorted(mentioned_user), index)
     if len(user) < 1:  # 対象者なければ通知しない
         logger.info("no mentioned_user. skipped")
         return
-    notify_message_format = textwrap.dedent("""
-    {icon} {user}, *mentioned* by {commenter} in {url}
-    """).strip()
-    notify_message = notify_message_format.format(icon=icon, user=user, commenter=commenter, url=message_url)
-    notify_slack(notify_message, attach_message=message)
+    notify_message = MENTIONED_FORMAT.format(icon=icon, user=user, commenter=commenter, url=message_url)
+    notify_slack(notify_message, attach_message=message, group=message_url.split("#")[0], recipients=user,
+                 repo=_repo_name(body), kind="mentioned", users=mentioned_user)
 
 
-def notify_slack(text: str, attach_message: str = None) -> None:
+def notify_slack(text: str, attach_message: str = None, group: str = None, recipients: str = "", repo: str = None,
+                 kind: str = None, users=()) -> None:
     """
     mention する場合、 "<@username>" と <> で囲う必要があることに注意
+    lambda_handler の実行中は g_local.outbox に溜めるだけで、送信は lambda_handler の最後にまとめて行う
     :param text: Slack に入れる文字列
     :param attach_message: attachment としてつける文字列
+    :param group: 通知をまとめる単位 (PR, Issue の URL)。delivery_worker で同じ group, recipients の通知が 1 つにまとめられる
+    :param recipients: mention 先の文字列
+    :param repo: リポジトリの full_name。kind, users とともに通知先の振り分け (config.json の routes) に使う
+    :param kind: 通知の種類 (NOTIFY_EMOTICON のキー)
+    :param users: mention 先の GitHub ユーザ名
     :return:
     """
-    slack = slackweb.Slack(url=SLACK_URL)
-    if not attach_message:
-        slack.notify(text=text)
-        logger.info(f"slack notify: {text}")
-    else:
-        attachments = [
+    payload = {"text": text}
+    logger.debug("slack notify: %s", text)
+    if attach_message:
+        payload["attachments"] = [
             {
                 "mrkdwn_in": ["text"],
                 "color": "#36a64f",
                 "text": attach_message
             }
         ]
-        slack.notify(text=text, attachments=attachments)
-        logger.info(f"slack notify: {text}")
-        logger.info(f"slack notify as attachment: {attach_message}")
+        logger.debug("slack notify as attachment: %s", attach_message)
 
+    notifications = [delivery.Notification(url, payload, group, recipients) for url in _slack_urls(repo, kind, users)]
+    outbox = getattr(g_local, "outbox", None)
+    if outbox is not None:
+        outbox.extend(notifications)
+    else:
+        delivery.deliver(notifications)
 
-def _load_config() -> None:
-    global GITHUB_TO_SLACK
-    if GITHUB_TO_SLACK:
-        return  # ロード済みなら何もしない
 
-    conf_path = Path(CONFIG_FILE)
-    conf = json.loads(conf_path.read_text())
-    GITHUB_TO_SLACK = conf["github_to_slack"]
+def _slack_urls(repo: str = None, kind: str = None, users=()) -> list:
+    """
+    config.json の routes に一致するルールがあればその URL、なければ SLACK_URL に送る。SLACK_EXTRA_URLS にはいつも送る
+    :return: 送信先の URL のリスト
+    """
+    urls = []
+    router = g_user_mapping.router
+    if repo and router is not None:
+        urls = list(router.route(repo, kind, users))
+    urls = urls or [SLACK_URL]
+    return urls + [x for x in SLACK_EXTRA_URLS if x not in urls]
+
+
+def _repo_name(body: dict) -> str:
+    return (body.get("repository") or {}).get("full_name")
+
+
+def _load_config() -> None:
+    """
+    CONFIG_FILE から対応表とその索引を読み込み、g_user_mapping を差し替える。CONFIG_FILE が変更されていれば、別スレッドで読み込みなおす
+    CONFIG_FILE が空なら、g_user_mapping をそのまま使う
+    """
+    global g_user_mapping
+    if CONFIG_FILE:
+        g_user_mapping = user_mapping.get_source(CONFIG_FILE, CONFIG_SNAPSHOT).get()
 
 
 def _find_mentioned_user(text: str) -> set:
     """
-    テキストから、 "@hogehoge" な文字列を探す
+    テキストから、 "@hogehoge" な文字列を探す (コード、引用、e-mail アドレス内のものは除く)
     :param text:
     :return: "@hogehoge" の set
     """
-    return set(re.findall(MENTION_REGEXP, text or ""))
+    return mention.find_mentions(text)
 
 
-def _mention_str(users) -> str:
+def _mention_index(body: dict = None) -> mention.MentionIndex:
+    """
+    :param body: payload。リポジトリの organization に対応表があれば、その索引を返す
+    :return: 対応表の索引
+    """
+    org = ((body or {}).get("repository") or {}).get("full_name", "").split("/")[0]
+    index = g_user_mapping.index_for(org)
+    if user_resolver.get_resolver() is not None:  # 未登録のユーザも残し、_mention_str で Slack ID を引く
+        return user_resolver.FallbackIndex(index)
+    return index
+
+
+def _mention_str(users, index: mention.MentionIndex = None) -> str:
     """
     ユーザ名の list から、mention 用文字列を生成
     :param users:
+    :param index: 省略時は共通の索引
     :return:
     """
-    # 対象は GITHUB_TO_SLACK 登録済みユーザのみ
-    uid_mention_strs = [f"<{GITHUB_TO_SLACK[x]}>" for x in users if x in GITHUB_TO_SLACK]
+    # 対象は対応表に登録済みのユーザと、user_resolver で Slack ID が見つかったユーザのみ
+    index = index or _mention_index()
+    keys = [key for key in map(index.resolve, users) if key]
+    slack_ids = user_resolver.resolve_slack_ids(keys, index, user_resolver.get_resolver())
+    uid_mention_strs = [f"<{slack_ids[x]}>" for x in keys if slack_ids[x]]
     r = " ".join(uid_mention_strs)
     return r
 
@@ -268,3 +465,33 @@ def _lambda_logging_init() -> None:
         for mod_lvl in os.getenv('LOGGING_LEVELS').split(','):
             mod, lvl = mod_lvl.split('=')
             logging.getLogger(mod.strip()).setLevel(lvl.strip())
+
+
+class _LazyJSON:
+    """ ログに出すときだけ JSON にする (ログレベルで捨てられる場合は json.dumps しない) """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return json.dumps(self.value, ensure_ascii=False)
+
+
+def _summarize(**kwargs) -> None:
+    """ 要約ログの項目を追加する。lambda_handler の外 (テストなど) から呼ばれた場合は何もしない """
+    summary = getattr(g_local, "summary", None)
+    if summary is not None:
+        summary.update(kwargs)
+
+
+def _log_payload(body: str) -> None:
+    """
+    payload をログに出す。DEBUG のときは全体を、それ以外は LOG_PAYLOAD_SAMPLE_RATE の割合で先頭 LOG_PAYLOAD_MAX_BYTES のみ出す
+    :param body: JSON 文字列
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("payload %s", body)
+    elif LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        head = body.encode()[:LOG_PAYLOAD_MAX_BYTES].decode(errors="ignore")
+        logger.info("payload (sampled, %d of %d bytes) %s", len(head.encode()), len(body.encode()), head)
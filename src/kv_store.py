@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+コンテナ間で共有するための Key-Value ストア
+
+値ごとに version を持ち、put_if_version で条件付き更新 (compare-and-set) する
+put_if_absent は、存在しないか期限切れの場合のみ書き込む (1 回の条件付き書き込みで、get は不要)
+  - MemoryKVStore - プロセス内の代替実装 (テスト・単一プロセス用)
+  - DynamoDBKVStore - DynamoDB の条件付き書き込みを使う実装
+"""
+
+import json
+import threading
+import time
+from typing import Optional, Tuple
+
+
+class ConflictError(Exception):
+    """ 条件付き更新の競合がリトライしても解消しなかったときの例外 """
+
+
+class MemoryKVStore:
+    """
+    プロセス内の KV ストア
+    :param latency: get, put ごとに入れる遅延 (秒)。ネットワーク越しのストアの代わりにするとき用
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._items = {}  # key -> (value, version, expire_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[Optional[dict], int]:
+        """
+        :param key:
+        :return: (value, version)。存在しないか期限切れなら value は None
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            value, version, expire_at = self._items.get(key, (None, 0, None))
+        if expire_at is not None and expire_at <= time.time():
+            return None, version
+        return (json.loads(value) if value is not None else None), version
+
+    def put_if_version(self, key: str, value: dict, version: int, expire_at: float = None) -> bool:
+        """
+        現在の version が version と一致する場合のみ書き込む
+        :param key:
+        :param value:
+        :param version: get で取得した version。存在しないキーは 0
+        :param expire_at: 有効期限 (epoch 秒)
+        :return: 書き込めたら True
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            current = self._items.get(key, (None, 0, None))[1]
+            if current != version:
+                return False
+            self._items[key] = (json.dumps(value), version + 1, expire_at)
+            return True
+
+    def put_if_absent(self, key: str, value: dict, expire_at: float = None) -> bool:
+        """
+        存在しないか期限切れの場合のみ書き込む
+        :return: 書き込めたら True
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            _, version, current_expire_at = self._items.get(key, (None, 0, None))
+            if version and (current_expire_at is None or time.time() < current_expire_at):
+                return False
+            self._items[key] = (json.dumps(value), version + 1, expire_at)
+            return True
+
+    def delete(self, key: str) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class DynamoDBKVStore:
+    """
+    DynamoDB のテーブルを KV ストアとして使う。テーブルはパーティションキー "pk" (文字列)、TTL 属性 "expire_at" を想定
+    boto3 は Lambda の実行環境に含まれているので、使うときにだけ import する
+    """
+
+    def __init__(self, table_name: str):
+        import boto3
+        self._table = boto3.resource("dynamodb").Table(table_name)
+
+    def get(self, key: str) -> Tuple[Optional[dict], int]:
+        item = self._table.get_item(Key={"pk": key}, ConsistentRead=True).get("Item")
+        if not item:
+            return None, 0
+        version = int(item["version"])
+        # TTL による削除はすぐには行われないので、期限は自分で確認する
+        if "expire_at" in item and int(item["expire_at"]) <= time.time():
+            return None, version
+        return json.loads(item["value"]), version
+
+    def put_if_version(self, key: str, value: dict, version: int, expire_at: float = None) -> bool:
+        from botocore.exceptions import ClientError
+        item = {"pk": key, "value": json.dumps(value), "version": version + 1}
+        if expire_at is not None:
+            item["expire_at"] = _ttl(expire_at)
+        if version == 0:
+            condition = {"ConditionExpression": "attribute_not_exists(pk)"}
+        else:
+            condition = {"ConditionExpression": "version = :v", "ExpressionAttributeValues": {":v": version}}
+        try:
+            self._table.put_item(Item=item, **condition)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def put_if_absent(self, key: str, value: dict, expire_at: float = None) -> bool:
+        """ version を 1 つ進める更新を、存在しないか期限切れ (get と同じ判定) の場合のみ 1 回の条件付き書き込みで行う """
+        from botocore.exceptions import ClientError
+        names = {"#value": "value", "#version": "version"}
+        values = {":value": json.dumps(value), ":one": 1, ":now": int(time.time())}
+        update = "SET #value = :value REMOVE expire_at ADD #version :one"
+        if expire_at is not None:
+            update = "SET #value = :value, expire_at = :expire_at ADD #version :one"
+            values[":expire_at"] = _ttl(expire_at)
+        try:
+            self._table.update_item(Key={"pk": key}, UpdateExpression=update,
+                                    ConditionExpression="attribute_not_exists(pk) OR expire_at <= :now",
+                                    ExpressionAttributeNames=names, ExpressionAttributeValues=values)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self._table.delete_item(Key={"pk": key})
+
+
+def _ttl(expire_at: float) -> int:
+    """ DynamoDB に保存する有効期限。切り捨てで早く消えないようにする """
+    return int(expire_at) + 1
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+GitHub のコメント本文から mention ("@hogehoge") を取り出すモジュール
+
+Markdown の以下の部分にある "@" は mention として扱わない
+  - コードブロック (``` や ~~~ で囲まれた部分)、インラインコード (` で囲まれた部分)
+  - 引用 (">" で始まる行。返信時の引用など)
+  - e-mail アドレス、"@org/team" のようなチームへの mention
+テキストは先頭から 1 回だけ走査する。コードブロック・引用は連続した行をまとめて 1 つの正規表現で拾い、
+それ以外の部分から mention の候補を拾う。インラインコードは、まだ見つかっていないユーザの候補がある行だけ調べる
+"""
+
+import re
+from typing import Optional
+
+# "@" の直前が英数字や "." などの場合は e-mail アドレスの一部とみなす。英数字は ASCII のみ
+# ("こんにちは@hoge" のように日本語の直後の mention も GitHub は通知する)
+# (先頭を "@" にしておくと、正規表現エンジンが "@" を高速に探してくれる)
+MENTION_REGEXP = re.compile(r"@(?<![A-Za-z0-9_.+\-/`@]@)([A-Za-z0-9_-]+)(/[\w.-]+)?")
+BACKTICKS_REGEXP = re.compile(r"`+")
+# mention として扱わない部分。改行から始まる (先頭行は text の前に改行を足して調べる。re.MULTILINE の "^" は全位置で判定が走って遅いため)
+#   - 閉じられたコードブロック (同じ文字で、開始以上の長さのフェンスの行で閉じる)
+#   - 閉じられていないコードブロック (テキストの最後まで)
+#   - 連続した引用の行
+# 閉じられていないコードブロックは最後まで消費するので、閉じる行を探して失敗するのは高々 1 回で、全体で線形に収まる
+EXCLUDED_REGEXP = re.compile(r"""
+    \n\ {0,3}(?:
+        (`{3,})[^\n]*(?:\n[^\n]*)*?\n\ {0,3}\1`*[\ \t]*(?=\n|\Z)
+      | (~{3,})[^\n]*(?:\n[^\n]*)*?\n\ {0,3}\2~*[\ \t]*(?=\n|\Z)
+      | (?:`{3,}|~{3,})[\s\S]*
+      | >[^\n]*(?:\n\ {0,3}>[^\n]*)*
+    )""", re.VERBOSE)
+
+
+class MentionIndex:
+    """
+    設定済みのユーザ (config.json の github_to_slack のキー) の索引。GitHub のユーザ名は大文字小文字を区別しない
+    :param github_to_slack: "@github_username" -> Slack メンバー ID の dict
+    :param parent: この索引にないユーザを引く索引 (organization ごとの対応表から、共通の対応表を引くときなど)
+    :param index: 作成済みの索引 (user_mapping の索引込み形式から読み込んだもの)。省略時は github_to_slack から作る
+    """
+
+    def __init__(self, github_to_slack, parent: "MentionIndex" = None, index: dict = None):
+        self.source = github_to_slack
+        self.parent = parent
+        self.index = index if index is not None else {k[1:].lower(): k for k in github_to_slack if k.startswith("@")}
+
+    def resolve(self, login: str) -> Optional[str]:
+        """
+        :param login: GitHub のユーザ名 ("@" はあってもなくてもよい)
+        :return: 設定上のキー ("@github_username")。未設定のユーザなら None
+        """
+        key = self.index.get(login.lstrip("@").lower())
+        if key is None and self.parent is not None:
+            return self.parent.resolve(login)
+        return key
+
+    def slack_id(self, key: str) -> Optional[str]:
+        """
+        :param key: resolve の返した設定上のキー
+        :return: Slack メンバー ID
+        """
+        value = self.source.get(key)
+        if value is None and self.parent is not None:
+            return self.parent.slack_id(key)
+        return value
+
+
+def find_mentions(text: str, index: MentionIndex = None) -> set:
+    """
+    テキストから mention を探す
+    :param text:
+    :param index: 指定した場合、設定済みのユーザのみを (設定上のキーで) 返す
+    :return: "@hogehoge" の set
+    """
+    text = text or ""
+    if "@" not in text:
+        return set()
+    if "```" in text or "~~~" in text or ">" in text:
+        # コードブロック・引用を改行 1 つに置き換える (行の区切りは残るので、インラインコードは行ごとに調べられる)
+        text = EXCLUDED_REGEXP.sub("\n", "\n" + text)
+    return _scan(text, index)
+
+
+def find_new_mentions(before: str, after: str, index: MentionIndex = None) -> set:
+    """
+    編集後のテキストで新しく加わった mention を探す
+    :param before: 編集前のテキスト
+    :param after: 編集後のテキスト
+    :param index: find_mentions と同じ
+    :return: "@hogehoge" の set
+    """
+    after_mentions = find_mentions(after, index)
+    if not after_mentions:
+        return after_mentions
+    return after_mentions - find_mentions(before, index)
+
+
+def _scan(text: str, index: Optional[MentionIndex]) -> set:
+    """
+    コードブロック・引用を除いたテキストから mention を探す
+    インラインコードは行ごとに、まだ見つかっていないユーザの候補がある行だけ調べる
+    """
+    mentions = set()
+    if "`" not in text:  # 位置は不要なので、重複を除いた候補だけを調べる
+        for login, team in set(MENTION_REGEXP.findall(text)):
+            key = _resolve(login, team, index)
+            if key is not None:
+                mentions.add(key)
+        return mentions
+
+    skipped = set()  # mention にならない候補 (@org/team, 未設定のユーザ)
+    line_end = -1
+    code_spans, code_i = [], 0
+    for m in MENTION_REGEXP.finditer(text):
+        candidate = m.group(0)
+        if candidate in skipped:
+            continue
+        key = _resolve(m.group(1), m.group(2), index)
+        if key is None:
+            skipped.add(candidate)
+            continue
+        if key in mentions:
+            continue
+        pos = m.start()
+        if line_end < pos:
+            line_start = text.rfind("\n", 0, pos) + 1
+            line_end = text.find("\n", pos)
+            if line_end < 0:
+                line_end = len(text)
+            code_spans, code_i = _code_spans(text, line_start, line_end), 0
+        while code_i < len(code_spans) and code_spans[code_i][1] <= pos:
+            code_i += 1
+        if code_i < len(code_spans) and code_spans[code_i][0] <= pos:
+            continue  # インラインコード内
+        mentions.add(key)
+    return mentions
+
+
+def _resolve(login: str, team: str, index: Optional[MentionIndex]) -> Optional[str]:
+    """ :return: mention の候補の設定上のキー。@org/team や未設定のユーザなら None """
+    if team:
+        return None
+    login = login.rstrip("-")
+    if not login:
+        return None
+    return f"@{login}" if index is None else index.resolve(login)
+
+
+def _code_spans(text: str, start: int, end: int) -> list:
+    """
+    text[start:end] の行内のインラインコードの範囲を返す。同じ長さの ` の並びで閉じられたものだけをコードとみなす
+    :return: (開始位置, 終了位置) のリスト (開始位置の昇順)
+    """
+    if text.find("`", start, end) < 0:
+        return []
+    runs = [(m.start(), m.end()) for m in BACKTICKS_REGEXP.finditer(text, start, end)]
+    # 各 ` の並びについて、次に現れる同じ長さの並びを後ろから求めておく
+    next_same = [None] * len(runs)
+    last_seen = {}
+    for i in range(len(runs) - 1, -1, -1):
+        length = runs[i][1] - runs[i][0]
+        next_same[i] = last_seen.get(length)
+        last_seen[length] = i
+
+    spans = []
+    i = 0
+    while i < len(runs):
+        j = next_same[i]
+        if j is None:
+            i += 1
+            continue
+        spans.append((runs[i][0], runs[j][1]))
+        i = j + 1
+    return spans
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+処理段階ごとの所要時間・回数の計測モジュール
+
+METRICS=1 のとき、1 回の呼び出しごとに CloudWatch Embedded Metric Format (EMF) の JSON を 1 行標準出力に出す
+METRICS_MEMORY=1 のときは、ピーク RSS と tracemalloc のピーク・確保の多い箇所もあわせて出す
+無効のときは timer, count とも何もしない (共有の何もしないオブジェクトを返すだけ)
+計測値は begin() を呼んだスレッドごとに持つので、webhook_server で並行に処理したリクエストの値は混ざらない
+(スレッドプールで処理するときは bind() で包むと、呼び出し元の計測値に加算される。メモリの計測値はプロセス全体のもの)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS", "0") == "1"
+METRICS_MEMORY = os.getenv("METRICS_MEMORY", "0") == "1"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "GitHubSlackIntegration")
+TRACEMALLOC_TOP = 5  # 出力する確保の多い箇所の数
+
+_local = threading.local()  # .values: begin() で始めた計測の _Values。begin() していないスレッドでは計測しない
+_lock = threading.Lock()  # bind() したスレッドから同じ _Values に加算するため
+
+
+class _Values:
+    __slots__ = ("timings", "counts")
+
+    def __init__(self):
+        self.timings = {}  # 名前 -> ミリ秒
+        self.counts = {}  # 名前 -> 回数
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = (time.perf_counter() - self.start) * 1e3
+        values = getattr(_local, "values", None)
+        if values is not None:
+            with _lock:
+                values.timings[self.name] = values.timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+def timer(name: str):
+    """
+    with metrics.timer("json_loads"): ... の形で、ブロックの所要時間を計測する。同じ名前は合計する
+    :param name: メトリクス名
+    """
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def count(name: str, value: int = 1) -> None:
+    """ 回数を加算する """
+    if not METRICS_ENABLED:
+        return
+    values = getattr(_local, "values", None)
+    if values is not None:
+        with _lock:
+            values.counts[name] = values.counts.get(name, 0) + value
+
+
+def bind(func):
+    """
+    スレッドプールで実行する func を、このスレッドの計測値に加算するよう包む
+    :param func: 包む関数
+    :return: 計測していなければ func のまま
+    """
+    values = getattr(_local, "values", None)
+    if not METRICS_ENABLED or values is None:
+        return func
+
+    def bound(*args, **kwargs):
+        previous = getattr(_local, "values", None)
+        _local.values = values
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.values = previous
+    return bound
+
+
+def begin() -> None:
+    """ 呼び出しの最初に、このスレッドの計測を始めなおす """
+    if not METRICS_ENABLED:
+        return
+    _local.values = _Values()
+    if METRICS_MEMORY:
+        import tracemalloc
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        else:  # reset_peak は Python 3.9 から。それより前は止めて始めなおす
+            tracemalloc.stop()
+            tracemalloc.start()
+
+
+def emit(dimensions: dict = None) -> None:
+    """
+    計測結果を EMF 形式で標準出力に出す
+    :param dimensions: メトリクスのディメンション (イベントの種類など)
+    """
+    if not METRICS_ENABLED:
+        return
+    dimensions = dimensions or {}
+    current = getattr(_local, "values", None) or _Values()
+    _local.values = None
+    with _lock:
+        values = [(k, v, "Milliseconds") for k, v in current.timings.items()] + [(k, v, "Count") for k, v in current.counts.items()]
+    record = dict(dimensions)
+    if METRICS_MEMORY:
+        values += _memory_metrics(record)
+
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": METRICS_NAMESPACE,
+            "Dimensions": [list(dimensions.keys())],
+            "Metrics": [{"Name": k, "Unit": unit} for k, _, unit in values],
+        }],
+    }
+    record.update((k, v) for k, v, _ in values)
+    sys.stdout.write(json.dumps(record) + "\n")
+    sys.stdout.flush()
+
+
+def _memory_metrics(record: dict) -> list:
+    """ ピーク RSS と tracemalloc のピークを返し、確保の多い箇所を record に入れる """
+    import resource
+    import tracemalloc
+    values = [("peak_rss", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "Kilobytes")]  # Linux では KB
+    if tracemalloc.is_tracing():
+        _, peak = tracemalloc.get_traced_memory()
+        values.append(("tracemalloc_peak", peak, "Bytes"))
+        stats = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP]
+        record["tracemalloc_top"] = [f"{x.traceback[0].filename}:{x.traceback[0].lineno} {x.size}" for x in stats]
+    return values
@@ -5,15 +5,31 @@
 """
 通知記録のためのモジュール
 
-ローカルのファイルに通知済みの review_requested を保存
-インスタンス 1 にすることで、常に同じ環境が使われるようにする
-また、インスタンスがなくなるのは長時間使われなかった場合。そのときは通知記録が消えて OK なので問題ない
+通知済みの review_requested を保存する。保存先は NOTIFY_RECORD_BACKEND 環境変数で選ぶ
+  file - ローカルのファイル (デフォルト)
+         インスタンス 1 にすることで、常に同じ環境が使われるようにする
+         また、インスタンスがなくなるのは長時間使われなかった場合。そのときは通知記録が消えて OK なので問題ない
+  sqlite - ローカルの SQLite。同じホスト上の複数プロセスから使える
+  dynamodb - DynamoDB。条件付き書き込みで更新するので、インスタンス数を増やしても通知が漏れたり重複したりしない
+
+ファイルは 1 行 1 JSON のジャーナル形式
+  {"records": {...}}  - その時点の全レコード (スナップショット)
+  {"id": ..., "reviewers": [...], "datetime": ...}  - 1 PR 分の追記
+store() では通常は追記のみ行い、追記が増えすぎたらスナップショット 1 行に書き直す
 """
 
 import datetime
+import heapq
 import json
 import logging
+import os
 from pathlib import Path
+import random
+import threading
+import time
+
+import kv_store
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -22,16 +38,49 @@ g_record_dict = {}
 
 SEC_BORDER = 60
 
+NOTIFY_RECORD_BACKEND = os.getenv("NOTIFY_RECORD_BACKEND", "file")
+NOTIFY_RECORD_SQLITE = os.getenv("NOTIFY_RECORD_SQLITE", "/tmp/notify_record.sqlite3")
+NOTIFY_RECORD_TABLE = os.getenv("NOTIFY_RECORD_TABLE")
+MAX_CONFLICT_RETRY = 10
+CONFLICT_BACKOFF = 0.005  # 競合時のリトライ間隔の基準 (秒)。リトライごとに倍にして、ランダムに揺らす
+COMPACT_RATIO = 2  # ジャーナルの行数が、有効なレコード数の何倍を超えたら書き直すか
+COMPACT_MIN_LINES = 100
+
+g_expire_heap = []  # (有効期限の epoch 秒, pr_id) のヒープ。期限切れの削除を期限切れの件数分の処理で済ませる
+g_expire_at = {}  # pr_id -> 有効期限の epoch 秒。ヒープ内の古いエントリの判定に使う
+g_dirty = set()  # 未書き込みの pr_id
+g_loaded_file = None  # 読み込み済みの RECORD_FILE。warm なコンテナでは 1 度だけ読む
+g_journal_lines = 0
+g_needs_newline = False  # 旧形式など、ファイル末尾に改行がない場合は追記前に改行を入れる
+
 
 def load():
-    global g_record_dict
+    global g_record_dict, g_loaded_file, g_journal_lines, g_needs_newline
+    if g_loaded_file == RECORD_FILE:
+        return g_record_dict  # 読み込み済みならメモリ上のものをそのまま使う
+
+    g_record_dict = {}
+    g_journal_lines = 0
+    g_needs_newline = False
     record_file = Path(RECORD_FILE)
     if record_file.exists():
-        contents = json.loads(record_file.read_text())
-        g_record_dict = contents["records"]
-        logger.info(f"loaded {g_record_dict}")
+        with record_file.open() as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                g_journal_lines += 1
+                g_needs_newline = not line.endswith("\n")
+                if "records" in entry:
+                    g_record_dict = entry["records"]
+                else:
+                    g_record_dict[entry["id"]] = {"reviewers": entry["reviewers"], "datetime": entry["datetime"]}
+        logger.info(f"loaded {len(g_record_dict)} records")
     else:
         logger.info(f"{RECORD_FILE} does not exist")
+    _rebuild_index()
+    g_dirty.clear()
+    g_loaded_file = RECORD_FILE
     return g_record_dict
 
 
@@ -40,20 +89,188 @@ def query_pr_reviewers(pr_id):
     if not record:
         return []
     record_dt = datetime.datetime.fromisoformat(record["datetime"])
-    if SEC_BORDER < (datetime.datetime.now() - record_dt).seconds:
+    if SEC_BORDER < (datetime.datetime.now() - record_dt).total_seconds():
         return []
     return record["reviewers"]
 
 
 def insert_pr_reviewers(pr_id, reviewers):
-    now_str = datetime.datetime.now().isoformat()
-    g_record_dict[str(pr_id)] = {"reviewers": reviewers, "datetime": now_str}  # JSON 保存時の数値が文字列になるので、文字列で統一する
+    now = datetime.datetime.now()
+    pr_id = str(pr_id)  # JSON 保存時の数値が文字列になるので、文字列で統一する
+    g_record_dict[pr_id] = {"reviewers": reviewers, "datetime": now.isoformat()}
+    expire_at = now.timestamp() + SEC_BORDER
+    g_expire_at[pr_id] = expire_at
+    heapq.heappush(g_expire_heap, (expire_at, pr_id))
+    g_dirty.add(pr_id)
 
 
 def store():
-    global g_record_dict
-    logger.info(f"storeing info {g_record_dict}")
+    global g_journal_lines, g_needs_newline
+    _expire(time.time())
+    logger.info(f"storeing {len(g_dirty)} records, {len(g_record_dict)} records in total")
+
+    if g_loaded_file != RECORD_FILE or COMPACT_RATIO * len(g_record_dict) + COMPACT_MIN_LINES < g_journal_lines:
+        _compact()
+        return
+
+    # 変更分のみ追記
+    lines = [json.dumps(dict(g_record_dict[x], id=x)) + "\n" for x in g_dirty if x in g_record_dict]
+    if lines:
+        with Path(RECORD_FILE).open("a") as f:
+            if g_needs_newline:
+                f.write("\n")
+                g_needs_newline = False
+            f.writelines(lines)
+        g_journal_lines += len(lines)
+    g_dirty.clear()
+
+
+def _expire(now: float) -> None:
+    """ 期限切れのレコードをヒープの先頭から削除 """
+    while g_expire_heap and g_expire_heap[0][0] <= now:
+        expire_at, pr_id = heapq.heappop(g_expire_heap)
+        if g_expire_at.get(pr_id) == expire_at:  # 再登録された PR の古いエントリは無視する
+            del g_expire_at[pr_id]
+            g_record_dict.pop(pr_id, None)
+
+
+def _compact() -> None:
+    """ 有効なレコードだけをスナップショットとして書き直す """
+    global g_record_dict, g_loaded_file, g_journal_lines, g_needs_newline
+    now = time.time()
+    g_record_dict = {k: v for k, v in g_record_dict.items() if now < _record_expire_at(v)}
     record_file = Path(RECORD_FILE)
-    g_record_dict = {k: v for k, v in g_record_dict.items()
-                     if (datetime.datetime.now() - datetime.datetime.fromisoformat(v["datetime"])).seconds < SEC_BORDER}
-    record_file.write_text(json.dumps({"records": g_record_dict}))
+    tmp_file = record_file.with_name(record_file.name + ".tmp")
+    tmp_file.write_text(json.dumps({"records": g_record_dict}) + "\n")
+    os.replace(tmp_file, record_file)  # 書き込み途中のファイルを読まないよう、rename で置き換える
+    _rebuild_index()
+    g_dirty.clear()
+    g_loaded_file = RECORD_FILE
+    g_journal_lines = 1
+    g_needs_newline = False
+
+
+def _rebuild_index() -> None:
+    g_expire_at.clear()
+    g_expire_at.update((k, _record_expire_at(v)) for k, v in g_record_dict.items())
+    g_expire_heap[:] = [(v, k) for k, v in g_expire_at.items()]
+    heapq.heapify(g_expire_heap)
+
+
+def _record_expire_at(record: dict) -> float:
+    return datetime.datetime.fromisoformat(record["datetime"]).timestamp() + SEC_BORDER
+
+
+def get_pr_reviewers(pr_id) -> list:
+    """
+    PR の通知済みのレビュアーを返す。記録は通知できてから add_pr_reviewers で行う
+    :param pr_id:
+    :return: SEC_BORDER 秒以内に通知済みのレビュアー
+    """
+    return get_backend().get_pr_reviewers(str(pr_id))
+
+
+def add_pr_reviewers(pr_id, reviewers) -> list:
+    """
+    PR のレビュアーを通知済みとして記録し、すでに通知済みだったレビュアーを返す
+    取得と記録はバックエンドごとにアトミックに行われる
+    :param pr_id:
+    :param reviewers: 今回通知するレビュアー ("@hogehoge" のリスト)
+    :return: SEC_BORDER 秒以内に通知済みのレビュアー
+    """
+    return get_backend().add_pr_reviewers(str(pr_id), reviewers)
+
+
+class FileBackend:
+    """ RECORD_FILE に保存するバックエンド。同じコンテナ内のスレッド間のみ排他する """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def get_pr_reviewers(self, pr_id: str) -> list:
+        with self._lock:
+            with metrics.timer("notify_record_load"):
+                load()
+            return query_pr_reviewers(pr_id)
+
+    def add_pr_reviewers(self, pr_id: str, reviewers) -> list:
+        with self._lock:
+            with metrics.timer("notify_record_load"):
+                load()
+            notified = query_pr_reviewers(pr_id)
+            insert_pr_reviewers(pr_id, sorted(set(notified) | set(reviewers)))
+            with metrics.timer("notify_record_store"):
+                store()
+        return notified
+
+
+class SQLiteBackend:
+    """ SQLite に保存するバックエンド。BEGIN IMMEDIATE でプロセス間でも排他する """
+
+    def __init__(self, path: str = NOTIFY_RECORD_SQLITE):
+        import sqlite3  # file バックエンドのときは読み込まない (起動時間のため)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("CREATE TABLE IF NOT EXISTS records (pr_id TEXT PRIMARY KEY, reviewers TEXT, expire_at REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_expire_at ON records (expire_at)")
+
+    def get_pr_reviewers(self, pr_id: str) -> list:
+        with self._lock:
+            row = self._conn.execute("SELECT reviewers FROM records WHERE pr_id = ? AND ? < expire_at", (pr_id, time.time())).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def add_pr_reviewers(self, pr_id: str, reviewers) -> list:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM records WHERE expire_at <= ?", (now,))
+                row = self._conn.execute("SELECT reviewers FROM records WHERE pr_id = ?", (pr_id,)).fetchone()
+                notified = json.loads(row[0]) if row else []
+                self._conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?)",
+                                   (pr_id, json.dumps(sorted(set(notified) | set(reviewers))), now + SEC_BORDER))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return notified
+
+
+class KeyValueBackend:
+    """ 共有の KV ストアに保存するバックエンド。条件付き書き込みで、並列に更新されても記録が失われない """
+
+    def __init__(self, store):
+        self._store = store
+
+    def get_pr_reviewers(self, pr_id: str) -> list:
+        value, _ = self._store.get(f"notify_record/{pr_id}")
+        return value["reviewers"] if value else []
+
+    def add_pr_reviewers(self, pr_id: str, reviewers) -> list:
+        key = f"notify_record/{pr_id}"
+        for retry in range(MAX_CONFLICT_RETRY):
+            value, version = self._store.get(key)
+            notified = value["reviewers"] if value else []
+            expire_at = time.time() + SEC_BORDER
+            new_value = {"reviewers": sorted(set(notified) | set(reviewers))}
+            if self._store.put_if_version(key, new_value, version, expire_at):
+                return notified
+            logger.info(f"conflict on {key}. retrying")
+            time.sleep(random.uniform(0, CONFLICT_BACKOFF * 2 ** retry))
+        raise kv_store.ConflictError(f"failed to update {key}")
+
+
+_backend = None
+
+
+def get_backend():
+    """ NOTIFY_RECORD_BACKEND に応じたバックエンドを返す """
+    global _backend
+    if _backend is None:
+        if NOTIFY_RECORD_BACKEND == "sqlite":
+            _backend = SQLiteBackend()
+        elif NOTIFY_RECORD_BACKEND == "dynamodb":
+            _backend = KeyValueBackend(kv_store.DynamoDBKVStore(NOTIFY_RECORD_TABLE))
+        else:
+            _backend = FileBackend()
+    return _backend
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+送信待ちの通知を溜めておくキュー
+
+DELIVERY_MODE=deferred のとき、lambda_handler は通知をキューに入れてすぐに応答を返し、
+delivery_worker がキューから取り出して Slack に送信する。キューは OUTBOUND_QUEUE 環境変数で選ぶ
+  memory - プロセス内のキュー (テスト・単一プロセス用)
+  sqlite - ローカルの SQLite。プロセスが落ちても送信待ちの通知が残る
+  sqs - Amazon SQS。デプロイ時はこちら
+"""
+
+from collections import deque
+from dataclasses import asdict
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Tuple
+
+from delivery import Notification
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_QUEUE = os.getenv("OUTBOUND_QUEUE", "memory")
+OUTBOUND_QUEUE_SQLITE = os.getenv("OUTBOUND_QUEUE_SQLITE", "/tmp/outbound_queue.sqlite3")
+OUTBOUND_QUEUE_URL = os.getenv("OUTBOUND_QUEUE_URL")
+LEASE_SECONDS = 60  # 取り出してからこの秒数以内に ack されなければ、再度取り出せるようにする
+
+
+def encode(notification: Notification) -> str:
+    return json.dumps(asdict(notification))
+
+
+def decode(data: str) -> Notification:
+    return Notification(**json.loads(data))
+
+
+class MemoryQueue:
+    """ プロセス内のキュー """
+
+    def __init__(self):
+        self._items = deque()
+        self._leased = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def put(self, notifications: List[Notification]) -> None:
+        with self._lock:
+            for x in notifications:
+                self._next_id += 1
+                self._items.append((self._next_id, encode(x)))
+
+    def get_batch(self, max_items: int) -> List[Tuple[int, Notification]]:
+        """
+        通知を最大 max_items 件取り出す。取り出した通知は ack か release するまでほかからは取り出されない
+        :return: (ハンドル, 通知) のリスト
+        """
+        with self._lock:
+            batch = []
+            while self._items and len(batch) < max_items:
+                handle, data = self._items.popleft()
+                self._leased[handle] = data
+                batch.append((handle, decode(data)))
+            return batch
+
+    def ack(self, handles) -> None:
+        """ 送信済みの通知を削除 """
+        with self._lock:
+            for x in handles:
+                self._leased.pop(x, None)
+
+    def release(self, handles) -> None:
+        """ 送信に失敗した通知をキューに戻す """
+        with self._lock:
+            for x in handles:
+                if x in self._leased:
+                    self._items.append((x, self._leased.pop(x)))
+
+    def __len__(self):
+        return len(self._items) + len(self._leased)
+
+
+class SQLiteQueue:
+    """ SQLite のキュー。取り出した通知は LEASE_SECONDS 秒間ほかから見えなくなる """
+
+    def __init__(self, path: str = OUTBOUND_QUEUE_SQLITE):
+        import sqlite3  # memory, sqs のときは読み込まない (起動時間のため)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("CREATE TABLE IF NOT EXISTS outbox "
+                           "(id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT, leased_until REAL DEFAULT 0)")
+
+    def put(self, notifications: List[Notification]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("INSERT INTO outbox (data) VALUES (?)", [(encode(x),) for x in notifications])
+            self._conn.execute("COMMIT")
+
+    def get_batch(self, max_items: int) -> List[Tuple[int, Notification]]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute("SELECT id, data FROM outbox WHERE leased_until <= ? ORDER BY id LIMIT ?",
+                                      (now, max_items)).fetchall()
+            self._conn.executemany("UPDATE outbox SET leased_until = ? WHERE id = ?",
+                                   [(now + LEASE_SECONDS, x[0]) for x in rows])
+            self._conn.execute("COMMIT")
+        return [(x[0], decode(x[1])) for x in rows]
+
+    def ack(self, handles) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(x,) for x in handles])
+
+    def release(self, handles) -> None:
+        with self._lock:
+            self._conn.executemany("UPDATE outbox SET leased_until = 0 WHERE id = ?", [(x,) for x in handles])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+
+class SQSQueue:
+    """
+    Amazon SQS のキュー。通常は SQS から delivery_worker が直接呼び出されるので、get_batch は手動で取り出すとき用
+    boto3 は Lambda の実行環境に含まれているので、使うときにだけ import する
+    """
+    MAX_BATCH = 10  # SQS の 1 リクエストあたりの上限
+
+    def __init__(self, queue_url: str = OUTBOUND_QUEUE_URL):
+        import boto3
+        self._sqs = boto3.client("sqs")
+        self._queue_url = queue_url
+
+    def put(self, notifications: List[Notification]) -> None:
+        for i in range(0, len(notifications), self.MAX_BATCH):
+            entries = [{"Id": str(j), "MessageBody": encode(x)}
+                       for j, x in enumerate(notifications[i:i + self.MAX_BATCH])]
+            r = self._sqs.send_message_batch(QueueUrl=self._queue_url, Entries=entries)
+            if r.get("Failed"):
+                raise RuntimeError(f"failed to enqueue: {r['Failed']}")
+
+    def get_batch(self, max_items: int) -> List[Tuple[str, Notification]]:
+        r = self._sqs.receive_message(QueueUrl=self._queue_url, MaxNumberOfMessages=min(max_items, self.MAX_BATCH),
+                                      VisibilityTimeout=LEASE_SECONDS)
+        return [(x["ReceiptHandle"], decode(x["Body"])) for x in r.get("Messages", [])]
+
+    def ack(self, handles) -> None:
+        handles = list(handles)
+        for i in range(0, len(handles), self.MAX_BATCH):
+            entries = [{"Id": str(j), "ReceiptHandle": x} for j, x in enumerate(handles[i:i + self.MAX_BATCH])]
+            self._sqs.delete_message_batch(QueueUrl=self._queue_url, Entries=entries)
+
+    def release(self, handles) -> None:
+        for x in handles:
+            self._sqs.change_message_visibility(QueueUrl=self._queue_url, ReceiptHandle=x, VisibilityTimeout=0)
+
+
+_queue = None
+
+
+def get_queue():
+    """ OUTBOUND_QUEUE に応じたキューを返す """
+    global _queue
+    if _queue is None:
+        if OUTBOUND_QUEUE == "sqlite":
+            _queue = SQLiteQueue()
+        elif OUTBOUND_QUEUE == "sqs":
+            _queue = SQSQueue()
+        else:
+            _queue = MemoryQueue()
+    return _queue
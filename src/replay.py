@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+記録済みの webhook をまとめて再実行し、送られるはずの通知を JSONL で出力するツール
+
+mention やルーティングの処理を変えたときに、過去の webhook で通知がどう変わるかを diff で確認するために使う
+入力は以下のどちらか (複数指定可)
+  - ディレクトリ: tests/testdata と同じく "{name}-header.json" と "{name}-body*.json" の組
+  - JSONL: 1 行 1 配信で {"headers": {...}, "body": "..."} (body は JSON 文字列でも object でもよい)
+通知は Slack に送らず (DELIVERY_MODE=deferred の送信待ちキューを差し替えて) 記録だけする
+各配信は独立に評価する (X-GitHub-Delivery の重複判定, notify_record, review_state の記録は配信ごとに空の状態から始める)
+入力は少しずつ読み、同時に処理中のバッチも workers * 2 個までにするので、入力が大きくてもメモリ使用量は増えない
+  PYTHONPATH=./src python src/replay.py tests/testdata --config config.json -o replay.jsonl
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+import time
+
+import delivery_dedup
+import github_webhook_lambda
+import kv_store
+import metrics
+import notify_record
+import outbound_queue
+import review_state
+import user_resolver
+import webhook_payload
+
+logger = logging.getLogger(__name__)
+
+REPLAY_BATCH_SIZE = 100  # 1 回にワーカープロセスへ渡す配信の数
+DRY_RUN_URL = "dry-run://slack"
+
+
+class DryRunSink:
+    """ outbound_queue の代わりに、送信するはずだった通知を溜めておく """
+
+    def __init__(self):
+        self.notifications = []
+
+    def put(self, notifications) -> None:
+        self.notifications.extend(notifications)
+
+
+def iter_deliveries(sources):
+    """
+    入力から配信を順に読み込む
+    :param sources: ディレクトリか JSONL ファイルのパスのリスト
+    :return: (名前, lambda_handler に渡すイベント) のイテレータ。JSONL の行はパースせずに返す (ワーカープロセスでパースする)
+    """
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            yield from _iter_directory(path)
+        else:
+            yield from _iter_jsonl(path)
+
+
+def _iter_directory(path: Path):
+    for body_path in sorted(path.glob("*-body*.json")):
+        name = body_path.name.split("-body")[0]
+        header_path = path / f"{name}-header.json"
+        if not header_path.exists():
+            logger.warning("no header for %s. skipped", body_path)
+            continue
+        yield body_path.stem, {"headers": json.loads(header_path.read_text()), "body": body_path.read_text()}
+
+
+def _iter_jsonl(path: Path):
+    with path.open() as f:
+        for lineno, line in enumerate(f, 1):
+            if line.strip():
+                yield f"{path.name}:{lineno}", line
+
+
+def parse_event(event) -> dict:
+    """ JSONL の行を lambda_handler に渡すイベントにする。パース済みのイベントはそのまま返す """
+    if not isinstance(event, str):
+        return event
+    event = json.loads(event)
+    if not isinstance(event["body"], str):
+        event["body"] = json.dumps(event["body"])
+    return event
+
+
+def replay(deliveries, workers: int = os.cpu_count(), batch_size: int = REPLAY_BATCH_SIZE, config_file: str = None):
+    """
+    配信を再実行し、結果を入力と同じ順に返す
+    :param deliveries: iter_deliveries の返すイテレータ
+    :param workers: ワーカープロセスの数。0 ならこのプロセスで処理する
+    :param batch_size: 1 回にワーカープロセスへ渡す配信の数
+    :param config_file: config.json のパス
+    :return: 配信ごとの結果 (dict) のイテレータ
+    """
+    if workers == 0:
+        _init_worker(config_file)
+        for batch in _batches(deliveries, batch_size):
+            yield from _replay_batch(batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config_file,)) as executor:
+        pending = deque()
+        for batch in _batches(deliveries, batch_size):
+            pending.append(executor.submit(_replay_batch, batch))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _batches(iterable, size: int):
+    batch = []
+    for x in iterable:
+        batch.append(x)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker(config_file: str = None) -> None:
+    """
+    通知を送らずに記録するよう github_webhook_lambda を設定する。未登録のユーザを GitHub, Slack の API で引くこともしない
+    記録した配信には X-Hub-Signature-256 がないか、本文を整形して署名が合わないことが多いので、署名は検証しない
+    """
+    logging.getLogger().setLevel("WARNING")
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.DELIVERY_MODE = "deferred"
+    github_webhook_lambda.SLACK_URL = DRY_RUN_URL
+    github_webhook_lambda.SLACK_EXTRA_URLS = []
+    metrics.METRICS_ENABLED = False
+    webhook_payload.WEBHOOK_SECRET = ""
+    user_resolver.GITHUB_TOKEN = None  # get_resolver が None を返す (結果が API の応答で変わらないように)
+    user_resolver._resolver = None
+    if config_file:
+        github_webhook_lambda.CONFIG_FILE = config_file
+        github_webhook_lambda.CONFIG_SNAPSHOT = None
+
+
+def _replay_batch(batch) -> list:
+    return [_replay_one(name, event) for name, event in batch]
+
+
+def _replay_one(name: str, event) -> dict:
+    sink = DryRunSink()
+    outbound_queue._queue = sink
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup()
+    notify_record._backend = notify_record.KeyValueBackend(kv_store.MemoryKVStore())
+    review_state._tracker = review_state.ReviewStateTracker(snapshot=None)
+
+    r = {"name": name}
+    try:
+        event = parse_event(event)
+    except (ValueError, KeyError) as e:
+        r["error"] = repr(e)
+        r["notifications"] = []
+        return r
+    headers = event["headers"]
+    r.update({"delivery": headers.get("X-GitHub-Delivery"), "event": headers.get("X-GitHub-Event")})
+    try:
+        r["status"] = github_webhook_lambda.lambda_handler(event, None)["statusCode"]
+    except Exception as e:
+        r["error"] = repr(e)
+    r["notifications"] = [{"url": x.url, "text": x.payload.get("text"), "attachments": x.payload.get("attachments"),
+                           "group": x.group, "recipients": x.recipients} for x in sink.notifications]
+    return r
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="記録済みの webhook を再実行し、送られるはずの通知を JSONL で出力する")
+    parser.add_argument("sources", nargs="+", help="header/body の JSON があるディレクトリか JSONL ファイル")
+    parser.add_argument("-o", "--output", help="出力先 (省略時は標準出力)")
+    parser.add_argument("--config", default=github_webhook_lambda.CONFIG_FILE, help="config.json のパス")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="ワーカープロセスの数 (0 なら使わない)")
+    parser.add_argument("--batch-size", type=int, default=REPLAY_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    deliveries = notifications = errors = 0
+    start = time.perf_counter()
+    try:
+        for r in replay(iter_deliveries(args.sources), args.workers, args.batch_size, args.config):
+            out.write(json.dumps(r, ensure_ascii=False, sort_keys=True) + "\n")
+            deliveries += 1
+            notifications += len(r["notifications"])
+            errors += "error" in r
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{deliveries} deliveries, {notifications} notifications, {errors} errors in {elapsed:.2f} s "
+          f"({deliveries / elapsed:.1f} deliveries/s)", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
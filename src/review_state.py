@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PR ごと・reviewer ごとに、最後に通知した review の state と mention 先を覚えておき、変化があったときだけ通知するためのモジュール
+
+- state が変わった (commented -> approved など) か、初めての review なら、mention 先すべてに通知する
+- state が同じ (review の edited や、2 回目以降の commented) なら、新しく加わった mention 先にのみ通知する
+- review_requested で再度レビューを依頼されたら、その reviewer の記録を消す (再レビューの結果は通知する)
+覚えておく PR の数は REVIEW_STATE_MAX_PRS までで、超えたら最近更新されていない PR から捨てる (0 なら無効)
+REVIEW_STATE_SNAPSHOT を設定すると、REVIEW_STATE_SNAPSHOT_INTERVAL 秒に 1 回までその時点の状態をファイルに保存し、
+起動時に読み込む (webhook_server の再起動後も通知の抑制を続けるため)
+保存先は REVIEW_STATE_BACKEND 環境変数で選ぶ
+  memory - コンテナごとのメモリ上 (デフォルト。notify_record の file と同じく、インスタンス 1 の前提)
+           /tmp もコンテナごとなので、Lambda では REVIEW_STATE_SNAPSHOT は設定しない。新しいコンテナでは空の状態から始まる
+  dynamodb - REVIEW_STATE_TABLE の DynamoDB。条件付き書き込みで更新するので、インスタンス数を増やしても記録が失われない
+             PR ごとの記録は、最後に更新してから REVIEW_STATE_TTL 秒で消える (REVIEW_STATE_MAX_PRS の代わり)
+"""
+
+from collections import OrderedDict
+import logging
+import marshal
+import os
+from pathlib import Path
+import random
+import threading
+import time
+from typing import Iterable, Optional
+
+import kv_store
+
+logger = logging.getLogger(__name__)
+
+REVIEW_STATE_MAX_PRS = int(os.getenv("REVIEW_STATE_MAX_PRS", "10000"))
+REVIEW_STATE_SNAPSHOT = os.getenv("REVIEW_STATE_SNAPSHOT")
+REVIEW_STATE_SNAPSHOT_INTERVAL = float(os.getenv("REVIEW_STATE_SNAPSHOT_INTERVAL", "60"))
+SNAPSHOT_VERSION = 1
+REVIEW_STATE_BACKEND = os.getenv("REVIEW_STATE_BACKEND", "memory")
+REVIEW_STATE_TABLE = os.getenv("REVIEW_STATE_TABLE")
+REVIEW_STATE_TTL = float(os.getenv("REVIEW_STATE_TTL", str(30 * 24 * 3600)))
+MAX_CONFLICT_RETRY = 10
+CONFLICT_BACKOFF = 0.005  # 競合時のリトライ間隔の基準 (秒)。リトライごとに倍にして、ランダムに揺らす
+
+
+class ReviewStateTracker:
+    """
+    :param max_prs: 覚えておく PR の数
+    :param snapshot: 状態を保存するファイルのパス。None なら保存しない
+    :param snapshot_interval: 保存する最短の間隔 (秒)
+    """
+
+    def __init__(self, max_prs: int = REVIEW_STATE_MAX_PRS, snapshot: str = REVIEW_STATE_SNAPSHOT,
+                 snapshot_interval: float = REVIEW_STATE_SNAPSHOT_INTERVAL):
+        self.max_prs = max_prs
+        self.snapshot = snapshot
+        self.snapshot_interval = snapshot_interval
+        self.suppressed = 0
+        self.evictions = 0
+        self._prs = OrderedDict()  # PR の id -> {reviewer (小文字): (state, mention 先の frozenset)}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+        if snapshot:
+            self._load()
+
+    def evaluate(self, pr_id, reviewer: str, state: str, mentions: Iterable[str]):
+        """
+        記録はせずに、通知すべき mention 先を返す。通知できたら、返した更新を apply に渡して記録する
+        (通知に失敗して GitHub から再送されたときに、抑制してしまわないため)
+        :param pr_id: PR の id
+        :param reviewer: reviewer の GitHub ユーザ名
+        :param state: review の state (approved, commented, changes_requested)
+        :param mentions: この review での mention 先
+        :return: (通知すべき mention 先。通知しなくてよければ空, apply に渡す更新)
+        """
+        mentions = frozenset(mentions)
+        reviewer = reviewer.lower()
+        with self._lock:
+            prev = (self._prs.get(pr_id) or {}).get(reviewer)
+        return _evaluate(prev, pr_id, reviewer, state, mentions)
+
+    def apply(self, update) -> None:
+        """ evaluate の返した更新を記録する """
+        pr_id, reviewer, state, mentions, suppressed = update
+        with self._lock:
+            reviewers = self._prs.pop(pr_id, None) or {}
+            self._prs[pr_id] = reviewers
+            prev = reviewers.get(reviewer)
+            if prev is not None and prev[0] == state:
+                mentions = prev[1] | mentions
+            reviewers[reviewer] = (state, mentions)
+            self.suppressed += suppressed
+            self._dirty = True
+            self._evict()
+        self.save_if_due()
+
+    def transition(self, pr_id, reviewer: str, state: str, mentions: Iterable[str]) -> set:
+        """ evaluate して、すぐに apply する """
+        r, update = self.evaluate(pr_id, reviewer, state, mentions)
+        self.apply(update)
+        return r
+
+    def reset(self, pr_id, reviewers: Iterable[str]) -> None:
+        """ 再度レビューを依頼された reviewer の記録を消す """
+        with self._lock:
+            entry = self._prs.get(pr_id)
+            if not entry:
+                return
+            for reviewer in reviewers:
+                if entry.pop(reviewer.lstrip("@").lower(), None) is not None:
+                    self._dirty = True
+
+    def __len__(self):
+        return len(self._prs)
+
+    def _evict(self) -> None:
+        while len(self._prs) > self.max_prs:
+            self._prs.popitem(last=False)
+            self.evictions += 1
+
+    def save_if_due(self) -> None:
+        if self.snapshot and self._dirty and time.monotonic() - self._saved_at >= self.snapshot_interval:
+            self.save()
+
+    def save(self) -> None:
+        """ 状態をスナップショットに保存する。書き込めない環境では何もしない """
+        if not self.snapshot:
+            return
+        with self._lock:
+            data = marshal.dumps({"version": SNAPSHOT_VERSION, "prs": list(self._prs.items())})
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        tmp_path = f"{self.snapshot}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            Path(tmp_path).write_bytes(data)
+            os.replace(tmp_path, self.snapshot)
+        except OSError as e:
+            logger.info("review state snapshot is not written: %s", e)
+
+    def _load(self) -> None:
+        try:
+            data = marshal.loads(Path(self.snapshot).read_bytes())
+            if data.get("version") != SNAPSHOT_VERSION:
+                raise ValueError("unsupported snapshot format")
+            self._prs = OrderedDict(data["prs"])
+        except FileNotFoundError:
+            return
+        except (OSError, EOFError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning("failed to load %s: %s", self.snapshot, e)
+            return
+        self._evict()
+
+
+class KeyValueReviewStateTracker:
+    """
+    共有の KV ストアに保存する ReviewStateTracker。PR ごとに 1 つの値を、条件付き書き込みで更新する
+    :param store: kv_store の KV ストア
+    :param ttl: PR ごとの記録を、最後に更新してから残しておく秒数
+    """
+
+    def __init__(self, store, ttl: float = REVIEW_STATE_TTL):
+        self.ttl = ttl
+        self.suppressed = 0
+        self._store = store
+
+    def evaluate(self, pr_id, reviewer: str, state: str, mentions: Iterable[str]):
+        """ ReviewStateTracker.evaluate と同じ """
+        mentions = frozenset(mentions)
+        reviewer = reviewer.lower()
+        value, _ = self._store.get(_key(pr_id))
+        prev = (value or {}).get(reviewer)
+        return _evaluate(prev, pr_id, reviewer, state, mentions)
+
+    def apply(self, update) -> None:
+        """ evaluate の返した更新を記録する """
+        pr_id, reviewer, state, mentions, suppressed = update
+
+        def merge(reviewers: dict) -> dict:
+            prev = reviewers.get(reviewer)
+            merged = mentions | set(prev[1]) if prev is not None and prev[0] == state else mentions
+            reviewers[reviewer] = [state, sorted(merged)]
+            return reviewers
+        self._update(pr_id, merge)
+        self.suppressed += suppressed
+
+    def transition(self, pr_id, reviewer: str, state: str, mentions: Iterable[str]) -> set:
+        """ evaluate して、すぐに apply する """
+        r, update = self.evaluate(pr_id, reviewer, state, mentions)
+        self.apply(update)
+        return r
+
+    def reset(self, pr_id, reviewers: Iterable[str]) -> None:
+        """ 再度レビューを依頼された reviewer の記録を消す """
+        names = {x.lstrip("@").lower() for x in reviewers}
+
+        def remove(entry: dict) -> Optional[dict]:
+            if not names & entry.keys():
+                return None  # 変更なし
+            return {k: v for k, v in entry.items() if k not in names}
+        self._update(pr_id, remove)
+
+    def save(self) -> None:
+        """ 更新のたびにストアに書き込んでいるので、何もしない """
+
+    def _update(self, pr_id, func) -> None:
+        """ PR の記録を func(reviewer -> [state, mention 先]) の返り値で置き換える。None を返したら書き込まない """
+        key = _key(pr_id)
+        for retry in range(MAX_CONFLICT_RETRY):
+            value, version = self._store.get(key)
+            new_value = func(dict(value or {}))
+            if new_value is None:
+                return
+            if self._store.put_if_version(key, new_value, version, time.time() + self.ttl):
+                return
+            logger.info(f"conflict on {key}. retrying")
+            time.sleep(random.uniform(0, CONFLICT_BACKOFF * 2 ** retry))
+        raise kv_store.ConflictError(f"failed to update {key}")
+
+
+def _key(pr_id) -> str:
+    return f"review_state/{pr_id}"
+
+
+def _evaluate(prev, pr_id, reviewer: str, state: str, mentions: frozenset):
+    """ 前回の (state, mention 先) から、通知すべき mention 先と apply に渡す更新を返す """
+    if prev is None or prev[0] != state:
+        r = set(mentions)
+    else:
+        r = set(mentions - set(prev[1]))
+    return r, (pr_id, reviewer, state, mentions, bool(mentions) and not r)
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    """
+    REVIEW_STATE_BACKEND に応じた、モジュールレベルの ReviewStateTracker か KeyValueReviewStateTracker を返す
+    REVIEW_STATE_MAX_PRS が 0 なら None
+    """
+    global _tracker
+    if _tracker is None and REVIEW_STATE_MAX_PRS > 0:
+        with _tracker_lock:
+            if _tracker is None:
+                if REVIEW_STATE_BACKEND == "dynamodb":
+                    _tracker = KeyValueReviewStateTracker(kv_store.DynamoDBKVStore(REVIEW_STATE_TABLE))
+                else:
+                    _tracker = ReviewStateTracker()
+    return _tracker
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+リポジトリ・通知の種類・通知先のチーム から、通知を送る Slack Incoming Webhook の URL を決める
+
+config.json の "routes" に上から順にルールを書く。条件を省略した項目はすべてに一致する
+  {"routes": [{"repo": "some-org/*", "event": ["approved", "changes_requested"], "team": "backend",
+               "url": "https://hooks.slack.com/services/..."}, ...],
+   "teams": {"backend": ["@github_user", ...], ...}}
+  - repo: リポジトリの full_name の glob パターン (大文字小文字は区別しない)。リストも可
+  - event: NOTIFY_EMOTICON のキー (mentioned, review_requested, approved, commented, changes_requested)。リストも可
+  - team: "teams" のチーム名。通知先のユーザがそのチームに 1 人でも含まれれば一致する。リストも可
+  - url: 送信先。リスト (urls) も可
+一致したすべてのルールの URL に (ルールの順に、重複を除いて) 送る
+
+ルールは event ごとに、repo パターンの先頭の固定文字列 (先頭が wildcard なら末尾の固定文字列) で索引にしておく。
+判定ではリポジトリ名の先頭部分・末尾部分で索引を引き、候補のルールだけを調べるので、ルールの数が増えても遅くならない
+"""
+
+import fnmatch
+import re
+from typing import Iterable, Tuple
+
+WILDCARDS = re.compile(r"[*?\[]")
+
+
+class Router:
+    """
+    :param routes: ルールのリスト
+    :param teams: チーム名 -> GitHub ユーザ名のリスト
+    """
+
+    def __init__(self, routes: list, teams: dict = None):
+        self.routes = routes
+        self.urls = [tuple(_as_list(x.get("urls", x.get("url")))) for x in routes]
+        self._team_of = {}  # GitHub ユーザ名 (小文字, "@" なし) -> チーム名の set
+        for team, members in (teams or {}).items():
+            for login in members:
+                self._team_of.setdefault(login.lstrip("@").lower(), set()).add(team)
+
+        # event (None はすべて) -> (先頭の固定文字列 -> [(ルール番号, 残りの判定, チーム)], 末尾の固定文字列 -> 同じ)
+        self._index = {}
+        lengths = (set(), set())
+        for i, rule in enumerate(routes):
+            rule_teams = frozenset(_as_list(rule["team"])) if "team" in rule else None
+            for event in _as_list(rule.get("event")) or [None]:
+                for pattern in _as_list(rule.get("repo")) or ["*"]:
+                    side, literal, match = _compile(pattern.lower())
+                    buckets = self._index.setdefault(event, ({}, {}))[side]
+                    buckets.setdefault(literal, []).append((i, match, rule_teams))
+                    lengths[side].add(len(literal))
+        self._prefix_lengths, self._suffix_lengths = sorted(lengths[0]), sorted(lengths[1])
+
+    def route(self, repo: str, event: str = None, users: Iterable[str] = ()) -> Tuple[str, ...]:
+        """
+        :param repo: リポジトリの full_name
+        :param event: 通知の種類
+        :param users: 通知先の GitHub ユーザ名 ("@" つきでもよい)
+        :return: 送信先の URL。一致するルールがなければ空
+        """
+        repo = repo.lower()
+        teams = set()
+        for login in users:
+            teams.update(self._team_of.get(login.lstrip("@").lower(), ()))
+
+        matched = set()
+        for key in (event, None) if event else (None,):
+            index = self._index.get(key)
+            if not index:
+                continue
+            prefixes, suffixes = index
+            candidates = [prefixes.get(repo[:n], ()) for n in self._prefix_lengths if n <= len(repo)]
+            if suffixes:
+                candidates += [suffixes.get(repo[-n:], ()) for n in self._suffix_lengths if n <= len(repo)]
+            for entries in candidates:
+                for i, match, rule_teams in entries:
+                    if (match is None or match(repo)) and (rule_teams is None or not rule_teams.isdisjoint(teams)):
+                        matched.add(i)
+
+        return tuple(dict.fromkeys(x for i in sorted(matched) for x in self.urls[i]))
+
+
+def _compile(pattern: str):
+    """
+    :return: (0: 先頭で索引にする / 1: 末尾で索引にする, 索引にする固定文字列,
+              残りの判定。固定文字列 + "*" (末尾の場合は "*" + 固定文字列) のパターンなら判定不要なので None)
+    """
+    wildcards = [m.start() for m in WILDCARDS.finditer(pattern)]
+    if not wildcards:
+        return 0, pattern, pattern.__eq__
+    suffix = pattern[wildcards[-1] + 1:]
+    if wildcards[0] > 0 or "[" in pattern or not suffix:  # 固定文字列がなければ ("*" など)、すべてのリポジトリで調べる
+        side, literal, rest = 0, pattern[:wildcards[0]], pattern[wildcards[0]:]
+    else:
+        side, literal, rest = 1, suffix, pattern[:wildcards[-1] + 1]
+    if rest == "*":
+        return side, literal, None
+    return side, literal, re.compile(fnmatch.translate(pattern)).match
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
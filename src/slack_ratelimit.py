@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Slack への送信の流量制御モジュール
+
+Webhook URL ごとに以下を行い、slack_transport で送信する
+  - トークンバケットによる流量制限 (Slack の目安は 1 秒 1 メッセージ)
+  - 429 (Retry-After を尊重) と、Slack に届かなかった (接続できなかった) 場合の、揺らぎつき指数バックオフでのリトライ
+    Incoming Webhook は冪等ではないので、送ったあとの timeout や 5xx は重複して投稿しないようリトライしない
+  - 失敗が続く送信先への送信を一定時間止めるサーキットブレーカー
+"""
+
+import http.client
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import slack_transport
+
+logger = logging.getLogger(__name__)
+
+SLACK_RATE = float(os.getenv("SLACK_RATE", "1"))  # 1 秒あたりのメッセージ数。0 なら制限しない
+SLACK_BURST = int(os.getenv("SLACK_BURST", "5"))  # 連続して送ってよいメッセージ数
+SLACK_MAX_RETRIES = int(os.getenv("SLACK_MAX_RETRIES", "3"))
+SLACK_MAX_WAIT = float(os.getenv("SLACK_MAX_WAIT", "10"))  # 1 メッセージあたりの待ち時間の上限 (秒)。Lambda のタイムアウトに収める
+SLACK_BACKOFF = 0.5  # リトライ間隔の基準 (秒)
+BREAKER_THRESHOLD = 5  # 連続でこの回数失敗したら送信を止める
+BREAKER_RESET = 30.0  # 送信を止める秒数。経過後に 1 件だけ試す
+
+_senders = {}
+_senders_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """ サーキットブレーカーが開いていて送信しなかったときの例外 """
+
+
+class RateLimitError(Exception):
+    """ 流量制限による待ち時間が上限を超えるため送信しなかったときの例外 """
+
+
+class TokenBucket:
+    """
+    トークンバケット (GCRA で実装)。acquire で送信してよい時刻を予約し、待つべき秒数を返す
+    :param rate: 1 秒あたりのトークン数。0 なら制限しない
+    :param burst: バケットの容量
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tat = 0.0  # 次のトークンが理論上空く時刻
+        self._blocked_until = 0.0  # Retry-After などで送信を止める時刻
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float) -> Optional[float]:
+        """
+        :param max_wait: 待ってよい秒数の上限
+        :return: 送信まで待つべき秒数。max_wait を超える場合は予約せずに None
+        """
+        now = time.monotonic()
+        with self._lock:
+            allowed_at = max(now, self._blocked_until)
+            if self.rate > 0:
+                interval = 1.0 / self.rate
+                allowed_at = max(allowed_at, self._tat - (self.burst - 1) * interval)
+            wait = allowed_at - now
+            if max_wait < wait:
+                return None
+            if self.rate > 0:
+                self._tat = max(self._tat, allowed_at) + interval
+            return wait
+
+    def block(self, seconds: float) -> None:
+        """ 今から seconds 秒間、送信を止める (429 の Retry-After など) """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """ 連続した失敗が threshold 回に達したら reset_timeout 秒間 allow が False を返す """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None  # 半開状態で試しているスレッドの id
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial is not None:
+                return False
+            self._trial = threading.get_ident()  # 半開状態。1 件だけ試す
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial is not None or self.threshold <= self._failures:
+                if self._opened_at is None or self._trial is not None:
+                    logger.warning(f"circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+                self._trial = None
+
+    def end_trial(self) -> None:
+        """ このスレッドの半開状態の試行が成功・失敗を記録せずに終わった (429 が続いたなど) ときは、失敗として扱う """
+        with self._lock:
+            if self._trial != threading.get_ident():
+                return
+            self._opened_at = time.monotonic()
+            self._trial = None
+
+
+class RateLimitedSender:
+    """
+    1 つの Webhook URL への流量制御つきの送信クライアント。slack_transport と同じく notify(text=..., attachments=...) で送信する
+    delivered - 送信できた数、delayed - そのうち流量制限やリトライで待った数、dropped - 送信をあきらめた数
+    """
+
+    def __init__(self, url: str, rate: float = None, burst: int = None, max_retries: int = None,
+                 max_wait: float = None, breaker: CircuitBreaker = None):
+        self.url = url
+        self.bucket = TokenBucket(SLACK_RATE if rate is None else rate, SLACK_BURST if burst is None else burst)
+        self.max_retries = SLACK_MAX_RETRIES if max_retries is None else max_retries
+        self.max_wait = SLACK_MAX_WAIT if max_wait is None else max_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.delivered = 0
+        self.delayed = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def notify(self, **kwargs) -> str:
+        if not self.breaker.allow():
+            self._count(dropped=1)
+            raise CircuitOpenError(f"circuit is open for {self.url}")
+
+        try:
+            return self._notify(**kwargs)
+        finally:
+            self.breaker.end_trial()
+
+    def _notify(self, **kwargs) -> str:
+        waited = False
+        error = None
+        for attempt in range(self.max_retries + 1):
+            wait = self.bucket.acquire(self.max_wait)
+            if wait is None:
+                error = error or RateLimitError(f"rate limit wait exceeds {self.max_wait}s for {self.url}")
+                break
+            if 0 < wait:
+                waited = True
+                time.sleep(wait)
+
+            try:
+                response = slack_transport.get_transport(self.url).notify(**kwargs)
+            except slack_transport.SlackError as e:
+                if e.status != 429:
+                    if e.status < 500:
+                        self.breaker.record_success()  # 送信先は応答しているので、ブレーカーの上では成功とする
+                    else:
+                        self.breaker.record_failure()  # 投稿されたかもしれないので、リトライしない
+                    self._count(dropped=1)
+                    raise
+                error = e
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                self.bucket.block(delay)  # ほかのスレッドからの送信も止める
+                logger.info(f"slack rate limited. retry after {delay:.2f}s")
+                continue
+            except slack_transport.NotSentError as e:  # Slack に届いていないので、送り直してよい
+                error = e
+                delay = self._backoff(attempt)
+                self.breaker.record_failure()
+            except (OSError, http.client.HTTPException):  # 送ったあとの失敗 (timeout など) は、投稿されたかもしれない
+                self.breaker.record_failure()
+                self._count(dropped=1)
+                raise
+            else:
+                self.breaker.record_success()
+                self._count(delivered=1, delayed=1 if waited else 0)
+                return response
+
+            if self.breaker.is_open or attempt == self.max_retries or self.max_wait < delay:
+                break
+            logger.info(f"slack notify failed ({error}). retry after {delay:.2f}s")
+            waited = True
+            time.sleep(delay)
+
+        self._count(dropped=1)
+        raise error
+
+    def stats(self) -> dict:
+        return {"delivered": self.delivered, "delayed": self.delayed, "dropped": self.dropped}
+
+    def _count(self, delivered: int = 0, delayed: int = 0, dropped: int = 0) -> None:
+        with self._lock:
+            self.delivered += delivered
+            self.delayed += delayed
+            self.dropped += dropped
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return random.uniform(0, SLACK_BACKOFF * 2 ** attempt)
+
+
+def get_sender(url: str) -> RateLimitedSender:
+    """
+    url に対応する RateLimitedSender を返す。モジュールレベルで保持するので、流量制限の状態は warm な呼び出し間で引き継がれる
+    :param url: Slack Webhook URL
+    :return:
+    """
+    sender = _senders.get(url)
+    if sender is None:
+        with _senders_lock:
+            sender = _senders.setdefault(url, RateLimitedSender(url))
+    return sender
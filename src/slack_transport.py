@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Slack Incoming Webhook への送信モジュール
+
+Webhook URL ごとに HTTP keep-alive のコネクションをプールしておき、warm な Lambda の呼び出し間で使いまわす
+（毎回 TCP, TLS のハンドシェイクをしないため）
+Slack の Incoming Webhook は冪等ではないので、送り直すのはリクエストが Slack に届いていないとわかる場合
+（プール中のコネクションがサーバ側で切断されていた場合）だけにする
+"""
+
+from email.utils import parsedate_to_datetime
+import http.client
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+SLACK_POOL_SIZE = int(os.getenv("SLACK_POOL_SIZE", "4"))
+SLACK_TIMEOUT = float(os.getenv("SLACK_TIMEOUT", "10"))
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+class SlackError(Exception):
+    """ Slack が 2xx 以外を返したときの例外 """
+
+    def __init__(self, status: int, body: str, retry_after: float = None):
+        super().__init__(f"slack returned {status}: {body}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+
+class NotSentError(OSError):
+    """ リクエストを送り終える前に失敗した (接続できなかったなど) ときの例外。Slack には届いていないので、送り直してよい """
+
+
+class _StaleConnection(Exception):
+    """ プール中のコネクションがサーバ側で切断されていて、リクエストが Slack に届いていないときの例外 """
+
+
+class SlackTransport:
+    """
+    1 つの Webhook URL に対するコネクションプール付きの送信クライアント
+    slackweb.Slack と同じく notify(text=..., attachments=...) で送信する
+    """
+
+    def __init__(self, url: str, pool_size: int = SLACK_POOL_SIZE, timeout: float = SLACK_TIMEOUT):
+        parts = urlsplit(url)
+        self.url = url
+        self.timeout = timeout
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._path = parts.path + (f"?{parts.query}" if parts.query else "")
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self.connections_created = 0
+
+    def notify(self, **kwargs) -> str:
+        """
+        メッセージを送信
+        :param kwargs: text, attachments など Slack の payload
+        :return: Slack からのレスポンス本文
+        """
+        return self.send(kwargs)
+
+    def send(self, payload: dict) -> str:
+        data = json.dumps(payload).encode("utf-8")
+        conn, reused = self._acquire()
+        try:
+            try:
+                status, headers, body = self._post(conn, data, reused)
+            except _StaleConnection:
+                # keep-alive 中にサーバ側で切断されていた場合は、新しいコネクションで 1 度だけやり直す
+                logger.debug(f"stale connection to {self._netloc}. reconnecting")
+                conn.close()
+                conn = self._new_connection()
+                status, headers, body = self._post(conn, data, False)
+        except (OSError, http.client.HTTPException):
+            conn.close()  # リクエストを送ったあとの失敗 (timeout など) は、重複して投稿しないようにやり直さない
+            raise
+        self._release(conn, headers)
+
+        if not 200 <= status < 300:
+            raise SlackError(status, body, parse_retry_after(headers.get("Retry-After")))
+        return body
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _post(self, conn, data: bytes, reused: bool):
+        """
+        :raise _StaleConnection: reused のコネクションで、リクエストが Slack に届く前に失敗した
+        :raise NotSentError: 新しいコネクションで、接続か送信に失敗した
+        """
+        try:
+            conn.request("POST", self._path, body=data, headers={"Content-Type": "application/json"})
+        except (OSError, http.client.HTTPException) as e:
+            # 送り終える前の失敗なので、Slack は処理していない
+            if reused:
+                raise _StaleConnection() from e
+            raise NotSentError(f"request to {self._netloc} was not sent: {e!r}") from e
+        try:
+            response = conn.getresponse()
+        except http.client.RemoteDisconnected as e:
+            if reused:  # 応答を 1 バイトも返さずに切断された。アイドル切断と行き違った場合
+                raise _StaleConnection() from e
+            raise
+        body = response.read().decode("utf-8")  # 最後まで読まないとコネクションを再利用できない
+        return response.status, response.headers, body
+
+    def _acquire(self):
+        """ プール中のコネクションのうち、サーバ側で切断されていないものを返す。なければ新しく作る """
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return self._new_connection(), False
+            if not _is_closed(conn):
+                return conn, True
+            conn.close()
+
+    def _release(self, conn, headers) -> None:
+        if headers.get("Connection", "").lower() == "close":
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _new_connection(self):
+        self.connections_created += 1
+        return self._connection_class(self._netloc, timeout=self.timeout)
+
+
+def _is_closed(conn) -> bool:
+    """ 待機中のコネクションが読めるなら、サーバ側で切断された (応答待ちでないのにデータが来ることはない) """
+    if conn.sock is None:
+        return False  # 次の request で接続する
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):  # こちらで閉じたソケットなど
+        return True
+    return bool(readable)
+
+
+def parse_retry_after(value: str):
+    """
+    Retry-After ヘッダの値 (秒数か HTTP-date) を秒数にする
+    :return: 秒数。ヘッダがないか解釈できなければ None (呼び出し元の既定の間隔で待つ)
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        date = None
+    if date is None or date.tzinfo is None:
+        logger.debug("unsupported Retry-After: %s", value)
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def get_transport(url: str) -> SlackTransport:
+    """
+    url に対応する SlackTransport を返す。モジュールレベルで保持するので、warm な呼び出し間で使いまわされる
+    :param url: Slack Webhook URL
+    :return:
+    """
+    transport = _transports.get(url)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.setdefault(url, SlackTransport(url))
+    return transport
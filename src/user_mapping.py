@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+GitHub ユーザ名 -> Slack メンバー ID の対応表 (config.json の github_to_slack)
+
+- GitHub のユーザ名は大文字小文字を区別しないので、小文字にした索引 (mention.MentionIndex) で引く
+- "orgs" に organization ごとの対応表を書くと、その organization のリポジトリではそちらを優先して引く
+- 読み込み元の mtime (S3 の場合は ETag) が変わったら読み込みなおす。読み込みと索引の作成は別スレッドで行い、
+  できあがったら差し替える (それまでのリクエストは古い対応表を使う)
+- "routes", "teams" があれば、通知先の振り分けのルール (routing.Router) も合わせて読み込む
+- 作成済みの索引も含めた索引込み形式 (marshal) に変換しておくと、JSON のパースと索引の作成を省いて速く読み込める
+  (ファイルは JSON より大きくなる)。先頭行に変換元のサイズと CRC32 を入れ、変換元が変わっていたら使わない
+    PYTHONPATH=./src python src/user_mapping.py config.json config.mapping
+
+config.json の形式
+  {"github_to_slack": {"@github_user": "@SLACK_ID", ...},
+   "orgs": {"some-org": {"@github_user": "@SLACK_ID", ...}, ...},
+   "routes": [...], "teams": {...}}  (routing.py を参照)
+"""
+
+import binascii
+import json
+import logging
+import marshal
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+import mention
+import routing
+
+logger = logging.getLogger(__name__)
+
+# 読み込み元が変わったかを確認する間隔 (秒)
+USER_MAPPING_CHECK_INTERVAL = float(os.getenv("USER_MAPPING_CHECK_INTERVAL", "10"))
+MAPPING_SUFFIX = ".mapping"
+MAPPING_MAGIC = b"user_mapping"
+MAPPING_VERSION = 3
+
+
+class UserMapping:
+    """
+    読み込み済みの対応表。作成後は変更しない
+    :param github_to_slack: 共通の対応表
+    :param orgs: organization 名 -> その organization の対応表
+    :param indexes: 作成済みの索引。"" が共通、ほかは organization 名 (小文字)
+    :param routes: 通知先の振り分けのルール。なければ router は None
+    :param teams: チーム名 -> GitHub ユーザ名のリスト
+    """
+
+    def __init__(self, github_to_slack: dict, orgs: dict = None, indexes: dict = None, routes: list = None,
+                 teams: dict = None):
+        indexes = indexes or {}
+        self.github_to_slack = MappingProxyType(github_to_slack)
+        self.default = mention.MentionIndex(self.github_to_slack, index=indexes.get(""))
+        self.orgs = {}
+        for org, mapping in (orgs or {}).items():
+            org = org.lower()
+            self.orgs[org] = mention.MentionIndex(MappingProxyType(mapping), parent=self.default, index=indexes.get(org))
+        self.routes = routes or []
+        self.teams = teams or {}
+        self.router = routing.Router(self.routes, self.teams) if self.routes else None
+
+    def index_for(self, org: str = None) -> mention.MentionIndex:
+        """
+        :param org: organization 名 (リポジトリの full_name の "/" より前)
+        :return: その organization の索引。organization ごとの対応表がなければ共通の索引
+        """
+        if org and self.orgs:
+            return self.orgs.get(org.lower(), self.default)
+        return self.default
+
+    def __len__(self):
+        return len(self.github_to_slack) + sum(len(x.source) for x in self.orgs.values())
+
+    @classmethod
+    def from_config(cls, conf: dict) -> "UserMapping":
+        return cls(conf["github_to_slack"], conf.get("orgs"), routes=conf.get("routes"), teams=conf.get("teams"))
+
+    def dumps(self, source: bytes = None) -> bytes:
+        """
+        索引込み形式にする
+        :param source: 変換元の config.json の内容。サイズと CRC32 を先頭行に入れ、読み込むときに変換元と同じか確認する
+        """
+        header = b"%s %d %s\n" % (MAPPING_MAGIC, MAPPING_VERSION, _digest(source).encode() if source is not None else b"-")
+        return header + marshal.dumps({
+            "github_to_slack": dict(self.github_to_slack),
+            "orgs": {org: dict(x.source) for org, x in self.orgs.items()},
+            "indexes": dict({org: x.index for org, x in self.orgs.items()}, **{"": self.default.index}),
+            "routes": self.routes,
+            "teams": self.teams,
+        })
+
+    @classmethod
+    def loads(cls, data: bytes, source: bytes = None) -> "UserMapping":
+        """
+        索引込み形式から読み込む
+        :param source: 指定したときは、この内容から変換したものでなければ ValueError にする
+        """
+        header, _, body = data.partition(b"\n")
+        fields = header.split(b" ")
+        if len(fields) != 3 or fields[0] != MAPPING_MAGIC or fields[1] != b"%d" % MAPPING_VERSION:
+            raise ValueError("unsupported mapping format")
+        if source is not None and fields[2] != _digest(source).encode():
+            raise ValueError("mapping is not converted from the source")
+        conf = marshal.loads(body)
+        if not isinstance(conf, dict):
+            raise ValueError("unsupported mapping format")
+        return cls(conf["github_to_slack"], conf["orgs"], conf["indexes"], conf["routes"], conf["teams"])
+
+
+class MappingSource:
+    """
+    対応表の読み込み元。get() のたびに (check_interval 秒に 1 回) 変更を確認し、変わっていれば別スレッドで読み込みなおす
+    :param path: config.json か索引込み形式 (*.mapping) のパス。"s3://bucket/key" も可
+    :param snapshot: JSON を読み込んだときに、索引込み形式で保存するパス。読み込み元の内容から変換したものならこちらを読む
+    :param check_interval: 変更を確認する間隔 (秒)
+    """
+
+    def __init__(self, path: str, snapshot: str = None, check_interval: float = USER_MAPPING_CHECK_INTERVAL):
+        self.path = path
+        self.snapshot = snapshot
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._mapping = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reload_thread = None
+
+    def get(self) -> UserMapping:
+        """ 現在の対応表を返す。初回のみ読み込みを待つ """
+        if self._mapping is None:
+            with self._lock:
+                if self._mapping is None:
+                    self._version = self._stat()
+                    self._mapping = self._load()
+            return self._mapping
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._check()
+        return self._mapping
+
+    def _check(self) -> None:
+        try:
+            version = self._stat()
+        except Exception as e:  # S3 の一時的なエラーなどでは、古い対応表を使い続ける
+            logger.warning("failed to check %s: %s", self.path, e)
+            return
+        with self._lock:
+            if version == self._version or self._reload_thread is not None:
+                return
+            self._reload_thread = threading.Thread(target=self._reload, args=(version,), daemon=True)
+            self._reload_thread.start()
+
+    def _reload(self, version) -> None:
+        try:
+            mapping = self._load()
+            self._mapping = mapping  # 参照の差し替えのみなので、処理中のリクエストは古い対応表を使い続ける
+            self.reloads += 1
+            logger.info("reloaded %s: %d entries", self.path, len(mapping))
+        except Exception:
+            logger.exception("failed to reload %s. keep using the previous mapping", self.path)
+        finally:
+            with self._lock:
+                self._version = version  # 壊れたファイルを何度も読まないよう、失敗しても更新する
+                self._reload_thread = None
+
+    def _stat(self):
+        if self.path.startswith("s3://"):
+            bucket, key = self.path[len("s3://"):].split("/", 1)
+            return _s3_client().head_object(Bucket=bucket, Key=key)["ETag"]
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def _read(self) -> bytes:
+        if self.path.startswith("s3://"):
+            bucket, key = self.path[len("s3://"):].split("/", 1)
+            return _s3_client().get_object(Bucket=bucket, Key=key)["Body"].read()
+        return Path(self.path).read_bytes()
+
+    def _load(self) -> UserMapping:
+        data = self._read()
+        if self.path.endswith(MAPPING_SUFFIX):
+            return UserMapping.loads(data)
+        mapping = self._read_snapshot(data)
+        if mapping is None:
+            mapping = UserMapping.from_config(json.loads(data))
+            self._write_snapshot(mapping, data)
+        return mapping
+
+    def _read_snapshot(self, source: bytes):
+        """
+        source から変換したスナップショットがあれば読み込む。なければ None
+        (mtime では比べない。デプロイしたパッケージ内のファイルは mtime があてにならないため)
+        """
+        if not self.snapshot:
+            return None
+        try:
+            return UserMapping.loads(Path(self.snapshot).read_bytes(), source)
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            return None
+
+    def _write_snapshot(self, mapping: UserMapping, source: bytes) -> None:
+        """ スナップショットを保存する。書き込めない環境 (読み込み専用など) では何もしない """
+        if not self.snapshot:
+            return
+        tmp_path = f"{self.snapshot}.{os.getpid()}.tmp"
+        try:
+            Path(tmp_path).write_bytes(mapping.dumps(source))
+            os.replace(tmp_path, self.snapshot)
+        except (OSError, ValueError) as e:
+            logger.info("mapping snapshot is not written: %s", e)
+
+
+def _digest(data: bytes) -> str:
+    """ 変換元の内容の確認用の値。改ざんの検出ではないので、読み込みの速い CRC32 とサイズ (hashlib は読み込みだけで数 ms かかる) """
+    return f"{len(data)}:{binascii.crc32(data):08x}"
+
+
+_s3 = None
+
+
+def _s3_client():
+    global _s3
+    if _s3 is None:
+        import boto3  # Lambda のランタイムに含まれる。ローカルで S3 を使わないときは不要
+        _s3 = boto3.client("s3")
+    return _s3
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def get_source(path: str, snapshot: str = None) -> MappingSource:
+    """ path ごとに MappingSource を 1 つだけ作る """
+    source = _sources.get(path)
+    if source is None:
+        with _sources_lock:
+            source = _sources.get(path)
+            if source is None:
+                source = _sources[path] = MappingSource(path, snapshot)
+    return source
+
+
+def main(argv=None) -> int:
+    """ config.json を索引込み形式に変換する。CONFIG_SNAPSHOT にも使える (変換元のサイズと CRC32 を入れる) """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("usage: user_mapping.py config.json config.mapping", file=sys.stderr)
+        return 2
+    source = Path(argv[0]).read_bytes()
+    mapping = UserMapping.from_config(json.loads(source))
+    Path(argv[1]).write_bytes(mapping.dumps(source))
+    print(f"{len(mapping)} entries written to {argv[1]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+config.json に登録されていない GitHub ユーザの Slack メンバー ID を、ユーザ情報から引くモジュール
+
+GitHub のユーザ情報の email (GET /users/{login}) -> Slack の users.lookupByEmail の順に引く
+- 結果は件数上限・有効期限つきの LRU キャッシュに入れる。見つからなかったユーザも (短めの期限で) キャッシュし、何度も引かない
+- 1 つのイベントの通知先はまとめて渡し、キャッシュにないものだけを並列に引く
+- 通信エラーや 5xx は一時的なものとしてキャッシュしない
+GITHUB_TOKEN と SLACK_BOT_TOKEN (users:read.email スコープ) の両方が設定されているときのみ有効
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger(__name__)
+
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api")
+RESOLVER_CACHE_SIZE = int(os.getenv("RESOLVER_CACHE_SIZE", "10000"))
+RESOLVER_TTL = float(os.getenv("RESOLVER_TTL", "86400"))
+RESOLVER_NEGATIVE_TTL = float(os.getenv("RESOLVER_NEGATIVE_TTL", "3600"))  # 見つからなかったユーザを再度引くまでの秒数
+RESOLVER_MAX_WORKERS = int(os.getenv("RESOLVER_MAX_WORKERS", "8"))
+RESOLVER_TIMEOUT = float(os.getenv("RESOLVER_TIMEOUT", "5"))
+
+
+class ResolverError(Exception):
+    """ 一時的なエラー (通信エラー, 5xx, rate limit)。キャッシュしない """
+
+
+class ResolutionCache:
+    """
+    GitHub ユーザ名 (小文字) -> Slack メンバー ID の LRU + TTL キャッシュ。見つからなかった場合は None を入れる
+    :param max_entries: 保持する件数の上限。超えたら古いものから捨てる
+    :param ttl: 見つかった結果を保持する秒数
+    :param negative_ttl: 見つからなかった結果を保持する秒数
+    """
+
+    def __init__(self, max_entries: int = RESOLVER_CACHE_SIZE, ttl: float = RESOLVER_TTL,
+                 negative_ttl: float = RESOLVER_NEGATIVE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # login -> (slack_id, 有効期限)
+        self._lock = threading.Lock()
+
+    def get(self, login: str):
+        """ :return: (キャッシュにあったか, Slack メンバー ID か None) """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(login)
+            if entry is not None and now < entry[1]:
+                self._entries.move_to_end(login)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[login]
+            self.misses += 1
+            return False, None
+
+    def put(self, login: str, slack_id: Optional[str]) -> None:
+        expire_at = time.time() + (self.ttl if slack_id else self.negative_ttl)
+        with self._lock:
+            self._entries[login] = (slack_id, expire_at)
+            self._entries.move_to_end(login)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries)}
+
+
+class UserResolver:
+    """
+    GitHub ユーザ名から Slack メンバー ID を引く
+    :param github_api_url: GitHub API の URL
+    :param github_token: GitHub のトークン
+    :param slack_api_url: Slack Web API の URL
+    :param slack_token: Slack の Bot トークン
+    :param cache: ResolutionCache
+    :param max_workers: 並列に引く数
+    """
+
+    def __init__(self, github_api_url: str = GITHUB_API_URL, github_token: str = GITHUB_TOKEN,
+                 slack_api_url: str = SLACK_API_URL, slack_token: str = SLACK_BOT_TOKEN,
+                 cache: ResolutionCache = None, max_workers: int = RESOLVER_MAX_WORKERS):
+        self.github_api_url = github_api_url.rstrip("/")
+        self.github_token = github_token
+        self.slack_api_url = slack_api_url.rstrip("/")
+        self.slack_token = slack_token
+        self.cache = cache or ResolutionCache()
+        self.max_workers = max_workers
+        self.remote_calls = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def resolve_many(self, logins: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        :param logins: GitHub ユーザ名 ("@" なし) のリスト
+        :return: ユーザ名 -> Slack メンバー ID (見つからない・一時的なエラーのときは None)
+        """
+        r, missing = {}, {}
+        for login in logins:
+            hit, slack_id = self.cache.get(login.lower())
+            if hit:
+                r[login] = slack_id
+            else:
+                missing.setdefault(login.lower(), []).append(login)
+        if not missing:
+            return r
+
+        if len(missing) == 1:  # 1 件ならスレッドを使うまでもない
+            results = [self._resolve_and_cache(x) for x in missing]
+        else:
+            results = list(self._get_executor().map(self._resolve_and_cache, missing))
+        for (key, originals), slack_id in zip(missing.items(), results):
+            for login in originals:
+                r[login] = slack_id
+        return r
+
+    def _resolve_and_cache(self, login: str) -> Optional[str]:
+        try:
+            slack_id = self._lookup(login)
+        except ResolverError as e:
+            logger.warning("failed to resolve %s: %s", login, e)
+            return None
+        self.cache.put(login, slack_id)
+        return slack_id
+
+    def _lookup(self, login: str) -> Optional[str]:
+        user = self._get_json(f"{self.github_api_url}/users/{quote(login)}",
+                              {"Authorization": f"Bearer {self.github_token}", "Accept": "application/vnd.github+json"})
+        email = user.get("email") if user else None
+        if not email:
+            return None
+        r = self._get_json(f"{self.slack_api_url}/users.lookupByEmail?{urlencode({'email': email})}",
+                           {"Authorization": f"Bearer {self.slack_token}"})
+        if r.get("ok"):
+            return "@" + r["user"]["id"]
+        if r.get("error") == "ratelimited":
+            raise ResolverError("slack rate limited")
+        return None  # users_not_found など
+
+    def _get_json(self, url: str, headers: dict) -> Optional[dict]:
+        """ :return: レスポンスの JSON。404 なら None """
+        import urllib.error
+        import urllib.request
+        with self._lock:
+            self.remote_calls += 1
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=RESOLVER_TIMEOUT) as res:
+                return json.loads(res.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise ResolverError(f"{url.split('?')[0]} returned {e.code}") from e
+        except (OSError, ValueError) as e:
+            raise ResolverError(str(e)) from e
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="resolver")
+        return self._executor
+
+
+class FallbackIndex:
+    """
+    mention.MentionIndex の代わりに使う索引。config.json にないユーザも "@login" (小文字) として残し、
+    Slack メンバー ID は resolve_slack_ids で UserResolver から引く
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def resolve(self, login: str) -> Optional[str]:
+        return self.index.resolve(login) or "@" + login.lstrip("@").lower()
+
+    def slack_id(self, key: str) -> Optional[str]:
+        return self.index.slack_id(key)
+
+
+def resolve_slack_ids(keys, index, resolver: UserResolver) -> Dict[str, Optional[str]]:
+    """
+    :param keys: 設定上のキーか "@login" のリスト
+    :param index: MentionIndex か FallbackIndex
+    :param resolver: 未設定のユーザを引く UserResolver。None なら引かない
+    :return: キー -> Slack メンバー ID (見つからなければ None)
+    """
+    r = {key: index.slack_id(key) for key in keys}
+    unknown = [key[1:] for key, slack_id in r.items() if slack_id is None]
+    if unknown and resolver is not None:
+        for login, slack_id in resolver.resolve_many(unknown).items():
+            r["@" + login] = slack_id
+    return r
+
+
+_resolver = None
+
+
+def get_resolver() -> Optional[UserResolver]:
+    """ モジュールレベルの UserResolver を返す。トークンが設定されていなければ None """
+    global _resolver
+    if _resolver is None and GITHUB_TOKEN and SLACK_BOT_TOKEN:
+        _resolver = UserResolver()
+    return _resolver
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+GitHub WebHook の payload を、ハンドラに渡す前に軽く処理するモジュール
+
+- パースする前に、大きすぎる body と X-Hub-Signature-256 の署名が合わない body を捨てる
+- body 全体をパースする前に action だけを取り出す (対象外のイベントを早期に捨てるため)
+- パース後、ハンドラが参照するフィールドだけを残したコンパクトな dict にする
+"""
+
+import hashlib
+import hmac
+import os
+import re
+from typing import Optional
+
+# X-Hub-Signature-256 の検証に使う secret (GitHub の Webhook 設定の Secret)。空なら署名は検証しない
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# これより大きい body (UTF-8 のバイト数) はパースせずに捨てる。既定値は Lambda の同期呼び出しの payload の上限 (6MB)
+# (API Gateway の上限 10MB より小さく、これを超える body は Lambda まで届かない)。
+# webhook_server で GitHub の payload の上限 (25MB) まで受けたい場合は大きくする
+WEBHOOK_MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", str(6 * 1024 * 1024)))
+SIGNATURE_PREFIX = "sha256="
+
+# GitHub の payload は先頭のキーが "action" なので、先頭だけを見れば action がわかる
+ACTION_PROBE_REGEXP = re.compile(r'\s*\{\s*"action"\s*:\s*"([^"\\]*)"')
+ACTION_PROBE_BYTES = 256
+
+# issue, pull_request, comment, review で共通して参照するフィールド
+_ITEM_FIELDS = {
+    "id": None,
+    "html_url": None,
+    "body": None,
+    "user": {"login": None},
+}
+
+# ハンドラが参照するフィールド。None はその値をそのまま残す。list の場合は各要素に適用する
+PAYLOAD_FIELDS = {
+    "action": None,
+    "changes": {"body": {"from": None}},
+    "issue": dict(_ITEM_FIELDS, number=None),
+    "comment": _ITEM_FIELDS,
+    "pull_request": dict(_ITEM_FIELDS, number=None, requested_reviewers=_ITEM_FIELDS["user"]),
+    "review": dict(_ITEM_FIELDS, state=None),
+    "repository": {"full_name": None},
+}
+
+
+def gate(body: str, signature: Optional[str], secret: str = None, max_bytes: int = None) -> Optional[int]:
+    """
+    パースする前の検査
+    :param body: JSON 文字列
+    :param signature: X-Hub-Signature-256 ヘッダの値
+    :param secret: 省略時は WEBHOOK_SECRET
+    :param max_bytes: 省略時は WEBHOOK_MAX_BODY_BYTES
+    :return: 問題なければ None。拒否する場合は応答する HTTP ステータス (413 - 大きすぎる, 401 - 署名が合わない)
+    """
+    secret = WEBHOOK_SECRET if secret is None else secret
+    max_bytes = WEBHOOK_MAX_BODY_BYTES if max_bytes is None else max_bytes
+    if len(body) > max_bytes:  # 文字数 <= バイト数なので、encode しなくても超えているとわかる
+        return 413
+    data = None
+    if not body.isascii():  # ASCII だけなら文字数 = バイト数
+        data = body.encode("utf-8")
+        if len(data) > max_bytes:
+            return 413
+    if not secret:
+        return None
+    if not verify_signature(body.encode("utf-8") if data is None else data, signature, secret):
+        return 401
+    return None
+
+
+def verify_signature(data: bytes, signature: Optional[str], secret: str) -> bool:
+    """
+    X-Hub-Signature-256 ("sha256=" + HMAC-SHA256 の 16 進) を検証する。比較にかかる時間は一致した長さによらない
+    :param data: 受け取ったままの body
+    :param signature: X-Hub-Signature-256 ヘッダの値
+    :param secret: Webhook の secret
+    """
+    if not signature or not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), data, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected.encode("ascii"), signature[len(SIGNATURE_PREFIX):].encode("utf-8"))
+
+
+def probe_action(body: str) -> Optional[str]:
+    """
+    body をパースせずに action を取り出す
+    :param body: JSON 文字列
+    :return: action。先頭に action がない場合は None (全体をパースして判断すること)
+    """
+    m = ACTION_PROBE_REGEXP.match(body[:ACTION_PROBE_BYTES])
+    if not m:
+        return None
+    return m.group(1)
+
+
+def extract(body: dict, fields: dict = PAYLOAD_FIELDS) -> dict:
+    """
+    パース済みの body から、fields に指定したフィールドだけを同じ構造のまま取り出す
+    :param body: パース済みの payload
+    :param fields: 取り出すフィールドの指定
+    :return: コンパクトな payload
+    """
+    r = {}
+    for key, sub_fields in fields.items():
+        if key not in body:
+            continue
+        value = body[key]
+        if sub_fields is None or value is None:
+            r[key] = value
+        elif isinstance(value, list):
+            r[key] = [extract(x, sub_fields) for x in value]
+        else:
+            r[key] = extract(value, sub_fields)
+    return r
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lambda を使わずに常駐サーバとして動かすためのエントリポイント
+
+HTTP リクエストを API Gateway のイベントの形に変換して github_webhook_lambda.lambda_handler を呼び出す
+  - リクエストは SERVER_MAX_WORKERS 個のスレッドで並行に処理する
+  - 処理中 + 待ちのリクエストが SERVER_MAX_WORKERS + SERVER_MAX_PENDING を超えたら、すぐに 503 を返す
+  - SIGTERM, SIGINT を受けたら新しい接続の受付を止め、処理中のリクエストと送信待ちの通知を送り終えてから終了する
+DELIVERY_MODE=deferred で OUTBOUND_QUEUE が sqs 以外の場合は、送信待ちの通知をバックグラウンドで delivery_worker と同じ処理で送信する
+METRICS=1 の計測値はリクエストを処理するスレッドごとに持つので、並行に処理したリクエストの値は混ざらない
+(METRICS_MEMORY=1 のメモリの計測値だけはプロセス全体のもの)
+  PYTHONPATH=./src python src/webhook_server.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+import os
+import signal
+import threading
+
+import delivery_worker
+import github_webhook_lambda
+import outbound_queue
+import review_state
+import webhook_payload
+
+logger = logging.getLogger(__name__)
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_MAX_WORKERS = int(os.getenv("SERVER_MAX_WORKERS", "16"))
+SERVER_MAX_PENDING = int(os.getenv("SERVER_MAX_PENDING", "64"))
+SERVER_REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "10"))  # 1 リクエストを読み書きする socket の timeout (秒)
+SERVER_DELIVERY_INTERVAL = 1.0  # deferred のとき、送信待ちの通知を送信する間隔 (秒)
+
+# API Gateway と同じく、lambda_handler が参照するヘッダは GitHub が送る名前にそろえる (HTTP/2 のプロキシは小文字にするため)
+CANONICAL_HEADERS = {x.lower(): x for x in ["X-GitHub-Event", "X-GitHub-Delivery", "X-Hub-Signature-256", "Content-Type"]}
+REJECT_MAX_PENDING = 64  # 503 を返す待ちの接続の数。これも超えたら応答せずに閉じる
+REJECT_MAX_READ_BYTES = 64 * 1024  # 503 を返すときに読み捨てる body の上限。これより大きければ読まずに閉じる
+
+
+def to_event(method: str, path: str, headers, body: str) -> dict:
+    """
+    HTTP リクエストを API Gateway (Lambda プロキシ統合) のイベントの形にする
+    :param method: HTTP メソッド
+    :param path: リクエストのパス
+    :param headers: リクエストヘッダ (name, value) を返す items() をもつもの
+    :param body: リクエストボディ
+    :return: lambda_handler に渡すイベント
+    """
+    return {
+        "httpMethod": method,
+        "path": path,
+        "headers": {CANONICAL_HEADERS.get(k.lower(), k): v for k, v in headers.items()},
+        "body": body,
+        "isBase64Encoded": False,
+    }
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """
+    1 リクエストごとに接続を閉じる (keep-alive の接続でワーカーを占有しないため)
+    送信の遅いクライアントでワーカーが埋まらないよう、SERVER_REQUEST_TIMEOUT 秒読み書きできなければ閉じる
+    """
+    server_version = "github-slack-integration"
+    timeout = SERVER_REQUEST_TIMEOUT
+
+    def do_POST(self):
+        length = self._content_length()
+        if length is None:
+            self._respond(400, json.dumps({"result": "invalid request"}).encode())
+            return
+        if length > webhook_payload.WEBHOOK_MAX_BODY_BYTES:  # 大きすぎる body は読まずに捨てる
+            self._respond(413, json.dumps({"result": "rejected"}).encode())
+            return
+        try:
+            body = self.rfile.read(length).decode("utf-8")
+        except UnicodeDecodeError:
+            self._respond(400, json.dumps({"result": "invalid request"}).encode())
+            return
+        event = to_event(self.command, self.path, self.headers, body)
+        try:
+            response = github_webhook_lambda.lambda_handler(event, None)
+        except Exception:
+            logger.exception("lambda_handler failed")
+            response = {"statusCode": 500, "body": json.dumps({"result": "error"})}
+        self._respond(response["statusCode"], response.get("body", "").encode())
+
+    def do_GET(self):
+        """ ロードバランサのヘルスチェック用 """
+        self._respond(200, json.dumps({"result": "ok"}).encode())
+
+    def _content_length(self):
+        """ :return: Content-Length の値。整数でないか負なら None """
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return None
+        return length if length >= 0 else None
+
+    def _respond(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class BusyRequestHandler(WebhookRequestHandler):
+    """
+    ワーカーに空きがないときに webhook の POST に 503 を返す。REJECT_MAX_READ_BYTES までの body は読み捨てる
+    (読まずに閉じると、クライアントには RST が届くため)。それより大きければ読まずに応答して閉じる
+    GET (ヘルスチェック) には 200 を返す。混んでいるだけのサーバを、ロードバランサが異常と判定して外さないように
+    """
+    timeout = 1  # 遅いクライアントで 503 の応答が詰まらないように
+
+    def do_POST(self):
+        self.server.count_rejected()
+        length = self._content_length()
+        if length is not None and length <= REJECT_MAX_READ_BYTES:
+            self.rfile.read(length)
+        self.send_response(503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Retry-After", "1")
+        self.send_header("Connection", "close")
+        body = json.dumps({"result": "busy"}).encode()
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class WebhookServer(HTTPServer):
+    """
+    ワーカー数に上限のある HTTP サーバ
+    :param address: (host, port)。port が 0 なら空いているポートを使う
+    :param max_workers: 並行に処理するリクエストの数
+    :param max_pending: 処理を待たせるリクエストの数。これを超えたら 503 を返す
+    """
+    request_queue_size = 128  # listen のバックログ。503 を返す前に接続を拒否しないよう大きめにする
+
+    def __init__(self, address=(SERVER_HOST, SERVER_PORT), max_workers: int = SERVER_MAX_WORKERS,
+                 max_pending: int = SERVER_MAX_PENDING):
+        super().__init__(address, WebhookRequestHandler)
+        self.rejected = 0  # 混んでいて処理しなかった webhook の数
+        self._rejected_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._rejector = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-busy")
+        self._reject_slots = threading.BoundedSemaphore(REJECT_MAX_PENDING)
+        self._stopped = threading.Event()
+        self._threads = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def process_request(self, request, client_address):
+        """ 受け付けたスレッドでは処理せず、ワーカーに渡す。空きがなければ 503 を返す """
+        if self._slots.acquire(blocking=False):
+            self._executor.submit(self._process, request, client_address, self.RequestHandlerClass, self._slots)
+            return
+        if self._reject_slots.acquire(blocking=False):
+            self._rejector.submit(self._process, request, client_address, BusyRequestHandler, self._reject_slots)
+        else:
+            self.count_rejected()
+            self.shutdown_request(request)
+
+    def count_rejected(self) -> None:
+        with self._rejected_lock:
+            self.rejected += 1
+
+    def _process(self, request, client_address, handler_class, slots):
+        try:
+            handler_class(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            slots.release()
+
+    def start(self) -> "WebhookServer":
+        """ 別スレッドで受付を開始する。deferred のときは通知の送信も開始する """
+        self._threads.append(threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True))
+        if _needs_local_delivery():
+            self._threads.append(threading.Thread(target=self._deliver_loop, daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self) -> None:
+        """ 受付を止め、処理中のリクエストと送信待ちの通知を送り終えてから終了する """
+        self.shutdown()
+        self.drain()
+        self.server_close()
+
+    def drain(self) -> None:
+        """ 受付を止めたあとに呼ぶ。処理中のリクエストを待ち、送信待ちの通知を送信する """
+        self._executor.shutdown(wait=True)
+        self._rejector.shutdown(wait=True)
+        tracker = review_state.get_tracker()
+        if tracker is not None:
+            tracker.save()
+        self._stopped.set()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join()
+        if _needs_local_delivery():
+            r = delivery_worker.lambda_handler({}, None)
+            logger.info("drained: %s", r)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _deliver_loop(self) -> None:
+        while not self._stopped.wait(SERVER_DELIVERY_INTERVAL):
+            try:
+                delivery_worker.lambda_handler({}, None)
+            except Exception:
+                logger.exception("delivery failed")
+
+
+def _needs_local_delivery() -> bool:
+    """ deferred で、キューがこのプロセスから送信すべきもの (memory, sqlite) か """
+    return github_webhook_lambda.DELIVERY_MODE == "deferred" and outbound_queue.OUTBOUND_QUEUE != "sqs"
+
+
+def serve(host: str = SERVER_HOST, port: int = SERVER_PORT) -> None:
+    """ SIGTERM, SIGINT を受けるまでサーバを動かす """
+    server = WebhookServer((host, port))
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    server.start()
+    logger.info("listening on %s:%d", host, server.server_address[1])
+    stop.wait()
+    logger.info("shutting down")
+    server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOGGING_LEVEL", "INFO"))
+    serve()
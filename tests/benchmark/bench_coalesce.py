@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+通知のまとめ (coalesce) のベンチマーク
+
+inline コメントつきのレビューを submit したときの配信 (pull_request_review 1 件 + pull_request_review_comment N 件) を
+DELIVERY_MODE=deferred の lambda_handler に流し、delivery_worker で送信したときの Slack への送信回数を、
+まとめる場合とまとめない場合で比較する
+  PYTHONPATH=./src python tests/benchmark/bench_coalesce.py
+"""
+
+import json
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import coalesce  # noqa: E402
+import delivery_dedup  # noqa: E402
+import delivery_worker  # noqa: E402
+import github_webhook_lambda  # noqa: E402
+import outbound_queue  # noqa: E402
+import slack_ratelimit  # noqa: E402
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+PR_URL = "https://github.com/smatsumt/testrepo2/pull/2"
+
+
+def review_storm(reviews: int, comments_per_review: int):
+    """ レビューごとに、inline コメント (reviewee への mention つき) を comments_per_review 件つける """
+    review_headers = json.loads((TESTDATA_PATH / "review-submitted-header.json").read_text())
+    review_body = json.loads((TESTDATA_PATH / "review-submitted-body.json").read_text())
+    comment_headers = dict(json.loads((TESTDATA_PATH / "mentioned-header.json").read_text()),
+                           **{"X-GitHub-Event": "pull_request_review_comment"})
+    comment_body = json.loads((TESTDATA_PATH / "mentioned-body.json").read_text())
+    events = []
+    for r in range(reviews):
+        for c in range(comments_per_review):
+            body = dict(comment_body, comment=dict(comment_body["comment"], body=f"@smatsumt nit {c}",
+                                                   html_url=f"{PR_URL}#discussion_r{r}{c:04d}",
+                                                   user={"login": "skawagt"}))
+            events.append({"headers": dict(comment_headers, **{"X-GitHub-Delivery": f"comment-{r}-{c}"}),
+                           "body": json.dumps(body)})
+        events.append({"headers": dict(review_headers, **{"X-GitHub-Delivery": f"review-{r}"}),
+                       "body": json.dumps(review_body)})
+    return events
+
+
+def replay(events, url: str) -> None:
+    github_webhook_lambda.SLACK_URL = url
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup()
+    outbound_queue._queue = outbound_queue.MemoryQueue()
+    for event in events:
+        github_webhook_lambda.lambda_handler(event, None)
+    delivery_worker.lambda_handler({}, None)
+
+
+def main():
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.DELIVERY_MODE = "deferred"
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@U0001", "@skawagt": "@U0002"})
+    slack_ratelimit.SLACK_RATE = 0
+    delivery_worker.WORKER_BATCH_SIZE = 100
+    original_coalesce = coalesce.coalesce
+
+    for reviews, comments in [(1, 10), (5, 20), (20, 30)]:
+        events = review_storm(reviews, comments)
+        counts = {}
+        for label, func in [("without", lambda items, **kwargs: [(x[1], [x[0]]) for x in items]),
+                            ("with", original_coalesce)]:
+            coalesce.coalesce = func
+            with FakeSlackServer() as server:
+                replay(events, server.url)
+                counts[label] = server.requests
+        print(f"{reviews:3d} reviews x {comments:3d} comments ({len(events):4d} deliveries): "
+              f"slack calls {counts['without']:4d} -> {counts['with']:4d} with coalescing")
+    coalesce.coalesce = original_coalesce
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+コールドスタートのベンチマーク
+
+新しい Python プロセスを起動して、以下を測る
+  - import time: python -X importtime で github_webhook_lambda の import にかかる時間と、時間のかかっているモジュール
+  - time-to-first-response: プロセスの起動から、最初の lambda_handler が応答を返すまでの時間
+    (対象外のイベント / mention の通知 (sync, make deploy で作る CONFIG_SNAPSHOT あり・なし) / deferred)
+  PYTHONPATH=./src python tests/benchmark/bench_cold_start.py
+"""
+
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+
+SRC_PATH = Path(__file__).parent.parent.parent / "src"
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+RUNS = 10
+CONFIG_USERS = 5000  # config.json のユーザ数
+TOP_MODULES = 8
+
+# 子プロセスで実行するスクリプト。応答を返したら 1 行出力する
+CHILD_SCRIPT = """
+import json, sys
+import github_webhook_lambda
+event = json.load(open(sys.argv[1]))
+r = github_webhook_lambda.lambda_handler(event, None)
+print(r["statusCode"], flush=True)
+"""
+
+
+def import_time(env: dict):
+    """ -X importtime の出力から、全体の時間と self 時間の大きいモジュールを返す """
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", "import github_webhook_lambda"],
+                       env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    total = next(c for _, c, name in rows if name == "github_webhook_lambda")
+    return total, sorted(rows, reverse=True)[:TOP_MODULES]
+
+
+def first_response(env: dict, event_path: Path, cwd: str) -> float:
+    """ プロセスの起動から、最初の応答までの秒数 """
+    start = time.perf_counter()
+    p = subprocess.Popen([sys.executable, "-c", CHILD_SCRIPT, str(event_path)],
+                         env=env, cwd=cwd, stdout=subprocess.PIPE, text=True)
+    line = p.stdout.readline()
+    elapsed = time.perf_counter() - start
+    p.wait()
+    assert line.strip() == "200", line
+    return elapsed
+
+
+def main():
+    headers = json.loads((TESTDATA_PATH / "mentioned-header.json").read_text())
+    body = (TESTDATA_PATH / "mentioned-body.json").read_text()
+
+    with FakeSlackServer() as slack, tempfile.TemporaryDirectory() as tmp:
+        users = {f"@user{i}": f"@U{i:08d}" for i in range(CONFIG_USERS)}
+        users.update({"@smatsumt": "@U0001", "@smatsumt2": "@U0002"})
+        Path(tmp, "config.json").write_text(json.dumps({"github_to_slack": users}))
+        events = {
+            "mentioned": {"headers": headers, "body": body},
+            "push": {"headers": dict(headers, **{"X-GitHub-Event": "push"}), "body": body},
+        }
+        for name, event in events.items():
+            Path(tmp, f"{name}.json").write_text(json.dumps(event))
+
+        env = dict(os.environ, PYTHONPATH=str(SRC_PATH), SLACK_URL=slack.url, LOGGING_LEVEL="WARNING")
+        total, top = import_time(env)
+        print(f"import github_webhook_lambda: {total / 1000:.1f} ms")
+        for self_us, cumulative_us, name in top:
+            print(f"  {name:24s} self {self_us / 1000:6.1f} ms, cumulative {cumulative_us / 1000:6.1f} ms")
+
+        snapshot = str(Path(tmp, "config.mapping"))
+        cases = [
+            ("unhandled event (push)", "push", {}),
+            ("mentioned, sync", "mentioned", {}),
+            ("mentioned, sync, snapshot", "mentioned", {"CONFIG_SNAPSHOT": snapshot}),
+            ("mentioned, deferred", "mentioned", {"DELIVERY_MODE": "deferred", "OUTBOUND_QUEUE": "memory"}),
+        ]
+        # make deploy と同じく、スナップショットはデプロイ前に作ってパッケージに入れておく
+        subprocess.run([sys.executable, str(SRC_PATH / "user_mapping.py"), str(Path(tmp, "config.json")), snapshot], env=env, check=True)
+        print(f"time-to-first-response (median of {RUNS}, config with {len(users)} users)")
+        for label, name, extra_env in cases:
+            elapsed = [first_response(dict(env, **extra_env), Path(tmp, f"{name}.json"), tmp) for _ in range(RUNS)]
+            print(f"  {label:28s}: {statistics.median(elapsed) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+応答までの時間 (ingress latency) のベンチマーク
+
+応答の遅い Slack 代替サーバに対して、DELIVERY_MODE=sync (応答前に送信) と
+DELIVERY_MODE=deferred (キューに入れて応答、送信は delivery_worker) の lambda_handler の応答時間を比較する
+  PYTHONPATH=./src python tests/benchmark/bench_deferred_delivery.py
+"""
+
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import delivery_dedup  # noqa: E402
+import delivery_worker  # noqa: E402
+import github_webhook_lambda  # noqa: E402
+import outbound_queue  # noqa: E402
+import slack_ratelimit  # noqa: E402
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+SLACK_DELAY = 0.5
+DELIVERIES = 20
+
+
+def run(mode: str, url: str):
+    github_webhook_lambda.DELIVERY_MODE = mode
+    github_webhook_lambda.SLACK_URL = url
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup()
+    headers = json.loads((TESTDATA_PATH / "mentioned-header.json").read_text())
+    body = (TESTDATA_PATH / "mentioned-body.json").read_text()
+    latencies = []
+    for i in range(DELIVERIES):
+        event = {"headers": dict(headers, **{"X-GitHub-Delivery": f"{mode}-{i}"}), "body": body}
+        start = time.perf_counter()
+        github_webhook_lambda.lambda_handler(event, None)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e3, latencies[-1] * 1e3
+
+
+def main():
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    slack_ratelimit.SLACK_RATE = 0  # 応答時間のみを比較するため、流量制限はしない
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt2": "@U0002"})
+    with FakeSlackServer(delay=SLACK_DELAY) as server, tempfile.TemporaryDirectory() as d:
+        outbound_queue._queue = outbound_queue.SQLiteQueue(str(Path(d) / "queue.sqlite3"))
+        p50, worst = run("sync", server.url)
+        print(f"sync    : p50 {p50:8.2f} ms, max {worst:8.2f} ms")
+        p50, worst = run("deferred", server.url)
+        print(f"deferred: p50 {p50:8.2f} ms, max {worst:8.2f} ms (queued {len(outbound_queue._queue)})")
+
+        start = time.perf_counter()
+        r = delivery_worker.lambda_handler({}, None)
+        print(f"worker  : {r} in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
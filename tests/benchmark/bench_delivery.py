@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+複数の送信先への配送のベンチマーク
+
+応答の遅い Slack 代替サーバに対して、N 送信先へ順番に送る場合と delivery.deliver で並列に送る場合の所要時間を比較する
+  PYTHONPATH=./src python tests/benchmark/bench_delivery.py
+"""
+
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import delivery  # noqa: E402
+
+SLACK_DELAY = 0.3  # 遅い Slack の応答時間 (秒)
+
+
+def main():
+    with FakeSlackServer(delay=SLACK_DELAY) as server:
+        for n in [1, 2, 4, 8, 16]:
+            notifications = [delivery.Notification(f"{server.url}/{i}", {"text": f"message {i}"}) for i in range(n)]
+
+            start = time.perf_counter()
+            sequential = [delivery._send(x) for x in notifications]
+            sequential_sec = time.perf_counter() - start
+
+            start = time.perf_counter()
+            concurrent = delivery.deliver(notifications)
+            concurrent_sec = time.perf_counter() - start
+
+            assert all(x.ok for x in sequential + concurrent)
+            print(f"{n:3d} destinations: sequential {sequential_sec:6.2f} s, concurrent {concurrent_sec:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
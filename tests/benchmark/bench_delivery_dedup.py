@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+再送の重複検出のベンチマーク
+
+指定した割合で再送 (同じ X-GitHub-Delivery) を混ぜた配信を lambda_handler に流し、
+重複時の応答時間と、Slack への送信回数を測る
+  PYTHONPATH=./src python tests/benchmark/bench_delivery_dedup.py [重複の割合]
+"""
+
+import json
+from pathlib import Path
+import random
+import sys
+import time
+from unittest.mock import MagicMock
+
+import delivery_dedup
+import github_webhook_lambda
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+DELIVERIES = 5000
+
+
+def make_stream(duplicate_ratio: float, seed: int = 0):
+    rnd = random.Random(seed)
+    headers = json.loads((TESTDATA_PATH / "mentioned-header.json").read_text())
+    body = (TESTDATA_PATH / "mentioned-body.json").read_text()
+    stream, sent = [], []
+    for i in range(DELIVERIES):
+        if sent and rnd.random() < duplicate_ratio:
+            delivery_id = rnd.choice(sent[-100:])  # 最近の配信が再送される
+        else:
+            delivery_id = f"delivery-{i}"
+            sent.append(delivery_id)
+        stream.append({"headers": dict(headers, **{"X-GitHub-Delivery": delivery_id}), "body": body})
+    return stream
+
+
+def main():
+    duplicate_ratio = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt2": "@U0002"})
+    github_webhook_lambda.delivery = MagicMock()
+    github_webhook_lambda.delivery.deliver.return_value = []
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup(max_entries=1000)
+
+    latencies = {"ok": [], "duplicate": []}
+    for event in make_stream(duplicate_ratio):
+        start = time.perf_counter()
+        r = github_webhook_lambda.lambda_handler(event, None)
+        latencies[json.loads(r["body"])["result"]].append(time.perf_counter() - start)
+
+    slack_calls = sum(len(x.args[0]) for x in github_webhook_lambda.delivery.deliver.call_args_list)
+    for result, values in latencies.items():
+        if values:
+            print(f"{result:9s}: {len(values):5d} deliveries, mean {sum(values) / len(values) * 1e6:8.1f} us")
+    print(f"slack calls: {slack_calls} (without dedup: {DELIVERIES})")
+    print(f"dedup stats: {delivery_dedup.get_dedup().stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+lambda_handler のイベント振り分けのベンチマーク
+
+全ハンドラを毎回呼び出す方式 (旧方式) と、HANDLERS による振り分けの 1 配信あたり CPU 時間を比較する
+  PYTHONPATH=./src python tests/benchmark/bench_dispatch.py
+"""
+
+import json
+from pathlib import Path
+import random
+import time
+from unittest.mock import MagicMock
+
+import github_webhook_lambda
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+FIXTURES = ["mentioned", "review-requested", "pr-opened-with-review-requested", "review-submitted"]
+# 実際には何もしないイベントが大半を占める
+SYNTHETIC_EVENTS = ["push", "status", "check_run", "workflow_run", "check_suite", "create", "delete"]
+
+
+def load_events():
+    events = []
+    for name in FIXTURES:
+        headers = json.loads((TESTDATA_PATH / f"{name}-header.json").read_text())
+        body = (TESTDATA_PATH / f"{name}-body.json").read_text()
+        events.append({"headers": headers, "body": body})
+    return events
+
+
+def synthetic_mix(events, n, routed_ratio=0.1, seed=0):
+    rnd = random.Random(seed)
+    body = events[1]["body"]  # 大きめの payload を使いまわす
+    mix = []
+    for _ in range(n):
+        if rnd.random() < routed_ratio:
+            mix.append(rnd.choice(events))
+        else:
+            headers = dict(events[0]["headers"], **{"X-GitHub-Event": rnd.choice(SYNTHETIC_EVENTS)})
+            mix.append({"headers": headers, "body": body})
+    return mix
+
+
+def legacy_handler(event, context):
+    """ 振り分け導入前の lambda_handler 相当 - 全イベントで body をパースしてからハンドラを選ぶ """
+    headers = event["headers"]
+    body = json.loads(event["body"])
+    github_event_kind = headers["X-GitHub-Event"]
+    action = body.get("action")
+    if github_event_kind in github_webhook_lambda.HANDLED_EVENTS:
+        for handler in github_webhook_lambda.HANDLERS.get((github_event_kind, action), ()):
+            handler(headers, body)
+    return {"statusCode": 200}
+
+
+def measure(func, events, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for ev in events:
+            func(ev, None)
+        best = min(best, time.process_time() - start)
+    return best / len(events) * 1e6
+
+
+def main():
+    github_webhook_lambda.notify_slack = MagicMock()
+    github_webhook_lambda.notify_record = MagicMock()
+    github_webhook_lambda.notify_record.add_pr_reviewers.return_value = []
+    github_webhook_lambda.notify_record.get_pr_reviewers.return_value = []
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@U0001", "@smatsumt2": "@U0002", "@skawagt": "@U0003"})
+    github_webhook_lambda._lambda_logging_init = lambda: None
+
+    events = load_events()
+    for label, workload in [("fixtures", events * 250), ("synthetic mix", synthetic_mix(events, 2000))]:
+        before = measure(legacy_handler, workload)
+        after = measure(github_webhook_lambda.lambda_handler, workload)
+        print(f"{label:14s}: before {before:8.1f} us/delivery, after {after:8.1f} us/delivery ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+合成した webhook (webhook_generator) を lambda_handler に流す負荷・性能劣化のベンチマーク
+
+ローカルの Slack 代替サーバと一時ディレクトリの RECORD_FILE を使い、ハンドラ・notify_record・Slack への送信まで通して測る
+  - スループット (配信/秒), 1 配信あたりの処理時間の p50, p90, p99
+  - 処理中のメモリ使用量のピーク (tracemalloc。時間の計測とは別に流す)
+結果を baseline_load.json と比べ、許容幅を超えて悪化していたら終了コード 1 で終わる
+時間はマシンの速さに左右されるので、固定の処理 (calibrate) にかかった時間との比で比べる
+  - 計測は ROUNDS 回流し、calibrate は各回の前後に挟んで測り、その中央値を使う (一時的な負荷の偏りで比がずれないように)
+  - 各項目は ROUNDS 回の中央値を比べ、悪化していたらもう 1 度計測しなおして、再現した項目だけを失敗にする
+  PYTHONPATH=./src python tests/benchmark/bench_load.py
+  PYTHONPATH=./src python tests/benchmark/bench_load.py --update-baseline  # 改善したとき・意図して変えたときに更新する
+"""
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import delivery_dedup  # noqa: E402
+import github_webhook_lambda  # noqa: E402
+import metrics  # noqa: E402
+import notify_record  # noqa: E402
+import review_state  # noqa: E402
+import slack_ratelimit  # noqa: E402
+import webhook_generator  # noqa: E402
+
+BASELINE_PATH = Path(__file__).parent / "baseline_load.json"
+DELIVERIES = 3000
+WARMUP = 100
+ROUNDS = 3
+TOLERANCE = 0.3  # 基準値からこの割合を超えて悪化したら失敗にする
+USERS = 200
+# 比べる項目と、大きいほうが良いか、許容幅の倍率 (p99 は外れ値に左右されやすいので広くとる)
+CHECKS = [("throughput_rel", True, 1), ("p50_rel", False, 1), ("p99_rel", False, 2), ("peak_memory_mb", False, 1)]
+
+
+def calibrate() -> float:
+    """ マシンの速さの目安として、JSON のパースと正規表現の検索 (lambda_handler の主な処理) にかかる秒数を返す """
+    body = (webhook_generator.TESTDATA_PATH / "review-requested-body.json").read_text()
+    pattern = re.compile(r"@[\w-]+")
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(200):
+            json.loads(body)
+            pattern.findall(body)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def setup(tmp: str, slack_url: str) -> None:
+    """ 毎回空の状態から始めるよう、記録や重複判定を作りなおす """
+    logging.getLogger().setLevel("WARNING")
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({f"@user{i}": f"@U{i:06d}" for i in range(USERS)})
+    github_webhook_lambda.SLACK_URL = slack_url
+    github_webhook_lambda.SLACK_EXTRA_URLS = []
+    github_webhook_lambda.DELIVERY_MODE = "sync"
+    github_webhook_lambda.webhook_payload.WEBHOOK_SECRET = None
+    metrics.METRICS_ENABLED = False
+    slack_ratelimit.SLACK_RATE = 0  # 代替サーバには流量制限がない
+    slack_ratelimit._senders = {}
+    notify_record.NOTIFY_RECORD_BACKEND = "file"
+    notify_record.RECORD_FILE = str(Path(tmp) / f"notify_record-{time.monotonic_ns()}.json")
+    notify_record._backend = None
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup()
+    review_state._tracker = review_state.ReviewStateTracker(snapshot=None)
+
+
+def run(events, tmp: str, slack_url: str, trace_memory: bool = False) -> dict:
+    setup(tmp, slack_url)
+    for event in events[:WARMUP]:
+        github_webhook_lambda.lambda_handler(event, None)
+    events = events[WARMUP:]
+
+    if trace_memory:
+        tracemalloc.start()
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    for event in events:
+        t = time.perf_counter()
+        r = github_webhook_lambda.lambda_handler(event, None)
+        latencies.append(time.perf_counter() - t)
+        statuses[r["statusCode"]] = statuses.get(r["statusCode"], 0) + 1
+    elapsed = time.perf_counter() - start
+    r = {"elapsed": elapsed, "latencies": sorted(latencies), "statuses": statuses}
+    if trace_memory:
+        r["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return r
+
+
+def percentile(values, p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def measure(events, tmp: str, slack, rounds: int) -> dict:
+    """ rounds 回流した結果の中央値を返す。calibrate は各回の前後に挟んで測る """
+    units = [calibrate()]
+    rounds_results = []
+    for _ in range(rounds):
+        del slack.messages[:]
+        timed = run(events, tmp, slack.url)
+        timed["notifications"] = len(slack.messages)
+        rounds_results.append(timed)
+        units.append(calibrate())
+    traced = run(events, tmp, slack.url, trace_memory=True)
+    unit = statistics.median(units)
+
+    def median(f):
+        return statistics.median(f(x) for x in rounds_results)
+
+    result = {
+        "deliveries": len(rounds_results[0]["latencies"]),
+        "notifications": rounds_results[0]["notifications"],
+        "throughput": median(lambda x: len(x["latencies"]) / x["elapsed"]),
+        "p50_ms": median(lambda x: percentile(x["latencies"], 50)) * 1000,
+        "p90_ms": median(lambda x: percentile(x["latencies"], 90)) * 1000,
+        "p99_ms": median(lambda x: percentile(x["latencies"], 99)) * 1000,
+        "peak_memory_mb": traced["peak_memory"] / 1e6,
+        "calibration_ms": unit * 1000,
+    }
+    result["throughput_rel"] = result["throughput"] * unit
+    result["p50_rel"] = result["p50_ms"] / 1000 / unit
+    result["p99_rel"] = result["p99_ms"] / 1000 / unit
+    result["statuses"] = rounds_results[0]["statuses"]
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> dict:
+    """ :return: 基準値から悪化した項目の名前から説明への dict """
+    regressions = {}
+    if baseline.get("deliveries") == result["deliveries"] and baseline.get("notifications") != result["notifications"]:
+        regressions["notifications"] = f"notifications: {baseline.get('notifications')} -> {result['notifications']}"
+    for name, higher_is_better, scale in CHECKS:
+        if name not in baseline:
+            continue
+        before, after = baseline[name], result[name]
+        change = (before - after) / before if higher_is_better else (after - before) / before
+        if change > tolerance * scale:
+            regressions[name] = f"{name}: {before:.4g} -> {after:.4g} ({change:+.0%} worse, tolerance {tolerance * scale:.0%})"
+    return regressions
+
+
+def report(result: dict) -> None:
+    print(f"statuses {result['statuses']}, {result['notifications']} Slack messages")
+    print(f"throughput {result['throughput']:8.1f} deliveries/s, latency p50 {result['p50_ms']:6.2f} ms, "
+          f"p90 {result['p90_ms']:6.2f} ms, p99 {result['p99_ms']:6.2f} ms, peak memory {result['peak_memory_mb']:6.2f} MB "
+          f"(calibration {result['calibration_ms']:.2f} ms)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="合成した webhook での負荷・性能劣化のベンチマーク")
+    parser.add_argument("-n", "--deliveries", type=int, default=DELIVERIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--update-baseline", action="store_true", help="結果を基準値として保存する")
+    args = parser.parse_args(argv)
+
+    generator = webhook_generator.WebhookGenerator(seed=args.seed, users=USERS)
+    events = list(generator.generate(args.deliveries + WARMUP))
+    mix = ", ".join(f"{k} {v}" for k, v in sorted(generator.counts.items()))
+    print(f"{args.deliveries} deliveries ({mix}), median of {args.rounds} rounds")
+
+    with tempfile.TemporaryDirectory() as tmp, FakeSlackServer() as slack:
+        result = measure(events, tmp, slack, args.rounds)
+        report(result)
+
+        baseline_path = Path(args.baseline)
+        if args.update_baseline or not baseline_path.exists():
+            del result["statuses"]
+            baseline_path.write_text(json.dumps({k: round(v, 6) for k, v in result.items()}, indent=2, sort_keys=True) + "\n")
+            print(f"baseline written to {baseline_path}")
+            return 0
+
+        baseline = json.loads(baseline_path.read_text())
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            # 一時的な負荷による外れかもしれないので、計測しなおして再現したものだけを失敗にする
+            print(f"possible regression in {', '.join(regressions)}. measuring again")
+            result = measure(events, tmp, slack, args.rounds)
+            report(result)
+            confirmed = compare(result, baseline, args.tolerance)
+            regressions = {k: v for k, v in confirmed.items() if k in regressions}
+
+    for x in regressions.values():
+        print(f"REGRESSION {x}", file=sys.stderr)
+    if not regressions:
+        print(f"no regression against {baseline_path.name} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
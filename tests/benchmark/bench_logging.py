@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ログ出力のベンチマーク
+
+LOG_MODE, LOG_PAYLOAD_SAMPLE_RATE, ログレベルの組み合わせごとに、1 配信あたりのログ出力にかかる時間とログのバイト数を比較する
+Slack への送信と notify_record はモックにして、ログ以外の処理は同じにする
+  PYTHONPATH=./src python tests/benchmark/bench_logging.py
+"""
+
+import io
+import json
+import logging
+from pathlib import Path
+import time
+from unittest.mock import MagicMock
+
+import github_webhook_lambda
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+FIXTURES = ["mentioned", "review-requested", "pr-opened-with-review-requested", "review-submitted"]
+# (ラベル, LOG_MODE, LOG_PAYLOAD_SAMPLE_RATE, ログレベル)
+MODES = [
+    ("full", "full", 0, "INFO"),
+    ("summary", "summary", 0, "INFO"),
+    ("summary + 1% payload", "summary", 0.01, "INFO"),
+    ("summary + 10% payload", "summary", 0.1, "INFO"),
+    ("debug", "full", 0, "DEBUG"),
+]
+REPEAT = 500
+
+
+class CountingStream(io.TextIOBase):
+    """ CloudWatch Logs の代わり。書き込まれたバイト数だけ数える """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, s):
+        self.bytes += len(s.encode())
+        return len(s)
+
+
+def load_events():
+    events = []
+    for name in FIXTURES:
+        headers = json.loads((TESTDATA_PATH / f"{name}-header.json").read_text())
+        body = (TESTDATA_PATH / f"{name}-body.json").read_text()
+        events.append({"headers": headers, "body": body})
+    return events
+
+
+def measure(events, mode, sample_rate, level):
+    stream = CountingStream()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    github_webhook_lambda.LOG_MODE = mode
+    github_webhook_lambda.LOG_PAYLOAD_SAMPLE_RATE = sample_rate
+
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for ev in events:
+            github_webhook_lambda.lambda_handler(ev, None)
+    n = REPEAT * len(events)
+    return (time.perf_counter() - start) / n * 1e6, stream.bytes / n
+
+
+def main():
+    github_webhook_lambda.delivery.deliver = lambda notifications: []
+    github_webhook_lambda.notify_record = MagicMock()
+    github_webhook_lambda.notify_record.add_pr_reviewers.return_value = []
+    github_webhook_lambda.notify_record.get_pr_reviewers.return_value = []
+    github_webhook_lambda.delivery_dedup.DeliveryDedup.seen = lambda self, delivery_id: False
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@U0001", "@smatsumt2": "@U0002", "@skawagt": "@U0003"})
+    github_webhook_lambda.SLACK_URL = "https://example.com/hook"
+    github_webhook_lambda._lambda_logging_init = lambda: None
+
+    events = load_events()
+    measure(events, "summary", 0, "INFO")  # ウォームアップ
+    for label, mode, sample_rate, level in MODES:
+        usec, size = measure(events, mode, sample_rate, level)
+        print(f"{label:22s}: {usec:8.1f} us/delivery, {size:8.0f} bytes/delivery")
+
+
+if __name__ == "__main__":
+    main()
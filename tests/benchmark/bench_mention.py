@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mention の抽出のベンチマーク
+
+1MB のコメント本文と、意地の悪い入力 (` だらけ、@ だらけ、長い行など) に対して、
+旧方式 (re.findall(r"@\\w+") + 後から GITHUB_TO_SLACK で絞り込み) と mention モジュールを比較する
+  PYTHONPATH=./src python tests/benchmark/bench_mention.py
+"""
+
+import random
+import re
+import time
+
+import mention
+
+SIZE = 1024 * 1024
+USERS = {f"@user{i}": f"@U{i:08d}" for i in range(1000)}
+
+
+def legacy_find(text: str) -> set:
+    return {x for x in re.findall(r"@\w+", text) if x in USERS}
+
+
+def legacy_new(before: str, after: str) -> set:
+    return legacy_find(after) - legacy_find(before)
+
+
+def realistic_comment(seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    lines = []
+    while sum(len(x) + 1 for x in lines) < SIZE:
+        kind = rnd.random()
+        if kind < 0.05:
+            lines += ["```python"] + [f"    value = obj.attr_{i}  # @decorator" for i in range(20)] + ["```"]
+        elif kind < 0.1:
+            lines.append(f"> @user{rnd.randrange(2000)} wrote: some quoted reply text")
+        else:
+            words = [f"@user{rnd.randrange(2000)}" if rnd.random() < 0.02 else "word" for _ in range(15)]
+            lines.append(" ".join(words) + " `inline code` mail@example.com")
+    return "\n".join(lines)
+
+
+PATHOLOGICAL = {
+    "backticks": "`" * SIZE,
+    "alternating backticks": "`@a " * (SIZE // 4),
+    "at signs": "@" * SIZE,
+    "hyphens": "@a" + "-" * SIZE,
+    "one long line": ("word @user1 " * (SIZE // 12)),
+    "fence lines": "```\n@user1\n" * (SIZE // 12),
+    "quotes": "> @user1\n" * (SIZE // 9),
+}
+
+
+def measure(func, *args, repeat=3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main():
+    index = mention.MentionIndex(USERS)
+    inputs = dict({"realistic 1MB": realistic_comment()}, **PATHOLOGICAL)
+    for label, text in inputs.items():
+        legacy_ms = measure(legacy_find, text)
+        new_ms = measure(mention.find_mentions, text, index)
+        print(f"{label:22s}: legacy {legacy_ms:8.1f} ms, scanner {new_ms:8.1f} ms")
+
+    before = inputs["realistic 1MB"]
+    after = before + "\n@user1 @user2 appended"
+    legacy_ms = measure(legacy_new, before, after)
+    new_ms = measure(mention.find_new_mentions, before, after, index)
+    print(f"{'edited 1MB (append)':22s}: legacy {legacy_ms:8.1f} ms, scanner {new_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
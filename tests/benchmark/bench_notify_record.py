@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+notify_record のベンチマーク
+
+10k - 100k 件の PR を記録している状態で、review_requested 1 イベントあたりの load/query/insert/store の時間を
+ファイル全体を読み書きする旧方式と比較する
+  PYTHONPATH=./src python tests/benchmark/bench_notify_record.py
+"""
+
+import datetime
+import json
+from pathlib import Path
+import tempfile
+import time
+
+import notify_record
+
+EVENTS = 200
+LEGACY_EVENTS = 20  # 旧方式は遅いので回数を減らす
+
+
+def legacy_event(record_file: Path, pr_id: int) -> None:
+    """ 旧方式の notify_record の load/query/insert/store 相当 """
+    records = json.loads(record_file.read_text())["records"]
+    record = records.get(str(pr_id))
+    if record:
+        datetime.datetime.fromisoformat(record["datetime"])
+    records[str(pr_id)] = {"reviewers": ["@aaa"], "datetime": datetime.datetime.now().isoformat()}
+    records = {k: v for k, v in records.items()
+               if (datetime.datetime.now() - datetime.datetime.fromisoformat(v["datetime"])).seconds < 3600}
+    record_file.write_text(json.dumps({"records": records}))
+
+
+def new_event(pr_id: int) -> None:
+    notify_record.load()
+    notify_record.query_pr_reviewers(pr_id)
+    notify_record.insert_pr_reviewers(pr_id, ["@aaa"])
+    notify_record.store()
+
+
+def main():
+    notify_record.SEC_BORDER = 3600  # ベンチマーク中に期限切れにならないようにする
+    for n in [10000, 30000, 100000]:
+        with tempfile.TemporaryDirectory() as d:
+            now = datetime.datetime.now().isoformat()
+            snapshot = json.dumps({"records": {str(i): {"reviewers": ["@aaa", "@bbb"], "datetime": now} for i in range(n)}})
+            legacy_file = Path(d) / "legacy.json"
+            legacy_file.write_text(snapshot)
+            notify_record.RECORD_FILE = str(Path(d) / "new.json")
+            Path(notify_record.RECORD_FILE).write_text(snapshot)
+
+            start = time.perf_counter()
+            for i in range(LEGACY_EVENTS):
+                legacy_event(legacy_file, n + i)
+            legacy_ms = (time.perf_counter() - start) / LEGACY_EVENTS * 1e3
+
+            start = time.perf_counter()
+            notify_record.load()  # warm なコンテナでの初回のみ
+            cold_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            for i in range(EVENTS):
+                new_event(n + i)
+            new_ms = (time.perf_counter() - start) / EVENTS * 1e3
+
+        print(f"{n:6d} records: legacy {legacy_ms:8.3f} ms/event, indexed {new_ms:8.3f} ms/event "
+              f"(first load {cold_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
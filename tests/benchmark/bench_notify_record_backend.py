@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+notify_record のバックエンドごとのスループットのベンチマーク
+
+並列に書き込むライター (Lambda のインスタンスの代わり) を増やしたときのスループットを測る
+共有 KV ストアには、ネットワーク越しの遅延を入れた MemoryKVStore を使う
+  PYTHONPATH=./src python tests/benchmark/bench_notify_record_backend.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import tempfile
+import time
+from pathlib import Path
+
+import kv_store
+import notify_record
+
+OPERATIONS = 400
+KV_LATENCY = 0.002  # DynamoDB 程度の往復時間 (秒)
+
+
+def measure(backend, writers: int, hot_prs: int) -> float:
+    """ hot_prs 個の PR に対して、writers 並列で OPERATIONS 回書き込んだときの ops/sec """
+    def op(i):
+        backend.add_pr_reviewers(str(i % hot_prs), [f"@user{i}"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        list(executor.map(op, range(OPERATIONS)))
+    return OPERATIONS / (time.perf_counter() - start)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as d:
+        notify_record.RECORD_FILE = str(Path(d) / "record.json")
+        backends = {
+            "file": lambda: notify_record.FileBackend(),
+            "sqlite": lambda: notify_record.SQLiteBackend(str(Path(d) / f"record-{time.time()}.sqlite3")),
+            "kv": lambda: notify_record.KeyValueBackend(kv_store.MemoryKVStore(latency=KV_LATENCY)),
+        }
+        for hot_prs, label in [(OPERATIONS, "distinct PRs"), (4, "4 hot PRs")]:
+            print(f"--- {label}")
+            for name, factory in backends.items():
+                results = [f"{writers}: {measure(factory(), writers, hot_prs):7.0f}" for writers in [1, 2, 4, 8, 16]]
+                print(f"{name:6s} ops/sec by writers  " + ", ".join(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大きな payload に対する lambda_handler のメモリ・レイテンシのベンチマーク
+
+testdata の payload を MB 単位まで水増しし、
+全体パース + 全体ログ (旧方式) と、action の事前判定 + extract の比較をする
+  PYTHONPATH=./src python tests/benchmark/bench_payload.py
+"""
+
+import json
+import logging
+from pathlib import Path
+import time
+import tracemalloc
+from unittest.mock import MagicMock
+
+import github_webhook_lambda
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+
+
+def inflate(body: dict, size_mb: int) -> str:
+    """ ハンドラが参照しないフィールド (files など) を水増しして size_mb 程度の JSON にする """
+    filler = {"sha": "0" * 40, "filename": "src/" + "x" * 80, "patch": "@@ -1 +1 @@\n" + "+" * 900}
+    body = dict(body, files=[filler] * (size_mb * 1000))
+    return json.dumps(body)
+
+
+def legacy_handler(event, context):
+    """ 事前判定導入前の lambda_handler 相当 - 全体をパースし、全体をログに出す """
+    headers = event["headers"]
+    body = event["body"]
+    github_webhook_lambda.logger.info(body)
+    body = json.loads(body)
+    for handler in github_webhook_lambda.HANDLERS.get((headers["X-GitHub-Event"], body["action"]), ()):
+        handler(headers, body)
+
+
+def measure(func, event, repeat=5):
+    tracemalloc.start()
+    func(event, None)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(event, None)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3, peak / 1e6
+
+
+def main():
+    # ログは捨てるが、旧方式では文字列を handler に渡すまでのコストがかかる
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.notify_slack = MagicMock()
+    github_webhook_lambda.notify_record = MagicMock()
+    github_webhook_lambda.notify_record.add_pr_reviewers.return_value = []
+    github_webhook_lambda.notify_record.get_pr_reviewers.return_value = []
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@skawagt": "@U0001", "@smatsumoto78": "@U0002"})
+    # 同じ配信を繰り返し測るので、再送として捨てないよう delivery id を覚えない
+    github_webhook_lambda.delivery_dedup._dedup = github_webhook_lambda.delivery_dedup.DeliveryDedup(max_entries=0)
+    github_webhook_lambda.webhook_payload.WEBHOOK_MAX_BODY_BYTES = 64 * 1024 * 1024  # 413 で捨てずに、どの大きさもパースまで測る
+
+    headers = json.loads((TESTDATA_PATH / "review-requested-header.json").read_text())
+    body = json.loads((TESTDATA_PATH / "review-requested-body.json").read_text())
+    for size_mb in [1, 4, 16]:
+        accepted = {"headers": headers, "body": inflate(body, size_mb)}
+        rejected = {"headers": headers, "body": inflate(dict(body, action="synchronize"), size_mb)}
+        for label, event in [("accepted", accepted), ("rejected", rejected)]:
+            before_ms, before_mb = measure(legacy_handler, event)
+            after_ms, after_mb = measure(github_webhook_lambda.lambda_handler, event)
+            print(f"{size_mb:3d}MB {label:8s}: before {before_ms:8.2f} ms {before_mb:7.1f} MB peak, "
+                  f"after {after_ms:8.2f} ms {after_mb:7.1f} MB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+review_state による通知の抑制のベンチマーク
+
+review-submitted の記録をもとに、PR ごとに複数の reviewer が commented の review を繰り返し、
+本文を edit し (mention を足すこともある)、最後に approved / changes_requested を返す配信列を作る。
+replay と同じく通知を送らずに記録する設定で、配信列を順に (状態を引き継いで) 再実行し、
+review_state の有無で Slack に送られるメッセージ数と 1 配信あたりの処理時間を比べる
+  PYTHONPATH=./src python tests/benchmark/bench_review_state.py
+"""
+
+import copy
+import json
+from pathlib import Path
+import random
+import time
+
+import delivery_dedup
+import github_webhook_lambda
+import outbound_queue
+import replay
+import review_state
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+PRS = 300
+REVIEWERS = 3
+USERS = [f"user{i}" for i in range(20)]
+
+
+def make_deliveries(seed=0):
+    rnd = random.Random(seed)
+    headers = json.loads((TESTDATA_PATH / "review-submitted-header.json").read_text())
+    template = json.loads((TESTDATA_PATH / "review-submitted-body.json").read_text())
+    deliveries = []
+
+    def add(body):
+        h = dict(headers, **{"X-GitHub-Delivery": f"bench-{len(deliveries)}"})
+        deliveries.append({"headers": h, "body": json.dumps(body)})
+
+    for pr in range(PRS):
+        for reviewer in rnd.sample(USERS, REVIEWERS):
+            mentions = rnd.sample(USERS, rnd.randrange(3))
+            for _ in range(rnd.randrange(1, 5)):  # commented の review を何度か
+                body = copy.deepcopy(template)
+                body["pull_request"]["id"] = pr
+                body["review"]["user"]["login"] = reviewer
+                body["review"]["body"] = " ".join(f"@{x}" for x in mentions) + " comment"
+                add(body)
+                for _ in range(rnd.randrange(3)):  # 本文の edit。半分は mention を足す
+                    body = copy.deepcopy(body)
+                    body["action"] = "edited"
+                    if rnd.random() < 0.5:
+                        mentions.append(rnd.choice(USERS))
+                    body["review"]["body"] = " ".join(f"@{x}" for x in mentions) + " comment (edited)"
+                    add(body)
+            body = copy.deepcopy(body)
+            body["action"] = "submitted"
+            body["review"]["state"] = rnd.choice(["approved", "changes_requested"])
+            add(body)
+    return deliveries
+
+
+def run(deliveries, tracker):
+    replay._init_worker()
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({f"@{x}": f"@U{i:04d}" for i, x in enumerate(USERS + ["smatsumt"])})
+    sink = replay.DryRunSink()
+    outbound_queue._queue = sink
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup()
+    review_state._tracker = tracker
+    review_state.REVIEW_STATE_MAX_PRS = 0 if tracker is None else tracker.max_prs
+
+    start = time.perf_counter()
+    for event in deliveries:
+        github_webhook_lambda.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    return len(sink.notifications), elapsed / len(deliveries) * 1e6
+
+
+def main():
+    deliveries = make_deliveries()
+    before, before_us = run(deliveries, None)
+    tracker = review_state.ReviewStateTracker(snapshot=None)
+    after, after_us = run(deliveries, tracker)
+    print(f"{len(deliveries)} review deliveries ({PRS} PRs x {REVIEWERS} reviewers)")
+    print(f"without review_state: {before:5d} messages, {before_us:6.1f} us/delivery")
+    print(f"with review_state   : {after:5d} messages, {after_us:6.1f} us/delivery "
+          f"({before - after} suppressed, {(before - after) / before:.0%}, {len(tracker)} PRs tracked)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+10k 件のルールでの通知先の振り分け (routing.Router) のベンチマーク
+
+索引を使った判定と、すべてのルールを順に fnmatch で調べる判定の 1 秒あたりの判定数を比べる (結果が同じことも確認する)
+  PYTHONPATH=./src python tests/benchmark/bench_routing.py
+"""
+
+import fnmatch
+import random
+import time
+
+import routing
+
+RULES = 10000
+ORGS = 200
+TEAMS = 50
+DECISIONS = 20000
+EVENTS = ["mentioned", "review_requested", "approved", "commented", "changes_requested"]
+
+
+def make_rules(seed=0):
+    rnd = random.Random(seed)
+    routes = []
+    for i in range(RULES):
+        org = f"org{rnd.randrange(ORGS)}"
+        kind = rnd.random()
+        if kind < 0.5:
+            repo = f"{org}/repo{rnd.randrange(100)}"  # 完全一致
+        elif kind < 0.8:
+            repo = f"{org}/repo{rnd.randrange(10)}*"  # 前方一致
+        elif kind < 0.95:
+            repo = f"{org}/*-api"  # glob
+        else:
+            repo = f"*/repo{rnd.randrange(100)}"  # 先頭が wildcard
+        rule = {"repo": repo, "url": f"https://hooks.example.com/{i}"}
+        if rnd.random() < 0.3:
+            rule["event"] = rnd.sample(EVENTS, 2)
+        if rnd.random() < 0.2:
+            rule["team"] = f"team{rnd.randrange(TEAMS)}"
+        routes.append(rule)
+    for event in EVENTS[:3]:  # すべてのリポジトリに一致するルール
+        routes.append({"event": event, "url": f"https://hooks.example.com/all-{event}"})
+    teams = {f"team{t}": [f"@user{t * 10 + i}" for i in range(10)] for t in range(TEAMS)}
+    return routes, teams
+
+
+def make_decisions(seed=1):
+    rnd = random.Random(seed)
+    return [(f"Org{rnd.randrange(ORGS)}/{rnd.choice(['repo', 'svc'])}{rnd.randrange(150)}{rnd.choice(['', '-api'])}",
+             rnd.choice(EVENTS), [f"@user{rnd.randrange(TEAMS * 10)}" for _ in range(rnd.randrange(4))])
+            for _ in range(DECISIONS)]
+
+
+def linear_route(routes, team_of, repo, event, users):
+    user_teams = {team_of.get(x.lstrip("@").lower()) for x in users}
+    r = []
+    for rule in routes:
+        if not fnmatch.fnmatchcase(repo.lower(), rule.get("repo", "*").lower()):
+            continue
+        if "event" in rule and event not in rule["event"]:
+            continue
+        if "team" in rule and rule["team"] not in user_teams:
+            continue
+        r.extend(x for x in [rule["url"]] if x not in r)
+    return tuple(r)
+
+
+def main():
+    routes, teams = make_rules()
+    decisions = make_decisions()
+
+    start = time.perf_counter()
+    router = routing.Router(routes, teams)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [router.route(*x) for x in decisions]
+    indexed = time.perf_counter() - start
+
+    sample = decisions[:500]
+    start = time.perf_counter()
+    team_of = {m.lstrip("@").lower(): t for t, members in teams.items() for m in members}
+    expected = [linear_route(routes, team_of, *x) for x in sample]
+    linear = (time.perf_counter() - start) / len(sample) * len(decisions)
+    assert results[:len(sample)] == expected
+
+    matched = sum(1 for x in results if x)
+    print(f"{RULES} rules: build {build * 1000:6.1f} ms, {matched}/{DECISIONS} decisions matched")
+    print(f"indexed: {DECISIONS / indexed:10.0f} decisions/s ({indexed / DECISIONS * 1e6:6.1f} us/decision)")
+    print(f"linear : {DECISIONS / linear:10.0f} decisions/s ({linear / DECISIONS * 1e6:6.1f} us/decision, "
+          f"{len(sample)} decisions measured) -> {linear / indexed:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+不正なリクエストを大量に受けたときの、1 リクエストあたりの拒否コストのベンチマーク
+
+署名の検証なし (WEBHOOK_SECRET 未設定) で不正な payload をパースしてしまう場合と、
+署名の検証・サイズ制限でパース前に拒否する場合を比較する
+  PYTHONPATH=./src python tests/benchmark/bench_signature.py
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+from pathlib import Path
+import time
+
+import delivery_dedup
+import github_webhook_lambda
+import webhook_payload
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+SECRET = "bench-secret"
+
+
+def sign(body: str, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+
+def junk_body(size: int) -> str:
+    """ mention を含まない、handled な action の大きな payload """
+    filler = "x" * 1000
+    comments = [{"id": i, "body": filler} for i in range(size // 1024)]
+    return json.dumps({"action": "created", "comment": {"id": 1, "html_url": "https://example.com", "body": "hi",
+                                                        "user": {"login": "someone"}}, "junk": comments})
+
+
+def measure(headers: dict, body: str, secret: str, n: int):
+    webhook_payload.WEBHOOK_SECRET = secret
+    statuses = set()
+    start = time.perf_counter()
+    for i in range(n):
+        h = dict(headers, **{"X-GitHub-Delivery": f"bench-{i}"})
+        statuses.add(github_webhook_lambda.lambda_handler({"headers": h, "body": body}, None)["statusCode"])
+    return (time.perf_counter() - start) / n * 1e6, statuses
+
+
+def main():
+    logging.getLogger().setLevel("ERROR")
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@U0001", "@smatsumt2": "@U0002"})
+    github_webhook_lambda.delivery.deliver = lambda notifications: []
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup(max_entries=100)
+
+    headers = json.loads((TESTDATA_PATH / "mentioned-header.json").read_text())
+    body = (TESTDATA_PATH / "mentioned-body.json").read_text()
+    junk = junk_body(900 * 1024)
+    huge = junk_body(webhook_payload.WEBHOOK_MAX_BODY_BYTES + 1024 * 1024)  # 上限 (既定は Lambda の payload の上限の 6MB) を超える
+    cases = [
+        ("valid, signed", body, dict(headers, **{"X-Hub-Signature-256": sign(body, SECRET)}), SECRET, 2000),
+        ("900KB junk, no secret", junk, headers, "", 50),
+        ("900KB junk, forged", junk, dict(headers, **{"X-Hub-Signature-256": sign(junk, "guess")}), SECRET, 50),
+        ("fixture, forged", body, dict(headers, **{"X-Hub-Signature-256": sign(body, "guess")}), SECRET, 2000),
+        ("fixture, unsigned", body, headers, SECRET, 2000),
+        (f"{len(huge) >> 20}MB junk, oversized", huge, headers, SECRET, 2000),
+    ]
+    for label, payload, h, secret, n in cases:
+        usec, statuses = measure(h, payload, secret, n)
+        print(f"{label:24s}: {usec:9.1f} us/request ({1e6 / usec:9.0f} req/s), status {sorted(statuses)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Slack の流量制限 (429) に対するベンチマーク
+
+一定以上の頻度で送ると 429 を返す Slack 代替サーバに対して、レビューの嵐 (短時間に大量の通知) を送り、
+流量制御なしで 1 回だけ送る旧方式と、slack_ratelimit を通す方式の送信できた数・待った数・あきらめた数を比較する
+  PYTHONPATH=./src python tests/benchmark/bench_slack_ratelimit.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import slack_ratelimit  # noqa: E402
+import slack_transport  # noqa: E402
+
+MESSAGES = 60
+SERVER_RATE = 20  # 代替サーバが許容する 1 秒あたりのメッセージ数 (実際の Slack の 1/秒 を縮めたもの)
+RETRY_AFTER = 0.5
+
+
+class ThrottlingSlackServer(FakeSlackServer):
+    """ SERVER_RATE を超えるペースで送られたら 429 を返す """
+
+    def __init__(self):
+        super().__init__()
+        self._allowed_at = 0.0
+        self._throttle_lock = threading.Lock()
+
+    def _next_status(self):
+        with self._throttle_lock:
+            self.requests += 1
+            now = time.monotonic()
+            if now < self._allowed_at - 1.0:  # 1 秒分のバーストまでは許容する
+                return 429, {"Retry-After": str(RETRY_AFTER)}
+            self._allowed_at = max(self._allowed_at, now) + 1.0 / SERVER_RATE
+            return 200, {}
+
+
+def storm(send):
+    delivered = dropped = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for ok in executor.map(send, range(MESSAGES)):
+            delivered += ok
+            dropped += not ok
+    return delivered, dropped, time.perf_counter() - start
+
+
+def main():
+    with ThrottlingSlackServer() as server:
+        transport = slack_transport.SlackTransport(server.url, pool_size=8)
+
+        def send_once(i):
+            try:
+                transport.notify(text=f"message {i}")
+                return True
+            except slack_transport.SlackError:
+                return False
+
+        delivered, dropped, elapsed = storm(send_once)
+        print(f"no rate limit  : delivered {delivered:3d}, delayed   0, dropped {dropped:3d} in {elapsed:5.2f} s")
+
+    # 流量制限の設定が Slack 側の制限に合っている場合と、緩すぎて 429 を受けながら Retry-After で調整する場合
+    for label, rate in [("slack_ratelimit", SERVER_RATE), ("loose limit", SERVER_RATE * 3)]:
+        with ThrottlingSlackServer() as server:
+            sender = slack_ratelimit.RateLimitedSender(server.url, rate=rate, burst=SERVER_RATE, max_retries=5)
+
+            def send_limited(i):
+                try:
+                    sender.notify(text=f"message {i}")
+                    return True
+                except Exception:
+                    return False
+
+            delivered, dropped, elapsed = storm(send_limited)
+            stats = sender.stats()
+            print(f"{label:15s}: delivered {stats['delivered']:3d}, delayed {stats['delayed']:3d}, "
+                  f"dropped {stats['dropped']:3d} in {elapsed:5.2f} s ({server.requests} requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Slack への送信のベンチマーク
+
+メッセージごとに新しいコネクションを張る方式 (slackweb 相当) と、SlackTransport のコネクションプールを比較する
+  PYTHONPATH=./src python tests/benchmark/bench_slack_transport.py
+"""
+
+from pathlib import Path
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import slack_transport  # noqa: E402
+
+N = 500
+
+
+def main():
+    with FakeSlackServer() as server:
+        start = time.perf_counter()
+        for i in range(N):
+            transport = slack_transport.SlackTransport(server.url)  # 毎回作りなおす
+            transport.notify(text=f"message {i}")
+            transport.close()
+        fresh = (time.perf_counter() - start) / N
+        fresh_conns = server.connections
+
+        transport = slack_transport.SlackTransport(server.url)
+        start = time.perf_counter()
+        for i in range(N):
+            transport.notify(text=f"message {i}")
+        pooled = (time.perf_counter() - start) / N
+        pooled_conns = server.connections - fresh_conns
+
+    print(f"new connection per message: {fresh * 1e3:6.3f} ms/message, {fresh_conns} connections")
+    print(f"pooled connection         : {pooled * 1e3:6.3f} ms/message, {pooled_conns} connections")
+
+
+if __name__ == "__main__":
+    main()
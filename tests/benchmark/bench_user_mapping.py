@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+50k 件のユーザの対応表のベンチマーク
+
+- 読み込み: JSON (パース + 索引の作成) と索引込み形式 (user_mapping.py で変換) の読み込み時間、
+  config.json と CONFIG_SNAPSHOT の組 (config.json を読んで CRC32 を確かめてから、スナップショットを読む) の読み込み時間
+- 検索: 大文字小文字の混ざったユーザ名の resolve + slack_id の時間 (共通の対応表と organization の対応表)
+- 読み込みなおし: ファイルの変更から差し替えまでの時間と、その間の get() の応答時間
+  PYTHONPATH=./src python tests/benchmark/bench_user_mapping.py
+"""
+
+import json
+import os
+from pathlib import Path
+import random
+import tempfile
+import time
+
+import user_mapping
+
+ENTRIES = 50000
+ORGS = 5
+ORG_ENTRIES = 2000  # organization ごとの件数 (共通の対応表は ENTRIES - ORGS * ORG_ENTRIES 件)
+LOOKUPS = 200000
+
+
+def make_config(seed=0):
+    rnd = random.Random(seed)
+    default = {f"@User{i}": f"@U{i:08d}" for i in range(ENTRIES - ORGS * ORG_ENTRIES)}
+    orgs = {}
+    for o in range(ORGS):
+        orgs[f"org{o}"] = {f"@orguser{o}-{i}": f"@W{o}{i:07d}" for i in range(ORG_ENTRIES)}
+        for login in rnd.sample(list(default), 100):  # 共通の対応表を上書きするユーザ
+            orgs[f"org{o}"][login] = f"@W{o}OVERRIDE"
+    return {"github_to_slack": default, "orgs": orgs}
+
+
+def best_of(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_lookup(mapping, conf):
+    rnd = random.Random(1)
+    logins = [x[1:] for x in conf["github_to_slack"]] + [x[1:] for m in conf["orgs"].values() for x in m]
+    queries = [(rnd.choice(logins).upper() if rnd.random() < 0.5 else rnd.choice(logins), f"org{rnd.randrange(ORGS + 1)}")
+               for _ in range(LOOKUPS)]
+    queries += [(f"unknown{i}", "org0") for i in range(LOOKUPS // 10)]
+
+    def run():
+        for login, org in queries:
+            index = mapping.index_for(org)
+            key = index.resolve(login)
+            if key:
+                index.slack_id(key)
+    return best_of(run, 3) / len(queries) * 1e9
+
+
+def main():
+    conf = make_config()
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp, "config.json")
+        json_path.write_text(json.dumps(conf))
+        mapping_path = Path(tmp, "config.mapping")
+        user_mapping.main([str(json_path), str(mapping_path)])
+        print(f"{ENTRIES} entries ({ORGS} orgs): config.json {json_path.stat().st_size / 1e6:.1f} MB, "
+              f"config.mapping {mapping_path.stat().st_size / 1e6:.1f} MB")
+
+        json_load = best_of(lambda: user_mapping.MappingSource(str(json_path)).get())
+        mapping_load = best_of(lambda: user_mapping.MappingSource(str(mapping_path)).get())
+        snapshot_load = best_of(lambda: user_mapping.MappingSource(str(json_path), str(mapping_path)).get())
+        print(f"load: json {json_load * 1000:6.1f} ms, mapping {mapping_load * 1000:6.1f} ms ({json_load / mapping_load:.1f}x), "
+              f"json + snapshot {snapshot_load * 1000:6.1f} ms ({json_load / snapshot_load:.1f}x)")
+
+        mapping = user_mapping.MappingSource(str(mapping_path)).get()
+        print(f"lookup: {bench_lookup(mapping, conf):6.0f} ns/lookup (resolve + slack_id)")
+
+        source = user_mapping.MappingSource(str(json_path), check_interval=0)
+        old = source.get()
+        mtime = json_path.stat().st_mtime + 1
+        os.utime(json_path, (mtime, mtime))
+        latencies = []
+        start = time.perf_counter()
+        while source.get() is old:
+            t = time.perf_counter()
+            source.get().index_for("org1").resolve("User1")
+            latencies.append(time.perf_counter() - t)
+        swapped = time.perf_counter() - start
+        latencies.sort()
+        print(f"reload: swapped after {swapped * 1000:6.1f} ms, get() during reload "
+              f"p50 {latencies[len(latencies) // 2] * 1e6:5.1f} us, max {latencies[-1] * 1e6:7.1f} us ({len(latencies)} calls)")
+
+
+if __name__ == "__main__":
+    main()
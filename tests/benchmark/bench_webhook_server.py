@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+webhook_server の負荷試験
+
+Slack 代替サーバに対して、CLIENTS 個のクライアントから webhook を送り続け、1 秒あたりの処理数と応答時間の p50, p99 を測る
+ワーカー数を超える負荷では 503 (backpressure) になった割合もあわせて出す
+  PYTHONPATH=./src python tests/benchmark/bench_webhook_server.py
+"""
+
+import http.client
+import json
+import logging
+from pathlib import Path
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fake_slack import FakeSlackServer  # noqa: E402
+import delivery_dedup  # noqa: E402
+import github_webhook_lambda  # noqa: E402
+import slack_ratelimit  # noqa: E402
+import webhook_server  # noqa: E402
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+DURATION = 3.0  # 秒
+SLACK_DELAY = 0.02
+# (ラベル, ワーカー数, 待ちの数, クライアント数)
+CASES = [
+    ("16 workers, 16 clients", 16, 64, 16),
+    ("16 workers, 64 clients", 16, 64, 64),
+    ("4 workers, 64 clients", 4, 8, 64),
+]
+
+
+def client(url: str, headers: dict, body: bytes, deadline: float, name: str, results: list):
+    parts = urlsplit(url)
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        h = dict(headers, **{"X-GitHub-Delivery": f"{name}-{i}"})
+        start = time.perf_counter()
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        try:
+            conn.request("POST", "/", body=body, headers=h)
+            r = conn.getresponse()
+            r.read()
+            status = r.status
+        except OSError:
+            status = None
+        finally:
+            conn.close()
+        results.append((status, time.perf_counter() - start))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+def run(label: str, max_workers: int, max_pending: int, clients: int):
+    delivery_dedup._dedup = delivery_dedup.DeliveryDedup()
+    headers = json.loads((TESTDATA_PATH / "mentioned-header.json").read_text())
+    headers = {k: v for k, v in headers.items() if k.startswith("X-GitHub") or k == "content-type"}
+    body = (TESTDATA_PATH / "mentioned-body.json").read_bytes()
+
+    results = []
+    with webhook_server.WebhookServer(("127.0.0.1", 0), max_workers=max_workers, max_pending=max_pending) as server:
+        start = time.perf_counter()
+        deadline = start + DURATION
+        threads = [threading.Thread(target=client, args=(server.url, headers, body, deadline, f"{label}-{n}", results))
+                   for n in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+    ok = [t for s, t in results if s == 200]
+    busy = sum(1 for s, _ in results if s == 503)
+    other = len(results) - len(ok) - busy
+    print(f"{label:24s}: {len(ok) / elapsed:7.1f} req/s, p50 {percentile(ok, 0.5) * 1000:6.1f} ms, "
+          f"p99 {percentile(ok, 0.99) * 1000:6.1f} ms, 503 {busy / len(results):5.1%}, errors {other}")
+
+
+def main():
+    logging.getLogger().setLevel("WARNING")
+    github_webhook_lambda._lambda_logging_init = lambda: None
+    github_webhook_lambda.CONFIG_FILE = ""
+    github_webhook_lambda.g_user_mapping = github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@U0001", "@smatsumt2": "@U0002"})
+    slack_ratelimit.SLACK_RATE = 0  # 流量制限ではなくサーバの処理能力を測る
+
+    with FakeSlackServer(delay=SLACK_DELAY) as slack:
+        github_webhook_lambda.SLACK_URL = slack.url
+        for case in CASES:
+            run(*case)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ベンチマーク用の webhook の配信を tests/testdata の記録をもとに合成する
+
+- イベントの種類: mention (issue_comment), review_requested, PR の opened, review の submitted, 対象外のイベント (push など)
+- 本文の大きさ: 数百 B から数百 KB まで (大きいものほど少ない)
+- 本文中の mention の数, review を依頼する reviewer の数
+- 再送 (同じ X-GitHub-Delivery の配信) と、コメント・review の edited の割合
+同じ seed なら同じ配信列を返す
+  import webhook_generator
+  for event in webhook_generator.WebhookGenerator(seed=0).generate(1000): ...
+"""
+
+import copy
+import json
+from pathlib import Path
+import random
+
+TESTDATA_PATH = Path(__file__).parent.parent / "testdata"
+
+# 種類 -> (記録の名前, 割合)。None は対象外のイベント
+DEFAULT_MIX = {
+    "mentioned": ("mentioned", 0.35),
+    "review_requested": ("review-requested", 0.15),
+    "pr_opened": ("pr-opened-with-review-requested", 0.05),
+    "review_submitted": ("review-submitted", 0.2),
+    "unhandled": (None, 0.25),
+}
+UNHANDLED_EVENTS = ["push", "status", "check_run", "workflow_run", "check_suite"]
+# 本文の大きさ (バイト) と割合
+BODY_SIZES = [(200, 0.6), (2000, 0.3), (20000, 0.09), (200000, 0.01)]
+REVIEW_STATES = ["commented", "approved", "changes_requested"]
+FILLER = "Lorem ipsum dolor sit amet, `code` consectetur adipiscing elit.\n> quoted @nobody text\n"
+
+
+class WebhookGenerator:
+    """
+    :param seed: 乱数の seed
+    :param users: 登場する GitHub ユーザの数 (user0, user1, ...)
+    :param repos: リポジトリの数
+    :param prs: リポジトリごとの PR, Issue の数
+    :param mix: 種類 -> (記録の名前, 割合)
+    :param mention_density: 本文 1 つあたりの mention の数の平均
+    :param max_reviewers: review を依頼する reviewer の数の上限
+    :param duplicate_ratio: 直前の配信を再送する割合
+    :param edit_ratio: mention, review の submitted のうち、同じ種類の直前のものの edited にする割合
+    """
+
+    def __init__(self, seed: int = 0, users: int = 200, repos: int = 20, prs: int = 100, mix: dict = None,
+                 mention_density: float = 1.5, max_reviewers: int = 4, duplicate_ratio: float = 0.03,
+                 edit_ratio: float = 0.1):
+        self.rnd = random.Random(seed)
+        self.users = [f"user{i}" for i in range(users)]
+        self.repos = [f"org{i % 4}/repo{i}" for i in range(repos)]
+        self.prs = prs
+        self.mix = mix or DEFAULT_MIX
+        self.mention_density = mention_density
+        self.max_reviewers = max_reviewers
+        self.duplicate_ratio = duplicate_ratio
+        self.edit_ratio = edit_ratio
+        self.counts = {}
+        self._templates = {}
+        for name, _ in self.mix.values():
+            if name and name not in self._templates:
+                headers = json.loads((TESTDATA_PATH / f"{name}-header.json").read_text())
+                self._templates[name] = (headers, json.loads((TESTDATA_PATH / f"{name}-body.json").read_text()))
+        self._recent = []  # 再送する直近の配信
+        self._last = {}  # 種類 -> edited のもとにする直前の body
+        self._deliveries = 0
+
+    def generate(self, n: int):
+        """ :return: lambda_handler に渡すイベントのイテレータ """
+        kinds = list(self.mix)
+        weights = [self.mix[x][1] for x in kinds]
+        for _ in range(n):
+            if self._recent and self.rnd.random() < self.duplicate_ratio:
+                event = self.rnd.choice(self._recent)
+                self._count("duplicate")
+            else:
+                kind = self.rnd.choices(kinds, weights)[0]
+                event = self._event(kind)
+                self._recent = (self._recent + [event])[-20:]
+            yield event
+
+    def _count(self, kind: str) -> None:
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def _event(self, kind: str) -> dict:
+        name = self.mix[kind][0]
+        if name is None:
+            event_kind = self.rnd.choice(UNHANDLED_EVENTS)
+            headers = dict(self._templates["mentioned"][0], **{"X-GitHub-Event": event_kind})
+            self._count(kind)
+            return self._pack(headers, {"ref": "refs/heads/main", "repository": {"full_name": self.rnd.choice(self.repos)}})
+
+        headers, template = self._templates[name]
+        if kind in self._last and self.rnd.random() < self.edit_ratio:
+            self._count(kind + " (edited)")
+            return self._pack(headers, self._edit(kind))
+        self._count(kind)
+        body = copy.deepcopy(template)
+        repo = self.rnd.choice(self.repos)
+        number = self.rnd.randrange(self.prs)
+        body["repository"]["full_name"] = repo
+        author = self.rnd.choice(self.users)
+
+        if kind == "mentioned":
+            body["issue"]["number"] = number
+            body["comment"]["user"]["login"] = author
+            body["comment"]["html_url"] = f"https://github.com/{repo}/issues/{number}#issuecomment-{self._deliveries}"
+            body["comment"]["body"] = self._text()
+            self._last[kind] = body
+        elif kind in ("review_requested", "pr_opened"):
+            pr = body["pull_request"]
+            pr["id"] = self._pr_id(repo, number)
+            pr["number"] = number
+            pr["html_url"] = f"https://github.com/{repo}/pull/{number}"
+            pr["user"]["login"] = author
+            pr["body"] = self._text()
+            reviewers = self.rnd.sample(self.users, self.rnd.randint(1, self.max_reviewers))
+            pr["requested_reviewers"] = [{"login": x} for x in reviewers]
+        else:
+            pr = body["pull_request"]
+            pr["id"] = self._pr_id(repo, number)
+            pr["user"]["login"] = author
+            body["review"]["user"]["login"] = self.rnd.choice(self.users)
+            body["review"]["state"] = self.rnd.choice(REVIEW_STATES)
+            body["review"]["body"] = self._text()
+            body["review"]["html_url"] = f"https://github.com/{repo}/pull/{number}#pullrequestreview-{self._deliveries}"
+            self._last[kind] = body
+        return self._pack(headers, body)
+
+    def _edit(self, kind: str) -> dict:
+        """ 直前のコメント・review の edited。半分は mention を 1 つ足し、残りは mention を変えない """
+        body = copy.deepcopy(self._last[kind])
+        body["action"] = "edited"
+        data = body["comment"] if kind == "mentioned" else body["review"]
+        before = data["body"]
+        if self.rnd.random() < 0.5:
+            data["body"] = "@" + self.rnd.choice(self.users) + " " + before
+        else:
+            data["body"] = before + "\n(typo fixed)"
+        body["changes"] = {"body": {"from": before}}
+        self._last[kind] = body
+        return body
+
+    def _pack(self, headers: dict, body: dict) -> dict:
+        self._deliveries += 1
+        headers = dict(headers, **{"X-GitHub-Delivery": f"synthetic-{self._deliveries}"})
+        return {"headers": headers, "body": json.dumps(body)}
+
+    def _pr_id(self, repo: str, number: int) -> int:
+        return self.repos.index(repo) * self.prs + number
+
+    def _text(self) -> str:
+        size = self.rnd.choices([x for x, _ in BODY_SIZES], [w for _, w in BODY_SIZES])[0]
+        n = min(int(self.rnd.expovariate(1 / self.mention_density) + 0.5), 20) if self.mention_density else 0
+        mentions = " ".join("@" + x for x in self.rnd.sample(self.users, n))
+        text = mentions + " please take a look.\n"
+        return text + FILLER * max(0, (size - len(text)) // len(FILLER))
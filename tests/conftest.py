@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from fake_slack import FakeSlackServer
+
+
+@pytest.fixture
+def fake_slack():
+    """ ローカルの Slack 代替サーバ """
+    with FakeSlackServer() as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def no_slack_rate_limit(monkeypatch):
+    """ 流量制限のテスト以外では、Slack への送信の流量制限をしない """
+    import slack_ratelimit
+    monkeypatch.setattr(slack_ratelimit, "SLACK_RATE", 0)
+    monkeypatch.setattr(slack_ratelimit, "_senders", {})
+
+
+@pytest.fixture(autouse=True)
+def fresh_review_state(monkeypatch):
+    """ テストごとに review の state の記録を空にする """
+    import review_state
+    monkeypatch.setattr(review_state, "_tracker", review_state.ReviewStateTracker(snapshot=None))
+
+
+@pytest.fixture(autouse=True)
+def fixed_user_mapping(monkeypatch):
+    """ config.json を読み込まず、テストが g_user_mapping に設定した対応表 (設定しなければ空) を使う """
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_FILE", "")
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({}))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+テスト・ベンチマーク用の GitHub API (GET /users/{login}) と Slack API (users.lookupByEmail) のローカル代替サーバ
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeDirectoryServer:
+    """
+    ユーザ情報を返すだけの HTTP サーバ。GitHub API は {url}/github, Slack API は {url}/slack で受ける
+    :param emails: GitHub ユーザ名 -> 公開 email (None なら email 非公開)。ない名前は 404
+    :param slack_ids: email -> Slack メンバー ID。ない email は users_not_found
+    :param delay: 1 リクエストごとの応答遅延 (秒)
+    :param github_statuses: GitHub API で先頭から順に返すステータス。使いきったら通常の応答を返す
+    """
+
+    def __init__(self, emails: dict = None, slack_ids: dict = None, delay: float = 0.0, github_statuses=None):
+        self.emails = {k.lower(): v for k, v in (emails or {}).items()}
+        self.slack_ids = dict(slack_ids or {})
+        self.delay = delay
+        self.github_statuses = list(github_statuses or [])
+        self.github_calls = 0
+        self.slack_calls = 0
+        self.concurrency = 0
+        self.max_concurrency = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def github_url(self) -> str:
+        return self.url + "/github"
+
+    @property
+    def slack_url(self) -> str:
+        return self.url + "/slack"
+
+    def start(self) -> "FakeDirectoryServer":
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _github(self, login: str):
+        with self._lock:
+            self.github_calls += 1
+            if self.github_statuses:
+                return self.github_statuses.pop(0), {"message": "error"}
+        if login.lower() not in self.emails:
+            return 404, {"message": "Not Found"}
+        return 200, {"login": login, "email": self.emails[login.lower()]}
+
+    def _slack(self, email: str):
+        with self._lock:
+            self.slack_calls += 1
+        if email not in self.slack_ids:
+            return 200, {"ok": False, "error": "users_not_found"}
+        return 200, {"ok": True, "user": {"id": self.slack_ids[email]}}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.concurrency += 1
+                    fake.max_concurrency = max(fake.max_concurrency, fake.concurrency)
+                try:
+                    if fake.delay:
+                        time.sleep(fake.delay)
+                    url = urlparse(self.path)
+                    if url.path.startswith("/github/users/"):
+                        status, r = fake._github(unquote(url.path[len("/github/users/"):]))
+                    elif url.path == "/slack/users.lookupByEmail":
+                        status, r = fake._slack(parse_qs(url.query)["email"][0])
+                    else:
+                        status, r = 404, {}
+                finally:
+                    with fake._lock:
+                        fake.concurrency -= 1
+                body = json.dumps(r).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+テスト・ベンチマーク用の Slack Incoming Webhook のローカル代替サーバ
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import socket
+import threading
+import time
+from urllib.parse import parse_qs
+
+
+class FakeSlackServer:
+    """
+    受け取ったメッセージを messages に溜めるだけの HTTP/1.1 サーバ
+    :param delay: 1 リクエストごとの応答遅延 (秒)
+    :param statuses: 先頭から順に返すステータス。(status, headers) のタプルも可。使いきったら 200 を返す
+    """
+
+    def __init__(self, delay: float = 0.0, statuses=None):
+        self.delay = delay
+        self.statuses = list(statuses or [])
+        self.messages = []
+        self.paths = []  # messages と同じ順に、受け取ったパス
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/services/T000/B000/XXXX"
+
+    def start(self) -> "FakeSlackServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _next_status(self):
+        with self._lock:
+            self.requests += 1
+            if not self.statuses:
+                return 200, {}
+            status = self.statuses.pop(0)
+        return status if isinstance(status, tuple) else (status, {})
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_POST(self):
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    payload = json.loads(data)
+                else:  # slackweb 形式 (payload=...)
+                    payload = json.loads(parse_qs(data)["payload"][0])
+                if fake.delay:
+                    time.sleep(fake.delay)
+                status, headers = fake._next_status()
+                if status == 200:
+                    with fake._lock:
+                        fake.messages.append(payload)
+                        fake.paths.append(self.path)
+                body = b"ok" if status == 200 else b"error"
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
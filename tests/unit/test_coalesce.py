@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+URL = "https://hooks.slack.com/services/T000/B000/XXXX"
+PR = "https://github.com/smatsumt/testrepo2/pull/2"
+
+
+def _notification(text, group=PR, recipients="<@U0001>", attachment=None):
+    import delivery
+    payload = {"text": text}
+    if attachment:
+        payload["attachments"] = [{"text": attachment}]
+    return delivery.Notification(URL, payload, group, recipients)
+
+
+def test_digest():
+    """ 同じ PR・同じ相手への通知が 1 つにまとめられることのテスト """
+    import coalesce
+    coalescer = coalesce.Coalescer()
+    assert coalescer.add(_notification("review commented", attachment="overall"), tag=1) == []
+    assert coalescer.add(_notification("mentioned 1", attachment="inline 1"), tag=2) == []
+    assert coalescer.add(_notification("mentioned 2"), tag=3) == []
+    assert coalescer.add(_notification("other PR", group=PR + "0"), tag=4) == []
+    assert len(coalescer) == 4
+
+    (digest, tags), (other, other_tags) = coalescer.flush()
+    assert tags == [1, 2, 3]
+    assert digest.payload["text"] == "\n".join([
+        f":package: <@U0001>, 3 notifications in {PR}", "review commented", "mentioned 1", "mentioned 2"])
+    assert digest.payload["attachments"] == [{"text": "overall"}, {"text": "inline 1"}]
+    assert other_tags == [4]
+    assert other.payload == {"text": "other PR"}  # 1 件だけならそのまま
+    assert len(coalescer) == 0
+
+
+def test_bounds():
+    """ 溜める量に上限があり、超えたら押し出されることのテスト """
+    import coalesce
+    coalescer = coalesce.Coalescer(max_groups=2, max_items=3)
+    coalescer.add(_notification("a", group="pr1"), tag=1)
+    coalescer.add(_notification("b", group="pr2"), tag=2)
+    ready = coalescer.add(_notification("c", group="pr3"), tag=3)
+    assert [x[1] for x in ready] == [[1]]  # 最も古いまとめ先が押し出される
+
+    coalescer.add(_notification("d", group="pr3"), tag=4)
+    ready = coalescer.add(_notification("e", group="pr3"), tag=5)
+    assert [x[1] for x in ready] == [[3, 4, 5]]
+
+    # group のない通知はまとめない
+    ready = coalescer.add(_notification("f", group=None), tag=6)
+    assert [x[1] for x in ready] == [[6]]
+
+
+def test_coalesce():
+    import coalesce
+    r = coalesce.coalesce([("a", _notification("1")), ("b", _notification("2", recipients="<@U0002>")),
+                           ("c", _notification("3"))])
+    assert [x[1] for x in r] == [["a", "c"], ["b"]]
+
+
+def test_worker_coalesces_sqs_records(fake_slack):
+    """ delivery_worker がまとめて送信し、失敗したまとめメッセージの元の通知をすべて失敗として返すことのテスト """
+    import delivery
+    import delivery_worker
+    import outbound_queue
+    records = [{"messageId": f"m{i}", "body": outbound_queue.encode(delivery.Notification(fake_slack.url, {"text": f"message {i}"}, PR, "<@U0001>"))}
+               for i in range(5)]
+    r = delivery_worker._deliver_sqs_records(records)
+    assert r == {"batchItemFailures": []}
+    assert len(fake_slack.messages) == 1
+
+    fake_slack.statuses = [400]
+    r = delivery_worker._deliver_sqs_records(records)
+    assert r == {"batchItemFailures": [{"itemIdentifier": f"m{i}"} for i in range(5)]}
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from fake_slack import FakeSlackServer
+
+
+def test_deliver(fake_slack):
+    """ 送信先ごとの結果が、渡した順に返ることのテスト """
+    import delivery
+    with FakeSlackServer(statuses=[404]) as failing:
+        notifications = [
+            delivery.Notification(fake_slack.url, {"text": "team"}),
+            delivery.Notification(failing.url, {"text": "audit"}),
+            delivery.Notification(fake_slack.url, {"text": "dm"}),
+        ]
+        r = delivery.deliver(notifications)
+
+    assert [x.ok for x in r] == [True, False, True]
+    assert [x.notification for x in r] == notifications
+    assert r[1].error.status == 404
+    assert sorted(x["text"] for x in fake_slack.messages) == ["dm", "team"]
+
+
+def test_deliver_concurrently():
+    """ 遅い送信先が複数あっても並列に送信されることのテスト """
+    import delivery
+    n = 4
+    with FakeSlackServer(delay=0.2) as slow:
+        start = time.perf_counter()
+        r = delivery.deliver([delivery.Notification(slow.url, {"text": f"message {i}"}) for i in range(n)])
+        elapsed = time.perf_counter() - start
+
+    assert all(x.ok for x in r)
+    assert elapsed < 0.2 * n / 2
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+def test_seen():
+    """ 2 回目以降の delivery id が重複と判定されることのテスト """
+    import delivery_dedup
+    dedup = delivery_dedup.DeliveryDedup()
+    assert not dedup.seen("aaaa")
+    assert dedup.seen("aaaa")
+    assert not dedup.seen("bbbb")
+    assert dedup.stats() == {"hits": 1, "misses": 2, "evictions": 0, "entries": 2}
+
+
+def test_lru_eviction():
+    """ 上限を超えたら最も使われていない delivery id から捨てることのテスト """
+    import delivery_dedup
+    dedup = delivery_dedup.DeliveryDedup(max_entries=2)
+    dedup.seen("aaaa")
+    dedup.seen("bbbb")
+    dedup.seen("aaaa")  # aaaa を最近使ったことにする
+    dedup.seen("cccc")  # bbbb が捨てられる
+
+    assert dedup.evictions == 1
+    assert dedup.seen("aaaa")
+    assert not dedup.seen("bbbb")
+
+
+def test_ttl(monkeypatch):
+    """ 有効期限を過ぎた delivery id は重複と判定しないことのテスト """
+    import delivery_dedup
+    dedup = delivery_dedup.DeliveryDedup(ttl=0)
+    assert not dedup.seen("aaaa")
+    assert not dedup.seen("aaaa")
+
+
+def test_forget():
+    import delivery_dedup
+    dedup = delivery_dedup.DeliveryDedup()
+    dedup.seen("aaaa")
+    dedup.forget("aaaa")
+    assert not dedup.seen("aaaa")
+
+
+def test_shared_store():
+    """ 共有ストアを使うと、インスタンスをまたいで重複を検出できることのテスト """
+    import delivery_dedup
+    import kv_store
+    import time
+    store = kv_store.MemoryKVStore()
+    instance1 = delivery_dedup.DeliveryDedup(store=store)
+    instance2 = delivery_dedup.DeliveryDedup(store=store)
+
+    assert not instance1.seen("aaaa")
+    assert instance2.seen("aaaa")
+    instance1.forget("bbbb")
+    assert not instance2.seen("bbbb")
+    assert instance1.seen("bbbb")
+
+    # 処理に失敗して forget したら、すぐにほかのインスタンスで処理できる
+    assert not instance1.seen("cccc")
+    instance1.forget("cccc")
+    assert not instance2.seen("cccc")
+
+    # 期限切れの記録は、もう一度記録できる
+    assert store.put_if_absent("delivery/dddd", {}, time.time() - 1)
+    assert store.put_if_absent("delivery/dddd", {}, time.time() + 60)
+    assert not store.put_if_absent("delivery/dddd", {}, time.time() + 60)
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import json
+import os
 from pathlib import Path
 from unittest.mock import MagicMock
 
@@ -20,17 +21,17 @@ def test_find_mentioned_user():
     r = github_webhook_lambda._find_mentioned_user("@hoge @hoge text text")
     assert r == {"@hoge"}
 
-    # e-mail の後ろの、、、除くべきだけど、この段階では拾うことにする
-    # （GITHUT_TO_SLACK の ID 変換で対象なしとなるので、トータルでは問題ない）
+    # e-mail アドレスは mention として扱わない
     r = github_webhook_lambda._find_mentioned_user("@hoge @huga text text test@test.com")
-    assert r == {"@hoge", "@huga", "@test"}
+    assert r == {"@hoge", "@huga"}
 
 
 def test_notify_slack(monkeypatch):
     """ notify_slack で意図どおりに attachments が作られるかをテスト """
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda.slackweb, "Slack", MagicMock(return_value=mock))
+    import slack_transport
+    monkeypatch.setattr(slack_transport, "get_transport", MagicMock(return_value=mock))
     r = github_webhook_lambda.notify_slack("main message", attach_message="some attachment")
 
     name, args, kwargs = mock.mock_calls[0]
@@ -48,7 +49,7 @@ def test_handler_issue_pr_mentioned(monkeypatch):
 
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda, "GITHUB_TO_SLACK", {"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"})
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
     monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
     r = github_webhook_lambda.handler_issue_pr_mentioned(header, body)
 
@@ -66,7 +67,7 @@ def test_handler_issue_pr_mentioned_no_slack_user(monkeypatch):
 
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda, "GITHUB_TO_SLACK", {})
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({}))
     monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
     r = github_webhook_lambda.handler_issue_pr_mentioned(header, body)
 
@@ -82,11 +83,10 @@ def test_handler_review_requested(monkeypatch):
 
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda, "GITHUB_TO_SLACK", {"@smatsumt": "@smatsumt", "@skawagt": "@skawagt", "@smatsumoto78": "@smatsumoto78"})
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@skawagt": "@skawagt", "@smatsumoto78": "@smatsumoto78"}))
     monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
-    monkeypatch.setattr(github_webhook_lambda.notify_record, "query_pr_reviewers", MagicMock(return_value=[]))
-    monkeypatch.setattr(github_webhook_lambda.notify_record, "insert_pr_reviewers", MagicMock())
-    monkeypatch.setattr(github_webhook_lambda.notify_record, "store", MagicMock())
+    monkeypatch.setattr(github_webhook_lambda.notify_record, "add_pr_reviewers", MagicMock(return_value=[]))
+    monkeypatch.setattr(github_webhook_lambda.notify_record, "get_pr_reviewers", MagicMock(return_value=[]))
     r = github_webhook_lambda.handler_review_requested(header, body)
 
     args, kwargs = mock.call_args
@@ -103,11 +103,10 @@ def test_handler_review_requested_when_pr_opened(monkeypatch):
 
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda, "GITHUB_TO_SLACK", {"@smatsumt": "@smatsumt", "@skawagt": "@skawagt", "@smatsumoto78": "@smatsumoto78"})
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@skawagt": "@skawagt", "@smatsumoto78": "@smatsumoto78"}))
     monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
-    monkeypatch.setattr(github_webhook_lambda.notify_record, "query_pr_reviewers", MagicMock(return_value=[]))
-    monkeypatch.setattr(github_webhook_lambda.notify_record, "insert_pr_reviewers", MagicMock())
-    monkeypatch.setattr(github_webhook_lambda.notify_record, "store", MagicMock())
+    monkeypatch.setattr(github_webhook_lambda.notify_record, "add_pr_reviewers", MagicMock(return_value=[]))
+    monkeypatch.setattr(github_webhook_lambda.notify_record, "get_pr_reviewers", MagicMock(return_value=[]))
     r = github_webhook_lambda.handler_review_requested(header, body)
 
     args, kwargs = mock.call_args
@@ -124,7 +123,7 @@ def test_handler_review_submitted(monkeypatch):
 
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda, "GITHUB_TO_SLACK", {"@smatsumt": "@smatsumt"})
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt"}))
     monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
     r = github_webhook_lambda.handler_review_submitted(header, body)
 
@@ -142,10 +141,202 @@ def test_handler_review_submitted_with_mention(monkeypatch):
 
     import github_webhook_lambda
     mock = MagicMock()
-    monkeypatch.setattr(github_webhook_lambda, "GITHUB_TO_SLACK", {"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"})
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
     monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
     r = github_webhook_lambda.handler_review_submitted(header, body)
 
     args, kwargs = mock.call_args
     assert args[0] == ':speech_balloon: <@smatsumt> <@smatsumt2>, *review commented* by skawagt in https://github.com/smatsumt/testrepo2/pull/2#pullrequestreview-394584166'
     assert kwargs["attach_message"] == "@smatsumt2 yappari comment"
+
+
+def test_lambda_handler_dispatch(monkeypatch):
+    """ lambda_handler が (event, action) に登録されたハンドラだけを呼び出すことのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/review-submitted-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/review-submitted-body.json").read_text()
+
+    import github_webhook_lambda
+    submitted, mentioned = MagicMock(__name__="submitted"), MagicMock(__name__="mentioned")
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt"}))
+    monkeypatch.setattr(github_webhook_lambda, "HANDLERS", {
+        ("pull_request_review", "submitted"): [submitted],
+        ("issue_comment", "created"): [mentioned],
+    })
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+
+    assert r["statusCode"] == 200
+    assert submitted.called
+    assert not mentioned.called
+
+
+def test_lambda_handler_unhandled_event(monkeypatch):
+    """ 対象外のイベントは body をパースせずに終了することのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    header["X-GitHub-Event"] = "push"
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt"}))
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": "not a json"}, None)
+
+    assert r["statusCode"] == 200
+
+
+def test_lambda_handler_fan_out(monkeypatch, fake_slack):
+    """ 1 つのイベントの通知が SLACK_URL と SLACK_EXTRA_URLS のすべてに送られることのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_EXTRA_URLS", [fake_slack.url + "/audit"])
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+
+    assert r["statusCode"] == 200
+    assert len(fake_slack.messages) == 2
+    assert fake_slack.messages[0]["text"].startswith(":wave: <@smatsumt2>, *mentioned* by smatsumt")
+
+
+def test_lambda_handler_redelivery(monkeypatch, fake_slack):
+    """ 同じ X-GitHub-Delivery の再送では通知しないことのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    r1 = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+    r2 = github_webhook_lambda.lambda_handler({"headers": header, "body": "not a json"}, None)
+
+    assert json.loads(r1["body"])["result"] == "ok"
+    assert json.loads(r2["body"])["result"] == "duplicate"
+    assert len(fake_slack.messages) == 1
+
+
+def test_lambda_handler_review_requested_redelivered_after_failure(monkeypatch, fake_slack):
+    """ 通知に失敗した review_requested はレビュアーを記録せず、GitHub からの再送で通知することのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/review-requested-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/review-requested-body.json").read_text()
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda.notify_record, "_backend", github_webhook_lambda.notify_record.KeyValueBackend(github_webhook_lambda.notify_record.kv_store.MemoryKVStore()))
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@skawagt": "@skawagt", "@smatsumoto78": "@smatsumoto78"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_EXTRA_URLS", [])
+    fake_slack.statuses = [400]
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+    assert r["statusCode"] == 500
+    assert github_webhook_lambda.notify_record.get_pr_reviewers(json.loads(body)["pull_request"]["id"]) == []
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)  # 再送
+    assert r["statusCode"] == 200
+    assert len(fake_slack.messages) == 1
+    assert fake_slack.messages[0]["text"].startswith(":triangular_flag_on_post: <@skawagt> <@smatsumoto78>, *review requested*")
+    r = github_webhook_lambda.lambda_handler({"headers": dict(header, **{"X-GitHub-Delivery": "other"}), "body": body}, None)
+    assert len(fake_slack.messages) == 1  # 通知できたあとの同じレビュアーは抑制する
+
+
+def test_lambda_handler_deferred(monkeypatch):
+    """ DELIVERY_MODE=deferred のとき、通知はキューに入るだけで送信されないことのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+
+    import github_webhook_lambda
+    queue = github_webhook_lambda.outbound_queue.MemoryQueue()
+    deliver = MagicMock()
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda.outbound_queue, "_queue", queue)
+    monkeypatch.setattr(github_webhook_lambda.delivery, "deliver", deliver)
+    monkeypatch.setattr(github_webhook_lambda, "DELIVERY_MODE", "deferred")
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", "https://example.com/hook")
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+
+    assert r["statusCode"] == 200
+    assert not deliver.called
+    batch = queue.get_batch(10)
+    assert len(batch) == 1
+    assert batch[0][1].payload["text"].startswith(":wave: <@smatsumt2>, *mentioned* by smatsumt")
+
+
+def test_lambda_handler_summary_log(monkeypatch, fake_slack, caplog):
+    """ 1 配信につき要約が 1 行出て、INFO では payload やヘッダ全体は出ないことのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    monkeypatch.setattr(github_webhook_lambda, "LOG_MODE", "summary")
+    monkeypatch.setattr(github_webhook_lambda, "LOG_PAYLOAD_SAMPLE_RATE", 0)
+    with caplog.at_level("INFO"):
+        github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+
+    summaries = [x.getMessage() for x in caplog.records if x.getMessage().startswith("summary ")]
+    assert len(summaries) == 1
+    summary = json.loads(summaries[0][len("summary "):])
+    assert summary["delivery"] == header["X-GitHub-Delivery"]
+    assert summary["event"] == "issue_comment"
+    assert summary["action"] == "created"
+    assert summary["repo"] == "smatsumt/testrepo2"
+    assert isinstance(summary["number"], int)
+    assert summary["recipients"] == ["<@smatsumt2>"]
+    assert summary["status"] == 200
+    assert summary["duration_ms"] >= 0
+    assert not [x for x in caplog.records if body[:100] in x.getMessage() or "CloudFront" in x.getMessage()]
+
+
+def test_log_payload_sampled(monkeypatch, caplog):
+    """ サンプリングした payload は LOG_PAYLOAD_MAX_BYTES で切り詰められることのテスト """
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda, "LOG_PAYLOAD_SAMPLE_RATE", 1)
+    monkeypatch.setattr(github_webhook_lambda, "LOG_PAYLOAD_MAX_BYTES", 10)
+    with caplog.at_level("INFO", logger="github_webhook_lambda"):
+        github_webhook_lambda._log_payload('{"action": "created", "comment": {}}')
+    assert caplog.records[-1].getMessage() == 'payload (sampled, 10 of 36 bytes) {"action":'
+
+    with caplog.at_level("DEBUG", logger="github_webhook_lambda"):
+        github_webhook_lambda._log_payload('{"action": "created", "comment": {}}')
+    assert caplog.records[-1].getMessage() == 'payload {"action": "created", "comment": {}}'
+
+
+def test_load_config_snapshot(monkeypatch, tmp_path):
+    """ config は変更できない形で読み込まれ、CONFIG_SNAPSHOT があれば次からはそちらを読むことのテスト """
+    import pytest
+    import github_webhook_lambda
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"github_to_slack": {"@Hoge": "@U0001"}}))
+    snapshot_path = tmp_path / "config.marshal"
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_FILE", str(config_path))
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_SNAPSHOT", str(snapshot_path))
+    monkeypatch.setattr(github_webhook_lambda.user_mapping, "_sources", {})
+
+    github_webhook_lambda._load_config()
+    assert github_webhook_lambda.g_user_mapping.github_to_slack == {"@Hoge": "@U0001"}
+    assert github_webhook_lambda._mention_index().resolve("hoge") == "@Hoge"
+    with pytest.raises(TypeError):
+        github_webhook_lambda.g_user_mapping.github_to_slack["@huga"] = "@U0002"
+    assert snapshot_path.exists()
+
+    # config.json の内容が同じなら、mtime によらずパースせずにスナップショットを読む
+    UserMapping = github_webhook_lambda.user_mapping.UserMapping
+    from_config, parsed = UserMapping.from_config, []
+    monkeypatch.setattr(UserMapping, "from_config", classmethod(lambda cls, conf: parsed.append(conf) or from_config(conf)))
+    mtime = snapshot_path.stat().st_mtime
+    os.utime(config_path, (mtime + 10, mtime + 10))
+    monkeypatch.setattr(github_webhook_lambda.user_mapping, "_sources", {})
+    github_webhook_lambda._load_config()
+    assert github_webhook_lambda.g_user_mapping.github_to_slack == {"@Hoge": "@U0001"}
+    assert parsed == []
+
+    # 内容が変わっていれば、スナップショットが新しくても config.json を読む
+    config_path.write_text(json.dumps({"github_to_slack": {"@Hoge": "@U0002"}}))
+    os.utime(snapshot_path, (mtime + 20, mtime + 20))
+    monkeypatch.setattr(github_webhook_lambda.user_mapping, "_sources", {})
+    github_webhook_lambda._load_config()
+    assert len(parsed) == 1
+    assert github_webhook_lambda.g_user_mapping.github_to_slack == {"@Hoge": "@U0002"}
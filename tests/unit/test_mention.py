@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+def test_find_mentions_markdown():
+    """ コード、引用、e-mail アドレス、チーム内の "@" を mention として扱わないことのテスト """
+    import mention
+    text = "\n".join([
+        "@hoge please check",
+        "```python",
+        "@decorator",
+        "```",
+        "> @quoted wrote:",
+        "see `@inline` and ``@double ` code`` but @huga",
+        "mail to test@test.com or @org/team",
+        "~~~~",
+        "``` is not closing",
+        "@in_tilde",
+        "~~~~",
+        "last @piyo-.",
+    ])
+    assert mention.find_mentions(text) == {"@hoge", "@huga", "@piyo"}
+
+
+def test_find_mentions_after_japanese():
+    """ 日本語の直後の mention も拾い、ASCII の英数字の直後は e-mail アドレスとみなすことのテスト """
+    import mention
+    assert mention.find_mentions("こんにちは@hoge 確認お願いします@smatsumt。") == {"@hoge", "@smatsumt"}
+    assert mention.find_mentions("（@huga）test@test.com") == {"@huga"}
+
+
+def test_find_mentions_unclosed_backticks():
+    """ 閉じられていない ` はインラインコードとして扱わないことのテスト """
+    import mention
+    assert mention.find_mentions("`` @hoge ` @huga") == {"@hoge", "@huga"}
+
+
+def test_find_mentions_with_index():
+    """ index を指定した場合、設定済みのユーザのみを設定上のキーで返すことのテスト """
+    import mention
+    index = mention.MentionIndex({"@Hoge": "@U0001", "@huga": "@U0002"})
+    assert mention.find_mentions("@hoge @HUGA @unknown", index) == {"@Hoge", "@huga"}
+    assert index.resolve("HOGE") == "@Hoge"
+    assert index.resolve("@unknown") is None
+
+
+def test_find_new_mentions():
+    """ 編集で新しく加わった mention のみを返すことのテスト """
+    import mention
+    before = "header\n@hoge first\n```\n@code\n```\n@huga"
+    after = "header\n@hoge first\n```\n@code\n```\n@huga @piyo\n@hoge again"
+    assert mention.find_new_mentions(before, after) == {"@piyo"}
+
+    # 共通部分でコードブロックが始まっている場合
+    before = "```\n@code"
+    after = "```\n@code\n@still_code\n```\n@new"
+    assert mention.find_new_mentions(before, after) == {"@new"}
+
+    assert mention.find_new_mentions(None, "@hoge") == {"@hoge"}
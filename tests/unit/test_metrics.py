@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+
+def _run_lambda(monkeypatch, fake_slack, tmp_path):
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    return github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+
+
+def test_emit_schema(monkeypatch, fake_slack, tmp_path, capsys):
+    """ 1 回の呼び出しで EMF 形式の JSON が 1 行出力され、宣言したメトリクスがすべて値をもつことのテスト """
+    import metrics
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    capsys.readouterr()
+    r = _run_lambda(monkeypatch, fake_slack, tmp_path)
+    assert r["statusCode"] == 200
+
+    lines = [x for x in capsys.readouterr().out.splitlines() if x.startswith("{")]
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert isinstance(record["_aws"]["Timestamp"], int)
+    directive, = record["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == metrics.METRICS_NAMESPACE
+    assert directive["Dimensions"] == [["Event"]]
+    assert record["Event"] == "issue_comment"
+
+    names = {x["Name"]: x["Unit"] for x in directive["Metrics"]}
+    for name in ["load_config", "json_loads", "handler_issue_pr_mentioned", "slack_post"]:
+        assert names[name] == "Milliseconds"
+    assert names["notifications_sent"] == "Count"
+    for name in names:
+        assert isinstance(record[name], (int, float))
+    assert record["notifications_sent"] == 1
+
+
+def test_emit_memory(monkeypatch, fake_slack, tmp_path, capsys):
+    """ METRICS_MEMORY のときはピーク RSS と tracemalloc の結果も出力されることのテスト """
+    import tracemalloc
+    import metrics
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_MEMORY", True)
+    capsys.readouterr()
+    try:
+        _run_lambda(monkeypatch, fake_slack, tmp_path)
+    finally:
+        tracemalloc.stop()
+
+    record = json.loads([x for x in capsys.readouterr().out.splitlines() if x.startswith("{")][-1])
+    names = {x["Name"]: x["Unit"] for x in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert names["peak_rss"] == "Kilobytes"
+    assert names["tracemalloc_peak"] == "Bytes"
+    assert record["peak_rss"] > 0
+    assert isinstance(record["tracemalloc_top"], list)
+
+
+def test_begin_without_reset_peak(monkeypatch):
+    """ tracemalloc.reset_peak がない Python (3.8 以前) でも、2 回目以降の begin でピークを測りなおせることのテスト """
+    import tracemalloc
+    import metrics
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_MEMORY", True)
+    monkeypatch.delattr(tracemalloc, "reset_peak", raising=False)
+    try:
+        metrics.begin()
+        data = bytearray(1000000)
+        del data
+        metrics.begin()
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] < 1000000
+    finally:
+        tracemalloc.stop()
+
+
+def test_per_thread(monkeypatch, capsys):
+    """ 並行に処理したリクエストの計測値が混ざらず、bind したスレッドプールの計測値は呼び出し元に入ることのテスト """
+    from concurrent.futures import ThreadPoolExecutor
+    import threading
+    import metrics
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    capsys.readouterr()
+    started = threading.Barrier(2)
+
+    def request(name: str, n: int) -> None:
+        metrics.begin()
+        started.wait()  # 両方のリクエストが計測を始めてから数える
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for f in [executor.submit(metrics.bind(metrics.count), name) for _ in range(n)]:
+                f.result()
+        started.wait()
+        metrics.emit({"Request": name})
+
+    threads = [threading.Thread(target=request, args=(name, n)) for name, n in [("a", 3), ("b", 5)]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    records = [json.loads(x) for x in capsys.readouterr().out.splitlines() if x.startswith("{")]
+    assert sorted((x["Request"], x.get("a"), x.get("b")) for x in records) == [("a", 3, None), ("b", None, 5)]
+
+
+def test_disabled(monkeypatch, fake_slack, tmp_path, capsys):
+    """ 無効のときは何も出力しないことのテスト """
+    import metrics
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    capsys.readouterr()
+    _run_lambda(monkeypatch, fake_slack, tmp_path)
+
+    assert not [x for x in capsys.readouterr().out.splitlines() if x.startswith("{")]
+    assert metrics.timer("x") is metrics.timer("y")
@@ -69,10 +69,113 @@ def test_load_and_store(tmp_path, monkeypatch):
     record_file.write_text(json.dumps(test_record))
     monkeypatch.setattr(notify_record, "RECORD_FILE", str(record_file))
 
-    records = notify_record.load()
-    records["1111"] = {"reviewers": ["@aaa", "@bbb"], "datetime": datetime.datetime.now().isoformat()}
+    notify_record.load()
+    notify_record.insert_pr_reviewers(1111, ["@aaa", "@bbb"])
     notify_record.store()
 
-    r = json.loads(record_file.read_text())
-    assert "0000" in r["records"]
-    assert "1111" in r["records"]
+    # 変更分は追記される
+    lines = record_file.read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1])["id"] == "1111"
+
+    monkeypatch.setattr(notify_record, "g_loaded_file", None)
+    r = notify_record.load()
+    assert "0000" in r
+    assert "1111" in r
+
+
+def test_load_once(tmp_path, monkeypatch):
+    """ 同じファイルは warm なコンテナで 1 度だけ読むことのテスト """
+    import notify_record
+    record_file = tmp_path / "record.json"
+    monkeypatch.setattr(notify_record, "RECORD_FILE", str(record_file))
+    notify_record.load()
+    notify_record.insert_pr_reviewers(1111, ["@aaa"])
+    notify_record.store()
+
+    record_file.write_text(json.dumps({"records": {}}))
+    r = notify_record.load()
+    assert "1111" in r
+
+
+def test_query_expired(tmp_path, monkeypatch):
+    """ 1 日以上前の記録も期限切れとして扱われることのテスト (timedelta.seconds では日数が無視される) """
+    import notify_record
+    one_day_ago = datetime.datetime.now() - datetime.timedelta(days=1, seconds=-10)
+    monkeypatch.setattr(notify_record, "g_record_dict", {
+        "0000": {"reviewers": ["@aaa"], "datetime": one_day_ago.isoformat()},
+    })
+    assert notify_record.query_pr_reviewers("0000") == []
+
+
+def test_store_expire(tmp_path, monkeypatch):
+    """ 期限切れのレコードが store 時に削除されることのテスト """
+    import notify_record
+    record_file = tmp_path / "record.json"
+    monkeypatch.setattr(notify_record, "RECORD_FILE", str(record_file))
+    notify_record.load()
+    notify_record.insert_pr_reviewers(1111, ["@aaa"])
+    notify_record.insert_pr_reviewers(2222, ["@bbb"])
+    notify_record.store()
+
+    monkeypatch.setattr(notify_record, "SEC_BORDER", 0)
+    notify_record.insert_pr_reviewers(3333, ["@ccc"])  # 期限 0 秒なので store 時には期限切れ
+    monkeypatch.setattr(notify_record.time, "time", lambda: datetime.datetime.now().timestamp() + 120)
+    notify_record.store()
+    assert notify_record.g_record_dict == {}
+
+
+def _check_add_pr_reviewers(backend):
+    """ 各バックエンド共通の add_pr_reviewers, get_pr_reviewers の動作確認 """
+    assert backend.get_pr_reviewers("0000") == []
+    assert backend.add_pr_reviewers("0000", ["@aaa", "@bbb"]) == []
+    assert backend.get_pr_reviewers("0000") == ["@aaa", "@bbb"]
+    assert backend.add_pr_reviewers("0000", ["@aaa", "@ccc"]) == ["@aaa", "@bbb"]
+    assert backend.add_pr_reviewers("0000", ["@ddd"]) == ["@aaa", "@bbb", "@ccc"]
+    assert backend.add_pr_reviewers("1111", ["@aaa"]) == []
+
+
+def test_file_backend(tmp_path, monkeypatch):
+    import notify_record
+    monkeypatch.setattr(notify_record, "RECORD_FILE", str(tmp_path / "record.json"))
+    _check_add_pr_reviewers(notify_record.FileBackend())
+
+
+def test_sqlite_backend(tmp_path):
+    import notify_record
+    _check_add_pr_reviewers(notify_record.SQLiteBackend(str(tmp_path / "record.sqlite3")))
+
+
+def test_key_value_backend():
+    import kv_store
+    import notify_record
+    _check_add_pr_reviewers(notify_record.KeyValueBackend(kv_store.MemoryKVStore()))
+
+
+def test_key_value_backend_expired(monkeypatch):
+    """ SEC_BORDER 秒を過ぎた記録は通知済みとして扱わないことのテスト """
+    import kv_store
+    import notify_record
+    monkeypatch.setattr(notify_record, "SEC_BORDER", 0)
+    backend = notify_record.KeyValueBackend(kv_store.MemoryKVStore())
+    assert backend.add_pr_reviewers("0000", ["@aaa"]) == []
+    assert backend.add_pr_reviewers("0000", ["@aaa"]) == []
+
+
+def test_key_value_backend_parallel_writers():
+    """ 同じ PR に並列に書き込んでも、各レビュアーへの通知が漏れも重複もしないことのテスト """
+    from concurrent.futures import ThreadPoolExecutor
+    import kv_store
+    import notify_record
+    backend = notify_record.KeyValueBackend(kv_store.MemoryKVStore(latency=0.001))
+    # 各ライターは自分のレビュアー + 共通のレビュアーを追加する
+    requests = [[f"@user{i}", "@common"] for i in range(32)]
+
+    def notify(reviewers):
+        return set(reviewers) - set(backend.add_pr_reviewers("0000", reviewers))
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        targets = list(executor.map(notify, requests))
+
+    notified = [x for t in targets for x in t]
+    assert sorted(notified) == sorted({x for r in requests for x in r})
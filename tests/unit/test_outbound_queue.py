@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    import outbound_queue
+    if request.param == "sqlite":
+        return outbound_queue.SQLiteQueue(str(tmp_path / "queue.sqlite3"))
+    return outbound_queue.MemoryQueue()
+
+
+def test_queue(queue):
+    """ 入れた順に取り出せて、ack したものは消え、release したものは再度取り出せることのテスト """
+    import delivery
+    notifications = [delivery.Notification("https://example.com/hook", {"text": f"message {i}"}) for i in range(5)]
+    queue.put(notifications)
+
+    batch1 = queue.get_batch(3)
+    batch2 = queue.get_batch(3)
+    assert [x[1] for x in batch1 + batch2] == notifications
+    assert queue.get_batch(3) == []  # 取り出し中のものは取り出せない
+
+    queue.ack([x[0] for x in batch1])
+    queue.release([x[0] for x in batch2])
+    assert [x[1] for x in queue.get_batch(10)] == notifications[3:]
+    assert len(queue) == 2
+
+
+def test_worker_drains_queue(monkeypatch, fake_slack):
+    """ delivery_worker がキューを空にすることのテスト """
+    import delivery
+    import delivery_worker
+    import outbound_queue
+    queue = outbound_queue.MemoryQueue()
+    monkeypatch.setattr(outbound_queue, "_queue", queue)
+    queue.put([delivery.Notification(fake_slack.url, {"text": f"message {i}"}) for i in range(25)])
+
+    r = delivery_worker.lambda_handler({}, None)
+    assert r == {"delivered": 25, "failed": 0}
+    assert len(queue) == 0
+    assert len(fake_slack.messages) == 25
+
+
+def test_worker_sqs_records(fake_slack):
+    """ SQS から呼び出された場合、失敗したメッセージだけが batchItemFailures になることのテスト """
+    import delivery
+    import delivery_worker
+    import outbound_queue
+    fake_slack.statuses = [200, 400]
+    records = [{"messageId": f"m{i}", "body": outbound_queue.encode(delivery.Notification(fake_slack.url, {"text": f"message {i}"}))}
+               for i in range(2)]
+    r = delivery_worker._deliver_sqs_records(records[:1]), delivery_worker._deliver_sqs_records(records[1:])
+    assert r == ({"batchItemFailures": []}, {"batchItemFailures": [{"itemIdentifier": "m1"}]})
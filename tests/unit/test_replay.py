@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+TESTDATA_PATH = SCRIPT_PATH.parent / "testdata"
+MENTIONED_URL = "https://hooks.slack.com/services/T000/B000/mentioned"
+
+
+def _config(tmp_path) -> str:
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"github_to_slack": {"@smatsumt": "@U0001", "@smatsumt2": "@U0002", "@skawagt": "@U0003"},
+                                "routes": [{"repo": "smatsumt/*", "event": "mentioned", "url": MENTIONED_URL}]}))
+    return str(path)
+
+
+def test_iter_deliveries(tmp_path):
+    """ ディレクトリの header/body の組と JSONL の両方から読み込めることのテスト """
+    import replay
+    names = [name for name, _ in replay.iter_deliveries([str(TESTDATA_PATH)])]
+    assert "mentioned-body" in names
+    assert "review-submitted-body-with-mention" in names
+
+    archive = tmp_path / "archive.jsonl"
+    header = json.loads((TESTDATA_PATH / "mentioned-header.json").read_text())
+    body = json.loads((TESTDATA_PATH / "mentioned-body.json").read_text())
+    archive.write_text(json.dumps({"headers": header, "body": body}) + "\n\n")
+    (name, event), = replay.iter_deliveries([str(archive)])
+    assert name == "archive.jsonl:1"
+    assert json.loads(replay.parse_event(event)["body"]) == body
+
+
+def test_main(monkeypatch, tmp_path, fake_slack):
+    """ 通知は送らずに記録され、ワーカープロセスを使っても同じ結果になることのテスト """
+    import github_webhook_lambda
+    import replay
+    # workers=0 はこのプロセスのモジュールを書き換えるので、テスト後に戻す
+    for name in ["g_user_mapping", "DELIVERY_MODE", "SLACK_EXTRA_URLS", "CONFIG_FILE", "CONFIG_SNAPSHOT", "_lambda_logging_init"]:
+        monkeypatch.setattr(github_webhook_lambda, name, getattr(github_webhook_lambda, name))
+    monkeypatch.setattr(replay.metrics, "METRICS_ENABLED", replay.metrics.METRICS_ENABLED)
+    monkeypatch.setattr(replay.outbound_queue, "_queue", None)
+    monkeypatch.setattr(replay.delivery_dedup, "_dedup", replay.delivery_dedup._dedup)
+    monkeypatch.setattr(replay.notify_record, "_backend", None)
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    # 設定されていても、未登録のユーザを API で引かない
+    monkeypatch.setattr(replay.user_resolver, "GITHUB_TOKEN", "github-token")
+    monkeypatch.setattr(replay.user_resolver, "SLACK_BOT_TOKEN", "slack-token")
+    monkeypatch.setattr(replay.user_resolver, "_resolver", None)
+    monkeypatch.setattr(replay.webhook_payload, "WEBHOOK_SECRET", "s3cret")  # 記録した配信の署名は検証しない
+    config = _config(tmp_path)
+
+    assert replay.main([str(TESTDATA_PATH), "--config", config, "--workers", "2", "-o", str(tmp_path / "a.jsonl")]) == 0
+    assert replay.main([str(TESTDATA_PATH), "--config", config, "--workers", "0", "-o", str(tmp_path / "b.jsonl")]) == 0
+
+    a = (tmp_path / "a.jsonl").read_text()
+    assert a == (tmp_path / "b.jsonl").read_text()
+    records = {x["name"]: x for x in map(json.loads, a.splitlines())}
+    assert records["mentioned-body"]["status"] == 200
+    assert records["mentioned-body"]["notifications"][0]["text"].startswith(":wave: <@U0002>, *mentioned* by smatsumt")
+    assert records["review-requested-body"]["notifications"][0]["recipients"]
+    # どの送信先に送るはずだったか。routes に一致しなければ SLACK_URL の代わりの DRY_RUN_URL
+    assert records["mentioned-body"]["notifications"][0]["url"] == MENTIONED_URL
+    assert records["review-requested-body"]["notifications"][0]["url"] == replay.DRY_RUN_URL
+    assert len(fake_slack.messages) == 0
+    assert replay.user_resolver.get_resolver() is None
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+from pathlib import Path
+from unittest.mock import MagicMock
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+
+def test_transition():
+    """ state が変わったときはすべて、同じ state のときは新しい mention 先にのみ通知することのテスト """
+    import review_state
+    tracker = review_state.ReviewStateTracker(snapshot=None)
+
+    assert tracker.transition(1, "Reviewer", "commented", {"@a"}) == {"@a"}
+    assert tracker.transition(1, "reviewer", "commented", {"@a"}) == set()  # edited など、変化なし
+    assert tracker.transition(1, "reviewer", "commented", {"@a", "@b"}) == {"@b"}
+    assert tracker.transition(1, "reviewer", "approved", {"@a"}) == {"@a"}
+    assert tracker.transition(1, "other", "approved", {"@a"}) == {"@a"}  # reviewer ごとに覚える
+    assert tracker.transition(2, "reviewer", "approved", {"@a"}) == {"@a"}  # PR ごとに覚える
+    assert tracker.suppressed == 1
+    assert tracker.transition(3, "reviewer", "commented", set()) == set()
+    assert tracker.transition(3, "reviewer", "commented", set()) == set()
+    assert tracker.suppressed == 1  # mention 先がもともとない review は抑制に数えない
+
+    tracker.reset(1, ["@Reviewer"])  # 再度レビューを依頼されたら、同じ state でも通知する
+    assert tracker.transition(1, "reviewer", "approved", {"@a"}) == {"@a"}
+
+
+def test_key_value_tracker():
+    """ KV ストアに保存する場合も同じように通知し、同じストアを使う別のコンテナに記録が引き継がれることのテスト """
+    import kv_store
+    import review_state
+    store = kv_store.MemoryKVStore()
+    tracker = review_state.KeyValueReviewStateTracker(store)
+
+    assert tracker.transition(1, "Reviewer", "commented", {"@a"}) == {"@a"}
+    assert tracker.transition(1, "reviewer", "commented", {"@a", "@b"}) == {"@b"}
+    other = review_state.KeyValueReviewStateTracker(store)  # 別のコンテナ
+    assert other.transition(1, "reviewer", "commented", {"@a", "@b"}) == set()
+    assert other.suppressed == 1
+    assert other.transition(1, "reviewer", "approved", {"@a"}) == {"@a"}
+    assert tracker.transition(1, "other", "approved", {"@a"}) == {"@a"}
+
+    r, update = tracker.evaluate(2, "reviewer", "approved", {"@a"})
+    assert r == {"@a"}
+    assert other.transition(2, "reviewer", "approved", {"@a"}) == {"@a"}  # apply するまでは記録しない
+    tracker.reset(1, ["@Reviewer"])
+    assert other.transition(1, "reviewer", "approved", {"@a"}) == {"@a"}
+    assert other.transition(1, "other", "approved", {"@a"}) == set()  # ほかの reviewer の記録は残す
+
+
+def test_lru_eviction():
+    """ PR の数が上限を超えたら、最近更新されていない PR から捨てることのテスト """
+    import review_state
+    tracker = review_state.ReviewStateTracker(max_prs=2, snapshot=None)
+    tracker.transition(1, "r", "commented", {"@a"})
+    tracker.transition(2, "r", "commented", {"@a"})
+    tracker.transition(1, "r", "commented", {"@a"})
+    tracker.transition(3, "r", "commented", {"@a"})
+
+    assert len(tracker) == 2 and tracker.evictions == 1
+    assert tracker.transition(1, "r", "commented", {"@a"}) == set()
+    assert tracker.transition(2, "r", "commented", {"@a"}) == {"@a"}  # 捨てられたので通知する
+
+
+def test_snapshot(tmp_path):
+    """ スナップショットに保存した状態を、次に作ったときに読み込むことのテスト """
+    import review_state
+    snapshot = str(tmp_path / "review_state.snapshot")
+    tracker = review_state.ReviewStateTracker(snapshot=snapshot, snapshot_interval=3600)
+    tracker.transition(1, "r", "commented", {"@a"})
+    assert not Path(snapshot).exists()  # 間隔が空くまでは保存しない
+    tracker.save()
+
+    restored = review_state.ReviewStateTracker(snapshot=snapshot)
+    assert restored.transition(1, "r", "commented", {"@a"}) == set()
+
+    Path(snapshot).write_bytes(b"broken")
+    assert len(review_state.ReviewStateTracker(snapshot=snapshot)) == 0
+
+
+def test_handler_review_submitted_edited(monkeypatch):
+    """ 同じ review の edited では、新しく加わった mention 先にのみ通知することのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/review-submitted-header.json").read_text())
+    body = json.loads((SCRIPT_PATH.parent / "testdata/review-submitted-body.json").read_text())
+    edited = copy.deepcopy(body)
+    edited["action"] = "edited"
+    edited["review"]["body"] = "@smatsumt2 yappari comment"
+
+    import github_webhook_lambda
+    mock = MagicMock()
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
+    github_webhook_lambda.handler_review_submitted(header, body)
+    github_webhook_lambda.handler_review_submitted(header, body)  # 変化なし
+    github_webhook_lambda.handler_review_submitted(header, edited)
+
+    assert mock.call_count == 2
+    args, kwargs = mock.call_args
+    assert args[0] == ':speech_balloon: <@smatsumt2>, *review commented* by skawagt in https://github.com/smatsumt/testrepo2/pull/2#pullrequestreview-394584166'
+
+
+def test_lambda_handler_redelivered_after_failure(monkeypatch, fake_slack):
+    """ 通知に失敗した review は記録せず、GitHub からの再送で通知することのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/review-submitted-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/review-submitted-body.json").read_text()
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_EXTRA_URLS", [])
+    fake_slack.statuses = [400]
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+    assert r["statusCode"] == 500
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)  # 再送
+    assert r["statusCode"] == 200
+    assert len(fake_slack.messages) == 1
+    r = github_webhook_lambda.lambda_handler({"headers": dict(header, **{"X-GitHub-Delivery": "other"}), "body": body}, None)
+    assert len(fake_slack.messages) == 1  # 通知できたあとの同じ review は抑制する
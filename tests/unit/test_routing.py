@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+ROUTES = [
+    {"repo": "some-org/*", "url": "https://example.com/some-org"},
+    {"repo": ["some-org/api-*", "other-org/api"], "event": ["approved", "changes_requested"], "url": "https://example.com/api-review"},
+    {"repo": "*/docs?", "urls": ["https://example.com/docs", "https://example.com/some-org"]},
+    {"team": "backend", "event": "review_requested", "url": "https://example.com/backend"},
+]
+TEAMS = {"backend": ["@Alice", "bob"], "frontend": ["@carol"]}
+
+
+def test_route():
+    """ repo, event, team の条件に一致したルールの URL を、ルールの順に重複を除いて返すことのテスト """
+    import routing
+    router = routing.Router(ROUTES, TEAMS)
+
+    assert router.route("Some-Org/web", "mentioned") == ("https://example.com/some-org",)
+    assert router.route("some-org/api-server", "approved") == ("https://example.com/some-org", "https://example.com/api-review")
+    assert router.route("some-org/api-server", "commented") == ("https://example.com/some-org",)
+    assert router.route("other-org/api", "changes_requested") == ("https://example.com/api-review",)
+    assert router.route("other-org/api2", "changes_requested") == ()  # 固定文字列のパターンは完全一致のみ
+    assert router.route("some-org/docs1") == ("https://example.com/some-org", "https://example.com/docs")
+    assert router.route("x/docs") == ()  # "?" は 1 文字
+
+
+def test_route_team():
+    """ 通知先のユーザのうち 1 人でもチームに含まれていれば、そのチームのルールに一致することのテスト """
+    import routing
+    router = routing.Router(ROUTES, TEAMS)
+
+    assert router.route("x/y", "review_requested", ["@carol", "@alice"]) == ("https://example.com/backend",)
+    assert router.route("x/y", "review_requested", ["@BOB"]) == ("https://example.com/backend",)
+    assert router.route("x/y", "review_requested", ["@carol"]) == ()
+    assert router.route("x/y", "mentioned", ["@alice"]) == ()
+
+
+def test_lambda_handler_routed(monkeypatch, tmp_path, fake_slack):
+    """ config.json の routes に従って、リポジトリごとの URL に送られることのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({
+        "github_to_slack": {"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"},
+        "routes": [{"repo": "smatsumt/*", "event": "mentioned", "url": fake_slack.url + "/testrepo"},
+                   {"repo": "other/*", "url": fake_slack.url + "/other"}],
+    }))
+
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_FILE", str(config_path))
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_SNAPSHOT", None)
+    monkeypatch.setattr(github_webhook_lambda.user_mapping, "_sources", {})
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_EXTRA_URLS", [fake_slack.url + "/audit"])
+
+    assert github_webhook_lambda._slack_urls("other/repo") == [fake_slack.url, fake_slack.url + "/audit"]
+    r = github_webhook_lambda.lambda_handler({"headers": header, "body": body}, None)
+    assert r["statusCode"] == 200
+    assert github_webhook_lambda._slack_urls("smatsumt/testrepo2", "mentioned") == [fake_slack.url + "/testrepo", fake_slack.url + "/audit"]
+    assert github_webhook_lambda._slack_urls("other/repo") == [fake_slack.url + "/other", fake_slack.url + "/audit"]
+    assert sorted(fake_slack.paths) == ["/services/T000/B000/XXXX/audit", "/services/T000/B000/XXXX/testrepo"]
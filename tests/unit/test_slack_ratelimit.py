@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+
+def test_token_bucket():
+    """ burst 件までは待たずに送れて、その後は rate に従って待つことのテスト """
+    import slack_ratelimit
+    bucket = slack_ratelimit.TokenBucket(rate=10, burst=3)
+    waits = [bucket.acquire(max_wait=10) for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(0.1, abs=0.01)
+    assert waits[4] == pytest.approx(0.2, abs=0.01)
+    assert bucket.acquire(max_wait=0.1) is None  # 待ち時間が上限を超える
+
+
+def test_retry_after_429(fake_slack):
+    """ 429 のときは Retry-After だけ待ってリトライすることのテスト """
+    import slack_ratelimit
+    fake_slack.statuses = [(429, {"Retry-After": "0.2"}), (429, {"Retry-After": "0"})]
+    sender = slack_ratelimit.RateLimitedSender(fake_slack.url, rate=0, max_retries=3)
+    start = time.perf_counter()
+    sender.notify(text="message")
+
+    assert 0.2 <= time.perf_counter() - start
+    assert fake_slack.requests == 3
+    assert len(fake_slack.messages) == 1
+    assert sender.stats() == {"delivered": 1, "delayed": 1, "dropped": 0}
+
+
+def test_give_up(fake_slack):
+    """ 429 が続く場合、待ち時間が上限を超える場合はあきらめることのテスト """
+    import slack_ratelimit
+    import slack_transport
+    fake_slack.statuses = [(429, {"Retry-After": "0"})] * 3 + [(429, {"Retry-After": "60"})]
+    sender = slack_ratelimit.RateLimitedSender(fake_slack.url, rate=0, max_retries=2)
+    with pytest.raises(slack_transport.SlackError):
+        sender.notify(text="message")  # 429 が 3 回
+    with pytest.raises(slack_transport.SlackError):
+        sender.notify(text="message")  # Retry-After が max_wait を超える
+    with pytest.raises(slack_ratelimit.RateLimitError):
+        sender.notify(text="message")  # Retry-After の間は送信しない
+    assert fake_slack.requests == 4
+    assert sender.stats() == {"delivered": 0, "delayed": 0, "dropped": 3}
+
+
+def test_no_retry_client_error(fake_slack):
+    """ 429 以外の 4xx, 5xx は (投稿されたかもしれないので) リトライしないことのテスト """
+    import slack_ratelimit
+    import slack_transport
+    fake_slack.statuses = [400, 500]
+    sender = slack_ratelimit.RateLimitedSender(fake_slack.url, rate=0)
+    for _ in range(2):
+        with pytest.raises(slack_transport.SlackError):
+            sender.notify(text="message")
+    assert fake_slack.requests == 2
+    assert sender.stats() == {"delivered": 0, "delayed": 0, "dropped": 2}
+
+
+def test_no_retry_after_sent(fake_slack, monkeypatch):
+    """ 送ったあとの timeout はリトライせず、失敗として数えることのテスト """
+    import slack_ratelimit
+    import slack_transport
+    monkeypatch.setattr(slack_transport, "_transports", {fake_slack.url: slack_transport.SlackTransport(fake_slack.url, timeout=0.2)})
+    fake_slack.delay = 0.5
+    breaker = slack_ratelimit.CircuitBreaker(threshold=1)
+    sender = slack_ratelimit.RateLimitedSender(fake_slack.url, rate=0, breaker=breaker)
+    with pytest.raises(OSError):
+        sender.notify(text="message")
+    time.sleep(0.6)  # 代替サーバが遅れて受け付け終えるのを待つ
+
+    assert len(fake_slack.messages) == 1
+    assert breaker.is_open
+    assert sender.stats() == {"delivered": 0, "delayed": 0, "dropped": 1}
+
+
+def test_retry_not_sent(monkeypatch):
+    """ 接続できなかった (Slack に届いていない) 場合はリトライすることのテスト """
+    import socket
+    import slack_ratelimit
+    import slack_transport
+    with socket.socket() as sock:  # 閉じたあと、だれも listen していないポート
+        sock.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:%d/services/T000/B000/XXXX" % sock.getsockname()[1]
+    sender = slack_ratelimit.RateLimitedSender(url, rate=0, max_retries=2)
+    monkeypatch.setattr(slack_ratelimit, "SLACK_BACKOFF", 0.01)
+    monkeypatch.setattr(slack_transport, "_transports", {})
+    with pytest.raises(slack_transport.NotSentError):
+        sender.notify(text="message")
+    assert slack_transport.get_transport(url).connections_created == 3
+    assert sender.stats() == {"delivered": 0, "delayed": 0, "dropped": 1}
+
+
+def test_circuit_breaker(fake_slack, monkeypatch):
+    """ 失敗が続いたら送信を止め、一定時間後に 1 件だけ試すことのテスト """
+    import slack_ratelimit
+    fake_slack.statuses = [500] * 4
+    breaker = slack_ratelimit.CircuitBreaker(threshold=3, reset_timeout=0.2)
+    sender = slack_ratelimit.RateLimitedSender(fake_slack.url, rate=0, max_retries=0, breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            sender.notify(text="message")
+    with pytest.raises(slack_ratelimit.CircuitOpenError):
+        sender.notify(text="message")
+    assert fake_slack.requests == 3
+
+    time.sleep(0.2)
+    with pytest.raises(Exception):
+        sender.notify(text="message")  # 半開状態で 1 件試して失敗 -> 再び止まる
+    with pytest.raises(slack_ratelimit.CircuitOpenError):
+        sender.notify(text="message")
+    time.sleep(0.2)
+    sender.notify(text="message")
+    assert not breaker.is_open
+    assert fake_slack.requests == 5
+
+
+def _open_breaker(fake_slack):
+    """ threshold=1 の送信クライアントを、通信エラーでブレーカーが開いた状態にする """
+    import slack_ratelimit
+    breaker = slack_ratelimit.CircuitBreaker(threshold=1, reset_timeout=0.1)
+    sender = slack_ratelimit.RateLimitedSender(fake_slack.url, rate=0, max_retries=1, breaker=breaker)
+    breaker.record_failure()
+    assert breaker.is_open
+    time.sleep(0.1)
+    return sender, breaker
+
+
+def test_circuit_breaker_trial_client_error(fake_slack):
+    """ 半開状態の試行が 4xx なら、送信先は応答しているのでブレーカーを閉じることのテスト """
+    import slack_transport
+    sender, breaker = _open_breaker(fake_slack)
+    fake_slack.statuses = [400]
+    with pytest.raises(slack_transport.SlackError):
+        sender.notify(text="message")
+    assert not breaker.is_open
+    sender.notify(text="message")
+    assert len(fake_slack.messages) == 1
+
+
+def test_circuit_breaker_trial_rate_limited(fake_slack):
+    """ 半開状態の試行が 429 のままリトライを使いきったら、再び開いて reset_timeout 後にまた試せることのテスト """
+    import slack_ratelimit
+    import slack_transport
+    sender, breaker = _open_breaker(fake_slack)
+    fake_slack.statuses = [(429, {"Retry-After": "0"})] * 2
+    with pytest.raises(slack_transport.SlackError):
+        sender.notify(text="message")
+    assert breaker.is_open
+    with pytest.raises(slack_ratelimit.CircuitOpenError):
+        sender.notify(text="message")
+    time.sleep(0.1)
+    sender.notify(text="message")
+    assert not breaker.is_open
+
+
+def test_circuit_breaker_trial_wait_exceeded(fake_slack):
+    """ 半開状態の試行が流量制限の待ち時間の上限で送信しなかった場合も、試行を終えることのテスト """
+    import slack_ratelimit
+    sender, breaker = _open_breaker(fake_slack)
+    sender.bucket.block(0.2)
+    sender.max_wait = 0.05
+    with pytest.raises(slack_ratelimit.RateLimitError):
+        sender.notify(text="message")
+    assert fake_slack.requests == 0
+    time.sleep(0.2)
+    sender.notify(text="message")
+    assert not breaker.is_open
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+
+def test_notify(fake_slack):
+    """ slackweb と同じ形の payload が送られることのテスト """
+    import slack_transport
+    transport = slack_transport.SlackTransport(fake_slack.url)
+    r = transport.notify(text="main message", attachments=[{"text": "some attachment"}])
+
+    assert r == "ok"
+    assert fake_slack.messages == [{"text": "main message", "attachments": [{"text": "some attachment"}]}]
+
+
+def test_connection_reuse(fake_slack):
+    """ 複数回の送信で keep-alive のコネクションが再利用されることのテスト """
+    import slack_transport
+    transport = slack_transport.SlackTransport(fake_slack.url)
+    n = 20
+    start = time.perf_counter()
+    for i in range(n):
+        transport.notify(text=f"message {i}")
+    elapsed = time.perf_counter() - start
+
+    assert len(fake_slack.messages) == n
+    assert fake_slack.connections == 1
+    assert transport.connections_created == 1
+    print(f"per-message latency: {elapsed / n * 1e3:.2f} ms")
+
+
+def test_reconnect_after_server_close(fake_slack):
+    """ プール中のコネクションが切られていても送信できることのテスト """
+    import slack_transport
+    transport = slack_transport.SlackTransport(fake_slack.url)
+    transport.notify(text="first")
+    for conn in list(transport._pool.queue):
+        conn.sock.close()  # サーバ側のアイドル切断の代わり
+    transport.notify(text="second")
+
+    assert [x["text"] for x in fake_slack.messages] == ["first", "second"]
+
+
+def test_no_resend_after_request_sent(fake_slack):
+    """ リクエストを送ったあとに失敗 (timeout) したら、重複して投稿しないようにやり直さないことのテスト """
+    import slack_transport
+    transport = slack_transport.SlackTransport(fake_slack.url, timeout=0.2)
+    transport.notify(text="first")
+    fake_slack.delay = 0.5
+    with pytest.raises(OSError):
+        transport.notify(text="second")
+    time.sleep(0.6)  # 代替サーバが遅れて受け付け終えるのを待つ
+
+    assert [x["text"] for x in fake_slack.messages] == ["first", "second"]
+    assert transport.connections_created == 1
+
+
+def test_error_status(fake_slack):
+    """ 2xx 以外のときは SlackError になり、Retry-After が取れることのテスト """
+    import slack_transport
+    fake_slack.statuses = [(429, {"Retry-After": "3"})]
+    transport = slack_transport.SlackTransport(fake_slack.url)
+    with pytest.raises(slack_transport.SlackError) as e:
+        transport.notify(text="message")
+
+    assert e.value.status == 429
+    assert e.value.retry_after == 3.0
+
+
+def test_retry_after_http_date(fake_slack):
+    """ Retry-After が HTTP-date でも秒数にし、解釈できなければ None にすることのテスト """
+    from email.utils import formatdate
+    import slack_transport
+    fake_slack.statuses = [(503, {"Retry-After": formatdate(time.time() + 30, usegmt=True)}),
+                           (503, {"Retry-After": "soon"})]
+    transport = slack_transport.SlackTransport(fake_slack.url)
+    with pytest.raises(slack_transport.SlackError) as e:
+        transport.notify(text="message")
+    assert 25 < e.value.retry_after <= 30
+    with pytest.raises(slack_transport.SlackError) as e:
+        transport.notify(text="message")
+    assert e.value.retry_after is None
+    assert slack_transport.parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_get_transport():
+    """ 同じ URL には同じ SlackTransport が返ることのテスト """
+    import slack_transport
+    t1 = slack_transport.get_transport("https://hooks.slack.com/services/T000/B000/AAAA")
+    t2 = slack_transport.get_transport("https://hooks.slack.com/services/T000/B000/AAAA")
+    t3 = slack_transport.get_transport("https://hooks.slack.com/services/T000/B000/BBBB")
+    assert t1 is t2
+    assert t1 is not t3
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+CONFIG = {
+    "github_to_slack": {"@Hoge": "@U0001", "@huga": "@U0002"},
+    "orgs": {"Some-Org": {"@huga": "@U0102", "@piyo": "@U0103"}},
+}
+
+
+def test_index_for():
+    """ 大文字小文字を区別せずに引け、organization の対応表が優先されることのテスト """
+    import user_mapping
+    mapping = user_mapping.UserMapping.from_config(CONFIG)
+
+    default = mapping.index_for(None)
+    assert default.resolve("HOGE") == "@Hoge"
+    assert default.slack_id("@huga") == "@U0002"
+    assert default.resolve("piyo") is None
+
+    org = mapping.index_for("some-org")
+    assert org.resolve("hoge") == "@Hoge"  # 共通の対応表も引ける
+    assert org.slack_id(org.resolve("Huga")) == "@U0102"
+    assert org.slack_id(org.resolve("piyo")) == "@U0103"
+    assert mapping.index_for("other-org") is default
+    assert len(mapping) == 4
+
+
+def test_mapping_format(tmp_path):
+    """ 索引込み形式に変換しても同じ対応表が読み込めることのテスト """
+    import user_mapping
+    (tmp_path / "config.json").write_text(json.dumps(CONFIG))
+    assert user_mapping.main([str(tmp_path / "config.json"), str(tmp_path / "config.mapping")]) == 0
+
+    mapping = user_mapping.MappingSource(str(tmp_path / "config.mapping")).get()
+    assert dict(mapping.github_to_slack) == CONFIG["github_to_slack"]
+    assert mapping.index_for("SOME-ORG").slack_id("@piyo") == "@U0103"
+    assert mapping.index_for("some-org").resolve("HUGA") == "@huga"
+
+
+def test_hot_reload(tmp_path):
+    """ ファイルが変更されたら別スレッドで読み込みなおし、読み込み終わるまでは古い対応表を返すことのテスト """
+    import user_mapping
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(CONFIG))
+    source = user_mapping.MappingSource(str(path), check_interval=0)
+    old = source.get()
+    assert source.get() is old  # 変更がなければ読み込みなおさない
+    assert source.reloads == 0
+
+    path.write_text(json.dumps({"github_to_slack": {"@new": "@U0009"}}))
+    mtime = path.stat().st_mtime + 1
+    os.utime(path, (mtime, mtime))
+    source.get()
+    source._reload_thread.join()
+    assert source.reloads == 1
+    assert source.get().index_for().resolve("new") == "@new"
+
+    # 壊れたファイルに変わっても、古い対応表を使い続ける
+    path.write_text("not a json")
+    os.utime(path, (mtime + 1, mtime + 1))
+    current = source.get()
+    source._reload_thread.join()
+    assert source.get() is current
+    assert source.reloads == 1
+
+
+def test_handler_org_mapping(monkeypatch, tmp_path):
+    """ リポジトリの organization の対応表で mention 先が決まることのテスト """
+    import github_webhook_lambda
+    import user_mapping
+    from unittest.mock import MagicMock
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"github_to_slack": {"@smatsumt2": "@U0002"}, "orgs": {"smatsumt": {"@smatsumt2": "@U0202"}}}))
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_FILE", str(path))
+    monkeypatch.setattr(github_webhook_lambda, "CONFIG_SNAPSHOT", None)
+    monkeypatch.setattr(user_mapping, "_sources", {})
+    mock = MagicMock()
+    monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
+
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text())
+    github_webhook_lambda._load_config()
+    github_webhook_lambda.handler_issue_pr_mentioned(header, body)
+    assert mock.call_args[0][0].startswith(":wave: <@U0202>, *mentioned* by smatsumt")
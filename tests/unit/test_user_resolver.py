@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+from unittest.mock import MagicMock
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+EMAILS = {"alice": "alice@example.com", "bob": "bob@example.com", "carol": None, "dave": "dave@example.com"}
+SLACK_IDS = {"alice@example.com": "UALICE", "bob@example.com": "UBOB"}
+
+
+def _resolver(server, **kwargs):
+    import user_resolver
+    return user_resolver.UserResolver(server.github_url, "gh-token", server.slack_url, "xoxb-token", **kwargs)
+
+
+def test_resolve_many():
+    """ email -> Slack ID の順に引け、email 非公開・Slack にいないユーザは None になることのテスト """
+    from fake_directory import FakeDirectoryServer
+    with FakeDirectoryServer(EMAILS, SLACK_IDS) as server:
+        resolver = _resolver(server)
+        r = resolver.resolve_many(["alice", "Bob", "carol", "dave", "nobody"])
+
+    assert r == {"alice": "@UALICE", "Bob": "@UBOB", "carol": None, "dave": None, "nobody": None}
+    assert server.github_calls == 5
+    assert server.slack_calls == 3  # carol (email なし), nobody (404) は Slack に問い合わせない
+
+
+def test_resolve_many_cached():
+    """ 2 回目以降は見つからなかったユーザも含めてキャッシュから返し、問い合わせないことのテスト """
+    from fake_directory import FakeDirectoryServer
+    logins = ["alice", "bob", "carol", "dave", "nobody"]
+    with FakeDirectoryServer(EMAILS, SLACK_IDS) as server:
+        resolver = _resolver(server)
+        first = resolver.resolve_many(logins)
+        calls = resolver.remote_calls
+        for _ in range(10):
+            assert resolver.resolve_many(logins + ["ALICE"]) == dict(first, ALICE="@UALICE")
+
+    assert calls == server.github_calls + server.slack_calls == 8
+    assert resolver.remote_calls == calls  # 10 回分 (80 回) の問い合わせが省けている
+    assert resolver.cache.stats()["hits"] == 60
+
+
+def test_resolve_many_parallel():
+    """ 1 イベント分のユーザを並列に引くことのテスト """
+    from fake_directory import FakeDirectoryServer
+    logins = [f"user{i}" for i in range(8)]
+    emails = {x: f"{x}@example.com" for x in logins}
+    slack_ids = {f"{x}@example.com": x.upper() for x in logins}
+    with FakeDirectoryServer(emails, slack_ids, delay=0.05) as server:
+        resolver = _resolver(server, max_workers=8)
+        r = resolver.resolve_many(logins)
+
+    assert r == {x: "@" + x.upper() for x in logins}
+    assert server.max_concurrency > 1
+
+
+def test_transient_error_not_cached():
+    """ 5xx は一時的なエラーとしてキャッシュせず、次のイベントで引きなおすことのテスト """
+    from fake_directory import FakeDirectoryServer
+    with FakeDirectoryServer(EMAILS, SLACK_IDS, github_statuses=[502]) as server:
+        resolver = _resolver(server)
+        assert resolver.resolve_many(["alice"]) == {"alice": None}
+        assert resolver.resolve_many(["alice"]) == {"alice": "@UALICE"}
+    assert server.github_calls == 2
+
+
+def test_cache_ttl_and_eviction(monkeypatch):
+    """ 期限切れ・件数超過のエントリは捨てられ、見つからなかった結果は短い期限で切れることのテスト """
+    import user_resolver
+    now = [1000.0]
+    monkeypatch.setattr(user_resolver.time, "time", lambda: now[0])
+    cache = user_resolver.ResolutionCache(max_entries=2, ttl=100, negative_ttl=10)
+
+    cache.put("alice", "@UALICE")
+    cache.put("nobody", None)
+    assert cache.get("nobody") == (True, None)
+    now[0] += 20
+    assert cache.get("nobody") == (False, None)
+    assert cache.get("alice") == (True, "@UALICE")
+
+    cache.put("bob", "@UBOB")
+    cache.put("dave", "@UDAVE")  # 期限切れの nobody は取り出したときに捨て、件数超過で alice を捨てる
+    assert cache.get("alice") == (False, None)
+    assert cache.stats()["evictions"] == 1
+    now[0] += 100
+    assert cache.get("bob") == (False, None)
+
+
+def test_handler_issue_pr_mentioned_resolved(monkeypatch):
+    """ 対応表に未登録のユーザへの mention も、user_resolver で Slack ID が見つかれば通知することのテスト """
+    from fake_directory import FakeDirectoryServer
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text())
+
+    import github_webhook_lambda
+    import user_resolver
+    mock = MagicMock()
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt"}))
+    monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
+    with FakeDirectoryServer({"smatsumt2": "smatsumt2@example.com"}, {"smatsumt2@example.com": "U0002"}) as server:
+        monkeypatch.setattr(user_resolver, "_resolver", _resolver(server))
+        github_webhook_lambda.handler_issue_pr_mentioned(header, body)
+
+    args, kwargs = mock.call_args
+    assert args[0] == ":wave: <@U0002>, *mentioned* by smatsumt in https://github.com/smatsumt/testrepo2/issues/1#issuecomment-619470010"
+    assert server.github_calls == 1  # 登録済みのコメント本人 (smatsumt) は問い合わせない
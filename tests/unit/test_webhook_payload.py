@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+
+def test_probe_action():
+    """ パースせずに action を取り出せることのテスト """
+    import webhook_payload
+    body = (SCRIPT_PATH.parent / "testdata/review-requested-body.json").read_text()
+    assert webhook_payload.probe_action(body) == "review_requested"
+
+    # 先頭が action でない場合は判定しない
+    assert webhook_payload.probe_action('{"zen": "Keep it logically awesome.", "action": "opened"}') is None
+    assert webhook_payload.probe_action('{"action": "created"}') == "created"
+
+
+def test_extract():
+    """ ハンドラが参照するフィールドだけが残ることのテスト """
+    import webhook_payload
+    body = json.loads((SCRIPT_PATH.parent / "testdata/review-requested-body.json").read_text())
+    r = webhook_payload.extract(body)
+
+    assert set(r.keys()) == {"action", "pull_request", "repository"}
+    assert r["pull_request"]["html_url"] == "https://github.com/smatsumt/testrepo2/pull/3"
+    assert r["pull_request"]["user"] == {"login": "smatsumt"}
+    assert r["pull_request"]["requested_reviewers"] == [{"login": "skawagt"}, {"login": "smatsumoto78"}]
+    assert r["repository"] == {"full_name": "smatsumt/testrepo2"}
+
+
+def test_extract_handler_compatible(monkeypatch):
+    """ extract した payload でもハンドラが同じ通知を出すことのテスト """
+    header = json.loads((SCRIPT_PATH.parent / "testdata/review-submitted-header.json").read_text())
+    body = json.loads((SCRIPT_PATH.parent / "testdata/review-submitted-body-with-mention.json").read_text())
+
+    from unittest.mock import MagicMock
+    import github_webhook_lambda
+    import webhook_payload
+    mock = MagicMock()
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "notify_slack", mock)
+    github_webhook_lambda.handler_review_submitted(header, webhook_payload.extract(body))
+
+    args, kwargs = mock.call_args
+    assert args[0] == ':speech_balloon: <@smatsumt> <@smatsumt2>, *review commented* by skawagt in https://github.com/smatsumt/testrepo2/pull/2#pullrequestreview-394584166'
+    assert kwargs["attach_message"] == "@smatsumt2 yappari comment"
+
+
+def _sign(data: bytes, secret: str) -> str:
+    import hashlib
+    import hmac
+    return "sha256=" + hmac.new(secret.encode(), data, hashlib.sha256).hexdigest()
+
+
+def test_gate():
+    """ 署名の合う body だけを通し、大きすぎる body はパース前に捨てることのテスト """
+    import webhook_payload
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+    signature = _sign(body.encode(), "s3cret")
+
+    assert webhook_payload.gate(body, signature, secret="s3cret") is None
+    assert webhook_payload.gate(body, signature, secret="other") == 401  # secret が違う
+    assert webhook_payload.gate(body + " ", signature, secret="s3cret") == 401  # body が改ざんされた
+    assert webhook_payload.gate(body, signature.replace("sha256=", "sha1="), secret="s3cret") == 401
+    assert webhook_payload.gate(body, "sha256=" + "0" * 64, secret="s3cret") == 401
+    assert webhook_payload.gate(body, "sha256=ｘ", secret="s3cret") == 401  # ASCII 以外でも例外にしない
+    assert webhook_payload.gate(body, None, secret="s3cret") == 401
+    assert webhook_payload.gate(body, None, secret="") is None  # secret 未設定なら検証しない
+
+    assert webhook_payload.gate(body, signature, secret="s3cret", max_bytes=len(body) - 1) == 413
+    assert webhook_payload.gate("あ" * 10, None, secret="", max_bytes=20) == 413  # 文字数ではなくバイト数で比べる
+    assert webhook_payload.gate("あ" * 10, None, secret="", max_bytes=30) is None
+    assert webhook_payload.gate("あ" * 10, _sign(("あ" * 10).encode(), "s3cret"), secret="s3cret", max_bytes=20) == 413
+
+
+def test_lambda_handler_rejects_forged(monkeypatch):
+    """ 署名の合わないリクエストではハンドラが呼ばれないことのテスト """
+    import github_webhook_lambda
+    from unittest.mock import MagicMock
+    import webhook_payload
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+    mentioned = MagicMock(__name__="mentioned")
+    monkeypatch.setattr(webhook_payload, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt"}))
+    monkeypatch.setattr(github_webhook_lambda, "HANDLERS", {("issue_comment", "created"): [mentioned]})
+
+    forged = dict(header, **{"X-Hub-Signature-256": _sign(body.encode(), "guess")})
+    r = github_webhook_lambda.lambda_handler({"headers": forged, "body": body}, None)
+    assert r["statusCode"] == 401
+    assert not mentioned.called
+
+    valid = dict(header, **{"X-Hub-Signature-256": _sign(body.encode(), "s3cret")})
+    r = github_webhook_lambda.lambda_handler({"headers": valid, "body": body}, None)
+    assert r["statusCode"] == 200
+    assert mentioned.called
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import http.client
+import json
+from pathlib import Path
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+SCRIPT_PATH = Path(__file__).parent.resolve()
+
+
+def _post(server, headers: dict, body: str):
+    parts = urlsplit(server.url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    conn.request("POST", "/", body=body.encode(), headers=headers)
+    r = conn.getresponse()
+    status, data = r.status, r.read()
+    conn.close()
+    return status, json.loads(data)
+
+
+def _raw(server, request: bytes) -> bytes:
+    """ 生のリクエストを送り、サーバが閉じるまでの応答を返す """
+    parts = urlsplit(server.url)
+    with socket.create_connection((parts.hostname, parts.port), timeout=10) as sock:
+        sock.sendall(request)
+        data = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return data
+            data += chunk
+
+
+def _setup(monkeypatch, fake_slack):
+    import github_webhook_lambda
+    monkeypatch.setattr(github_webhook_lambda.delivery_dedup, "_dedup", github_webhook_lambda.delivery_dedup.DeliveryDedup())
+    monkeypatch.setattr(github_webhook_lambda, "g_user_mapping", github_webhook_lambda.user_mapping.UserMapping({"@smatsumt": "@smatsumt", "@smatsumt2": "@smatsumt2"}))
+    monkeypatch.setattr(github_webhook_lambda, "SLACK_URL", fake_slack.url)
+    header = json.loads((SCRIPT_PATH.parent / "testdata/mentioned-header.json").read_text())
+    body = (SCRIPT_PATH.parent / "testdata/mentioned-body.json").read_text()
+    return header, body
+
+
+def test_to_event():
+    """ ヘッダ名の大文字小文字が lambda_handler の参照する名前にそろうことのテスト """
+    import webhook_server
+    event = webhook_server.to_event("POST", "/", {"x-github-event": "push", "X-Other": "1"}, "{}")
+    assert event["headers"] == {"X-GitHub-Event": "push", "X-Other": "1"}
+    assert event["body"] == "{}"
+    assert event["httpMethod"] == "POST"
+
+
+def test_post(monkeypatch, fake_slack):
+    """ HTTP で受けた webhook が lambda_handler と同じように処理されることのテスト """
+    import webhook_server
+    header, body = _setup(monkeypatch, fake_slack)
+    headers = {"x-github-event": header["X-GitHub-Event"], "x-github-delivery": header["X-GitHub-Delivery"],
+               "content-type": "application/json"}
+    with webhook_server.WebhookServer(("127.0.0.1", 0)) as server:
+        status, data = _post(server, headers, body)
+
+    assert status == 200
+    assert data == {"result": "ok"}
+    assert len(fake_slack.messages) == 1
+    assert fake_slack.messages[0]["text"].startswith(":wave: <@smatsumt2>, *mentioned* by smatsumt")
+
+
+def test_saturated(monkeypatch, fake_slack):
+    """ ワーカーと待ちの枠がすべて埋まっていたら 503 を返すことのテスト """
+    import github_webhook_lambda
+    import webhook_server
+    header, body = _setup(monkeypatch, fake_slack)
+    entered, release = threading.Event(), threading.Event()
+
+    def blocking_handler(event, context):
+        entered.set()
+        release.wait(10)
+        return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
+
+    monkeypatch.setattr(github_webhook_lambda, "lambda_handler", blocking_handler)
+    with webhook_server.WebhookServer(("127.0.0.1", 0), max_workers=1, max_pending=0) as server:
+        first = []
+        t = threading.Thread(target=lambda: first.append(_post(server, header, body)))
+        t.start()
+        assert entered.wait(10)
+        status, data = _post(server, header, body)
+        health = urlopen(server.url, timeout=10)  # ヘルスチェックには混んでいても 200 を返す
+        release.set()
+        t.join()
+
+    assert status == 503
+    assert data == {"result": "busy"}
+    assert health.status == 200
+    assert first[0][0] == 200
+    assert server.rejected == 1
+
+
+def test_drain_on_stop(monkeypatch, fake_slack):
+    """ deferred のとき、停止時に送信待ちの通知を送り終えることのテスト """
+    import github_webhook_lambda
+    import webhook_server
+    header, body = _setup(monkeypatch, fake_slack)
+    monkeypatch.setattr(github_webhook_lambda, "DELIVERY_MODE", "deferred")
+    monkeypatch.setattr(github_webhook_lambda.outbound_queue, "_queue", github_webhook_lambda.outbound_queue.MemoryQueue())
+    monkeypatch.setattr(webhook_server, "SERVER_DELIVERY_INTERVAL", 60)  # 停止時の送信だけで送られることを確認する
+    with webhook_server.WebhookServer(("127.0.0.1", 0)) as server:
+        status, _ = _post(server, header, body)
+        assert status == 200
+        assert len(fake_slack.messages) == 0
+
+    assert len(fake_slack.messages) == 1
+
+
+def test_invalid_request():
+    """ Content-Length が整数でない・body が UTF-8 でないリクエストに 400 を返すことのテスト """
+    import webhook_server
+    with webhook_server.WebhookServer(("127.0.0.1", 0)) as server:
+        bad_length = _raw(server, b"POST / HTTP/1.1\r\nHost: x\r\nContent-Length: abc\r\n\r\n")
+        bad_body = _raw(server, b"POST / HTTP/1.1\r\nHost: x\r\nContent-Length: 2\r\n\r\n\xff\xfe")
+
+    assert bad_length.startswith(b"HTTP/1.0 400")
+    assert bad_body.startswith(b"HTTP/1.0 400")
+
+
+def test_slow_client(monkeypatch):
+    """ body を送り終えないクライアントは timeout で閉じ、ワーカーを解放することのテスト """
+    import webhook_server
+    monkeypatch.setattr(webhook_server.WebhookRequestHandler, "timeout", 0.2)
+    with webhook_server.WebhookServer(("127.0.0.1", 0), max_workers=1, max_pending=0) as server:
+        start = time.monotonic()
+        assert _raw(server, b"POST / HTTP/1.1\r\nHost: x\r\nContent-Length: 100\r\n\r\n{") == b""
+        assert time.monotonic() - start < 5
+        assert _raw(server, b"GET / HTTP/1.1\r\nHost: x\r\n\r\n").startswith(b"HTTP/1.0 200")
+
+
+def test_saturated_large_body(monkeypatch):
+    """ ワーカーに空きがないとき、大きな body は読まずに 503 を返すことのテスト """
+    import github_webhook_lambda
+    import webhook_server
+    entered, release = threading.Event(), threading.Event()
+
+    def blocking_handler(event, context):
+        entered.set()
+        release.wait(10)
+        return {"statusCode": 200, "body": json.dumps({"result": "ok"})}
+
+    monkeypatch.setattr(github_webhook_lambda, "lambda_handler", blocking_handler)
+    with webhook_server.WebhookServer(("127.0.0.1", 0), max_workers=1, max_pending=0) as server:
+        t = threading.Thread(target=lambda: _raw(server, b"POST / HTTP/1.1\r\nHost: x\r\nContent-Length: 2\r\n\r\n{}"))
+        t.start()
+        assert entered.wait(10)
+        length = webhook_server.REJECT_MAX_READ_BYTES + 1
+        start = time.monotonic()
+        data = _raw(server, b"POST / HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % length)
+        elapsed = time.monotonic() - start
+        release.set()
+        t.join()
+
+    assert data.startswith(b"HTTP/1.0 503")
+    assert b"Connection: close" in data
+    assert elapsed < 0.9  # body を待たずに応答する (待つと BusyRequestHandler の timeout の 1 秒かかる)